@@ -0,0 +1,404 @@
+"""Leaderboards and economy stats over every save, kept up to date as saves are written.
+
+    python analytics.py rebuild game_saves          # rescan every save, one worker per CPU
+    python analytics.py rebuild game_saves --sqlite # rescan game_saves/saves.db instead
+    python analytics.py top level -k 20
+    python analytics.py economy
+
+Every save slot except the autosave contributes one ``Record`` (keyed by
+``(account, slot)``): the player's level, gold, story progress and units held
+per item name. When a slot is saved again its old record is taken out of the
+aggregates and the new one put in, so nothing is ever rescanned. The boards
+are lists kept sorted best-first with ``bisect``, so a top-K query is a slice:
+
+    level  highest level, then exp
+    gold   most gold
+    story  completed the main story (``story_progress == 99``), earliest first
+
+Economy stats are the units of each item held across all saves and the gold
+distribution (total, mean, median, p90 and a power-of-ten histogram).
+
+State lives in ``<state_dir>/analytics.json`` plus an append-only
+``analytics.log`` of records written since; ``flush()`` folds the log into the
+snapshot. ``rebuild`` throws both away and rescans the saves, streaming them
+through a process pool a chunk at a time.
+"""
+import argparse
+import bisect
+import concurrent.futures
+import heapq
+import json
+import os
+import sqlite3
+import sys
+import threading
+from typing import Callable, Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+import saveformat
+from autosave import AUTOSAVE_SLOT
+from migrate_saves import iter_saves, owner_of, read_save
+
+STORY_COMPLETE = 99
+BOARDS = ('level', 'gold', 'story')
+GOLD_BUCKETS = (0, 10, 100, 1_000, 10_000, 100_000, 1_000_000)  # lower bounds
+SNAPSHOT_FILE = 'analytics.json'
+LOG_FILE = 'analytics.log'
+COMPACT_EVERY = 2_000  # log lines before the snapshot is rewritten
+CHUNK = 256  # saves per worker task during a rebuild
+
+Key = Tuple[str, int]  # (account, slot)
+
+
+class Record(NamedTuple):
+    name: str
+    pclass: str
+    level: int
+    exp: int
+    gold: int
+    story: int
+    timestamp: str
+    completed: Optional[str]  # when the slot was first saved with the story complete
+    items: Dict[str, int]
+
+
+def record_of(data: dict) -> Record:
+    """The record for a current-schema save document."""
+    pl = data['player']
+    table = pl['items']
+    items: Dict[str, int] = {}
+    for tid, qty in pl['inventory']:
+        name = table[tid]['name']
+        items[name] = items.get(name, 0) + qty
+    story = pl.get('story_progress', 0)
+    return Record(pl['name'], pl.get('pclass', ''), pl.get('level', 1), pl.get('exp', 0), pl.get('gold', 0), story,
+                  data['timestamp'], data['timestamp'] if story >= STORY_COMPLETE else None, items)
+
+
+def record_of_player(player, timestamp: str) -> Record:
+    """The record for a live Player, without building its save document."""
+    story = player.story_progress
+    return Record(player.name, player.pclass, player.level, player.exp, player.gold, story, timestamp,
+                  timestamp if story >= STORY_COMPLETE else None, player.inventory.counts())
+
+
+def _sort_key(board: str, key: Key, r: Record) -> Optional[tuple]:
+    if board == 'level':
+        return (-r.level, -r.exp, key)
+    if board == 'gold':
+        return (-r.gold, key)
+    return (r.completed, key) if r.completed else None
+
+
+class Board:
+    """Sort keys kept in order, best first."""
+
+    def __init__(self):
+        self._keys: List[tuple] = []
+
+    def add(self, k: tuple):
+        bisect.insort(self._keys, k)
+
+    def remove(self, k: tuple):
+        i = bisect.bisect_left(self._keys, k)
+        if i < len(self._keys) and self._keys[i] == k:
+            del self._keys[i]
+
+    def top(self, k: int) -> List[tuple]:
+        return self._keys[:k]
+
+    def at(self, i: int) -> tuple:
+        return self._keys[i]
+
+    def __len__(self):
+        return len(self._keys)
+
+
+class Analytics:
+    def __init__(self, state_dir: Callable[[], Optional[str]] = lambda: None):
+        self._state_dir = state_dir
+        self._lock = threading.RLock()
+        self._log = None
+        self._logged = 0
+        self._clear()
+
+    def _clear(self):
+        self.records: Dict[Key, Record] = {}
+        self.boards = {name: Board() for name in BOARDS}
+        self.items: Dict[str, int] = {}
+        self.gold_hist = [0] * len(GOLD_BUCKETS)
+        self.gold_total = 0
+
+    # -------------------------
+    # Updating
+    # -------------------------
+
+    def _apply(self, key: Key, r: Record, sign: int):
+        for name, board in self.boards.items():
+            k = _sort_key(name, key, r)
+            if k is not None:
+                (board.add if sign > 0 else board.remove)(k)
+        for name, qty in r.items.items():
+            n = self.items.get(name, 0) + sign * qty
+            if n:
+                self.items[name] = n
+            else:
+                del self.items[name]
+        self.gold_hist[bisect.bisect_right(GOLD_BUCKETS, r.gold) - 1] += sign
+        self.gold_total += sign * r.gold
+
+    def _put(self, key: Key, r: Record):
+        old = self.records.get(key)
+        if old is not None:
+            if old.completed and r.story >= STORY_COMPLETE:
+                r = r._replace(completed=old.completed)  # keep the original completion time
+            self._apply(key, old, -1)
+        self.records[key] = r
+        self._apply(key, r, +1)
+        return r
+
+    def update(self, key: Key, r: Record):
+        """Replace the record for ``key`` (a slot was saved)."""
+        with self._lock:
+            r = self._put(key, r)
+            self._append_log(key, r)
+
+    def rebuild(self, records: Iterable[Tuple[Key, Record]]):
+        """Replace everything with ``records`` and write a fresh snapshot."""
+        with self._lock:
+            self._fill(records)
+            self.flush()
+
+    def _fill(self, records: Iterable[Tuple[Key, Record]]):
+        self._clear()
+        sort_keys = {name: [] for name in BOARDS}
+        for key, r in records:
+            self.records[key] = r
+            for name in BOARDS:
+                k = _sort_key(name, key, r)
+                if k is not None:
+                    sort_keys[name].append(k)
+            for name, qty in r.items.items():
+                self.items[name] = self.items.get(name, 0) + qty
+            self.gold_hist[bisect.bisect_right(GOLD_BUCKETS, r.gold) - 1] += 1
+            self.gold_total += r.gold
+        for name, keys in sort_keys.items():
+            keys.sort()
+            self.boards[name]._keys = keys
+
+    # -------------------------
+    # Queries
+    # -------------------------
+
+    def top(self, board: str, k: int = 10) -> List[Tuple[Key, Record]]:
+        with self._lock:
+            return [(sk[-1], self.records[sk[-1]]) for sk in self.boards[board].top(k)]
+
+    def rank(self, board: str, key: Key) -> Optional[int]:
+        """1-based position of ``key`` on ``board``, or None if it isn't on it."""
+        with self._lock:
+            r = self.records.get(key)
+            k = r and _sort_key(board, key, r)
+            return None if k is None else bisect.bisect_left(self.boards[board]._keys, k) + 1
+
+    def economy(self, k: int = 10) -> dict:
+        with self._lock:
+            n = len(self.records)
+            gold = self.boards['gold']
+
+            def pct(p):  # the gold board is sorted richest first
+                return -gold.at(min(n - 1, int(n * (1 - p))))[0] if n else 0
+            return {
+                'players': n,
+                'gold_total': self.gold_total,
+                'gold_mean': self.gold_total / n if n else 0,
+                'gold_median': pct(0.5),
+                'gold_p90': pct(0.9),
+                'gold_histogram': {f'{lo}+': c for lo, c in zip(GOLD_BUCKETS, self.gold_hist)},
+                'distinct_items': len(self.items),
+                'top_items': heapq.nlargest(k, self.items.items(), key=lambda kv: kv[1]),
+            }
+
+    # -------------------------
+    # Persistence
+    # -------------------------
+
+    def _path(self, name: str) -> Optional[str]:
+        d = self._state_dir()
+        return os.path.join(d, name) if d else None
+
+    def load(self) -> bool:
+        """Read the snapshot and log; False if there is no saved state (a rebuild is needed)."""
+        snap = self._path(SNAPSHOT_FILE)
+        if snap is None or not os.path.exists(snap):
+            return False
+        with self._lock:
+            with open(snap, 'r') as f:
+                doc = json.load(f)
+            self._fill(((a, s), Record(*rest)) for a, s, *rest in doc['records'])
+            replayed = 0
+            try:
+                with open(self._path(LOG_FILE), 'r') as f:
+                    for line in f:
+                        if not line.endswith('\n'):
+                            break  # torn last line
+                        a, s, *rest = json.loads(line)
+                        self._put((a, s), Record(*rest))
+                        replayed += 1
+            except FileNotFoundError:
+                pass
+            if replayed:
+                self.flush()
+        return True
+
+    def _append_log(self, key: Key, r: Record):
+        path = self._path(LOG_FILE)
+        if path is None:
+            return
+        if self._log is None:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            self._log = open(path, 'a')
+        self._log.write(json.dumps([*key, *r]) + '\n')
+        self._log.flush()
+        self._logged += 1
+        if self._logged >= COMPACT_EVERY:
+            self.flush()
+
+    def flush(self):
+        """Write the snapshot and empty the log."""
+        snap = self._path(SNAPSHOT_FILE)
+        if snap is None:
+            return
+        with self._lock:
+            doc = {'records': [[*key, *r] for key, r in self.records.items()]}
+            os.makedirs(os.path.dirname(snap), exist_ok=True)
+            saveformat.atomic_write(snap, json.dumps(doc).encode())
+            if self._log is not None:
+                self._log.close()
+                self._log = None
+            try:
+                os.remove(self._path(LOG_FILE))
+            except FileNotFoundError:
+                pass
+            self._logged = 0
+
+
+# -------------------------
+# Full rescans
+# -------------------------
+
+def _summarize(root: str, paths: List[str]) -> List[Tuple[Key, Record]]:
+    """Records for a chunk of save files -- runs in a worker. Unreadable saves are left out."""
+    out = []
+    for path in paths:
+        key = owner_of(root, path)
+        if key[1] == AUTOSAVE_SLOT:
+            continue
+        try:
+            out.append((key, record_of(read_save(path))))
+        except Exception:
+            continue
+    return out
+
+
+def scan_files(root: str, workers: Optional[int] = None) -> Iterator[Tuple[Key, Record]]:
+    """Records for every file save under ``root``, read in parallel."""
+    paths = iter_saves(root)
+    chunk = [p for _, p in zip(range(CHUNK), paths)]
+    if len(chunk) < CHUNK:  # too few saves to be worth starting a pool
+        yield from _summarize(root, chunk)
+        return
+    window = (workers or os.cpu_count() or 1) * 4
+    with concurrent.futures.ProcessPoolExecutor(workers) as pool:
+        pending = set()
+        while chunk or pending:
+            if chunk:
+                pending.add(pool.submit(_summarize, root, chunk))
+                chunk = [p for _, p in zip(range(CHUNK), paths)]
+            if len(pending) >= window or not chunk:
+                done, pending = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+                for fut in done:
+                    yield from fut.result()
+
+
+def scan_sqlite(path: str) -> Iterator[Tuple[Key, Record]]:
+    """Records for every save in a sqlstore database, streamed from two ordered queries."""
+    conn = sqlite3.connect(path)
+    try:
+        saves = conn.execute('SELECT account, slot, name, pclass, level, exp, gold, story_progress, timestamp '
+                             'FROM saves WHERE slot != ? ORDER BY account, slot', (AUTOSAVE_SLOT,))
+        inv = conn.cursor().execute('SELECT v.account, v.slot, i.name, SUM(v.qty) FROM inventory v '
+                                    'JOIN items i ON i.id = v.item GROUP BY v.account, v.slot, i.name '
+                                    'ORDER BY v.account, v.slot')
+        row = next(inv, None)
+        for account, slot, name, pclass, level, exp, gold, story, ts in saves:
+            key = (account, slot)
+            items = {}
+            while row is not None and (row[0], row[1]) <= key:
+                if (row[0], row[1]) == key:
+                    items[row[2]] = items.get(row[2], 0) + row[3]
+                row = next(inv, None)
+            story = story or 0
+            yield key, Record(name, pclass or '', level or 1, exp or 0, gold or 0, story, ts,
+                              ts if story >= STORY_COMPLETE else None, items)
+    finally:
+        conn.close()
+
+
+# -------------------------
+# Command line
+# -------------------------
+
+def format_board(board: str, rows: List[Tuple[Key, Record]]) -> List[str]:
+    out = []
+    for i, ((account, slot), r) in enumerate(rows, 1):
+        who = f'{r.name} the {r.pclass}' + (f' [{account}]' if account else '')
+        if board == 'level':
+            score = f'level {r.level} ({r.exp} exp)'
+        elif board == 'gold':
+            score = f'{r.gold} gold'
+        else:
+            score = f'completed {r.completed}'
+        out.append(f'{i:>3}. {who}, slot {slot}: {score}')
+    return out
+
+
+def format_economy(eco: dict) -> List[str]:
+    out = [f"{eco['players']} saves, {eco['gold_total']} gold in total "
+           f"(mean {eco['gold_mean']:.0f}, median {eco['gold_median']}, p90 {eco['gold_p90']})",
+           'Gold: ' + ', '.join(f'{lo}: {n}' for lo, n in eco['gold_histogram'].items() if n),
+           f"{eco['distinct_items']} distinct items; most held:"]
+    out += [f'  {name} x{qty}' for name, qty in eco['top_items']]
+    return out
+
+
+def cli(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    sub = ap.add_subparsers(dest='cmd', required=True)
+    rb = sub.add_parser('rebuild', help='rescan every save')
+    rb.add_argument('root', nargs='?', default='game_saves')
+    rb.add_argument('-j', '--workers', type=int, default=None, help='worker processes (default: one per CPU)')
+    rb.add_argument('--sqlite', action='store_true', help='read <root>/saves.db instead of save files')
+    top = sub.add_parser('top', help='show a leaderboard')
+    top.add_argument('board', choices=BOARDS)
+    top.add_argument('-k', type=int, default=10)
+    top.add_argument('--root', default='game_saves')
+    eco = sub.add_parser('economy', help='show item counts and the gold distribution')
+    eco.add_argument('--root', default='game_saves')
+    args = ap.parse_args(argv)
+
+    a = Analytics(state_dir=lambda: args.root)
+    if args.cmd == 'rebuild':
+        a.rebuild(scan_sqlite(os.path.join(args.root, 'saves.db')) if args.sqlite
+                  else scan_files(args.root, args.workers))
+        print(f'{len(a.records)} saves, state written to {os.path.join(args.root, SNAPSHOT_FILE)}')
+        return 0
+    if not a.load():
+        print(f'no analytics state in {args.root}; run "python analytics.py rebuild {args.root}" first')
+        return 1
+    lines = format_board(args.board, a.top(args.board, args.k)) if args.cmd == 'top' else format_economy(a.economy())
+    print('\n'.join(lines))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(cli())
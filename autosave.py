@@ -0,0 +1,103 @@
+"""Background autosave: the game loop hands over snapshots, a writer thread saves them.
+
+``submit(key, snapshot, write)`` only stores the snapshot and returns. If the
+writer hasn't got to an older snapshot for the same key yet, the new one
+replaces it, so a burst of safe points (several fights in a row) costs one
+write of the newest state. The write runs in a copy of the submitting
+context, so per-session ContextVars (the save directory, the account) point
+where they did when the snapshot was taken.
+
+Write errors are kept rather than raised on the writer thread; ``error(key)``
+hands the last one to the game loop to report. ``flush()`` waits for
+everything submitted so far; ``close()`` flushes and stops the thread, and
+runs at interpreter exit if nobody called it.
+"""
+import atexit
+import contextvars
+import threading
+import time
+from typing import Callable, Dict, Hashable, Optional, Tuple
+
+import metrics
+
+AUTOSAVE_SLOT = 0  # a regular save slot, below the ones the menus offer for manual saves
+
+
+class AutosaveWriter:
+    def __init__(self, delay: float = 0.0):
+        self.delay = delay  # seconds to wait for newer snapshots before writing
+        self._cond = threading.Condition()
+        self._pending: Dict[Hashable, Tuple[object, Callable, contextvars.Context]] = {}
+        self._errors: Dict[Hashable, Exception] = {}
+        self._busy = 0
+        self._thread: Optional[threading.Thread] = None
+        self._closed = False
+
+    def _start(self):
+        self._thread = threading.Thread(target=self._run, name='autosave', daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def submit(self, key: Hashable, snapshot, write: Callable[[object], None]):
+        """Queue ``write(snapshot)``, replacing anything still queued under ``key``."""
+        ctx = contextvars.copy_context()
+        with self._cond:
+            if self._closed:
+                raise RuntimeError('autosave writer is closed')
+            if self._thread is None:
+                self._start()
+            if key in self._pending:
+                metrics.count('autosave_coalesced_total')
+            self._pending[key] = (snapshot, write, ctx)
+            self._cond.notify_all()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._pending and not self._closed:
+                    self._cond.wait()
+                if not self._pending:
+                    return  # closed and drained
+            if self.delay and not self._closed:
+                time.sleep(self.delay)
+            with self._cond:
+                key = next(iter(self._pending))
+                snapshot, write, ctx = self._pending.pop(key)
+                self._busy += 1
+            t = metrics.clock()
+            try:
+                ctx.run(write, snapshot)
+                err = None
+            except Exception as exc:
+                err = exc
+            metrics.observe('autosave_write_seconds', t)
+            with self._cond:
+                self._busy -= 1
+                if err is None:
+                    self._errors.pop(key, None)
+                else:
+                    self._errors[key] = err
+                self._cond.notify_all()
+
+    def error(self, key: Hashable) -> Optional[Exception]:
+        """The last failed write for ``key`` (cleared by reading it or by a later success)."""
+        with self._cond:
+            return self._errors.pop(key, None)
+
+    def flush(self, key: Optional[Hashable] = None, timeout: Optional[float] = None) -> bool:
+        """Wait until ``key`` (or everything) is written; False on timeout."""
+        def idle():
+            if key is None:
+                return not self._pending and not self._busy
+            return key not in self._pending and not self._busy
+        with self._cond:
+            return self._cond.wait_for(idle, timeout)
+
+    def close(self):
+        with self._cond:
+            if self._closed:
+                return
+            self._closed = True
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join()
@@ -0,0 +1,235 @@
+"""Benchmark suite for the game's public functions, with baseline regression checks.
+
+    python bench.py                          # run everything, write bench_results.json
+    python bench.py -k save --repeat 10      # only benchmarks whose name contains "save"
+    python bench.py --save-baseline          # store this run as bench_baseline.json
+    python bench.py --threshold 0.2          # fail (exit 1) if anything got >20% slower than the baseline
+
+Everything runs headless (game output is discarded) in a scratch save
+directory, and all test data and fights come from fixed seeds, so two runs do the
+same work. Each benchmark reports the best and median time per call over
+``--repeat`` runs; the best time is what gets compared against the baseline.
+"""
+import argparse
+import contextlib
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import time
+from typing import Callable, Dict, List, Optional
+
+import main
+from gameio import use_io
+from main import Enemy, Item, Player, Shop
+from session import use_rng
+
+RESULTS_FILE = 'bench_results.json'
+BASELINE_FILE = 'bench_baseline.json'
+DEFAULT_THRESHOLD = 0.15
+SIZES = (10, 1_000, 100_000)
+
+MATERIALS = [
+    Item('Herb', 'material', value=3), Item('Iron Ore', 'material', value=5), Item('Wood', 'material', value=2),
+    Item('Water', 'material', value=1), Item('Leather', 'material', value=4), Item('Bone', 'material', value=1),
+]
+
+
+class HeadlessIO:
+    """Discards output and answers every prompt with the same line."""
+
+    def __init__(self, answer: str = 'a'):
+        self.answer = answer
+
+    def write(self, text: str):
+        pass
+
+    def read(self, prompt: str) -> str:
+        return self.answer
+
+
+class Bench:
+    def __init__(self, name: str, fn: Callable, setup: Optional[Callable] = None, number: int = 1):
+        self.name = name
+        self.fn = fn          # fn(state), the timed part
+        self.setup = setup    # setup() -> state, run before every repeat and not timed
+        self.number = number  # calls per timed run, for very fast functions
+
+
+def make_player(n_items: int, seed: int = 0) -> Player:
+    """A player carrying ``n_items`` units spread over up to n/10 distinct item kinds."""
+    rng = random.Random(seed)
+    kinds = [Item(f'Trinket {i}', 'material', value=i % 50 + 1) for i in range(max(1, n_items // 10))]
+    p = Player('Bench', 'Rogue')
+    for _ in range(n_items):
+        p.add_item(rng.choice(kinds))
+    p.equipment.equip(Item('Iron Sword', 'weapon', 6, 50))
+    p.equipment.equip(Item('Leather Armor', 'armor', 3, 40))
+    return p
+
+
+def _crafter(n_items: int) -> Player:
+    p = make_player(n_items)
+    for it in MATERIALS:
+        p.add_item(it, 1_000)
+    return p
+
+
+def _fights(n: int, seed: int):
+    player = Player('Bench', 'Warrior')
+    player.level = 50
+    goblin = Enemy('Goblin', health=40, power=8, exp=15, gold=8, loot=[Item('Herb', 'material', value=2)])
+    with use_rng(random.Random(seed)):
+        for _ in range(n):
+            player.health = player.max_health()
+            main.combat(player, goblin.clone())
+    return player
+
+
+def _gold(p: Player) -> Player:
+    p.gold = 10_000
+    return p
+
+
+def _fill_slots(n: int):
+    main.DEFAULT_SAVE_SLOTS = n
+    p = make_player(10)
+    for slot in range(1, n + 1):
+        main.save_to_slot(p, slot, 'binary' if slot % 2 else 'json')
+
+
+def _drop_index():
+    with contextlib.suppress(FileNotFoundError):
+        os.remove(main.index_path())
+
+
+def suite(sizes=SIZES) -> List[Bench]:
+    benches = []
+    for n in sizes:
+        small = n <= 1_000
+        p = make_player(n)
+        doc = p.to_dict()
+        benches += [
+            Bench(f'player_to_dict[{n}]', lambda _, p=p: p.to_dict(), number=100 if small else 1),
+            Bench(f'player_from_dict[{n}]', lambda _, d=doc: Player.from_dict(d), number=100 if small else 1),
+        ]
+        for fmt in ('json', 'binary'):
+            def roundtrip(_, p=p, fmt=fmt):
+                main.save_to_slot(p, 1, fmt)
+                main.load_from_slot(1)
+            benches.append(Bench(f'save_load[{fmt}][{n}]', roundtrip, number=10 if small else 1))
+        benches.append(Bench(f'craft_item[{n}]', lambda p: main.craft_item(p, 'Iron Sword', 10),
+                             setup=lambda n=n: _crafter(n)))
+        shop = Shop()
+
+        def trade(p, shop=shop):
+            for _ in range(100):
+                shop.buy(p, 'Potion')
+                shop.sell(p, 'Potion')
+        benches.append(Bench(f'shop_buy_sell_x100[{n}]', trade, setup=lambda n=n: _gold(make_player(n))))
+    benches += [
+        Bench('list_save_slots[500 slots, indexed]', lambda _: main.list_save_slots(),
+              setup=lambda: _fill_slots(500), number=10),
+        Bench('list_save_slots[500 slots, no index]', lambda _: main.list_save_slots(),
+              setup=lambda: (_fill_slots(500), _drop_index())),
+        Bench('gain_exp[10M exp]', lambda p: p.gain_exp(10_000_000), setup=lambda: Player('Bench', 'Mage')),
+        Bench('combat[200 goblins, seed 1]', lambda _: _fights(200, 1)),
+    ]
+    return benches
+
+
+@contextlib.contextmanager
+def scratch():
+    """Headless I/O and a throwaway DATA_DIR; build the suite inside it too, since a Player loads the content packs."""
+    slots, data_dir = main.DEFAULT_SAVE_SLOTS, main.DATA_DIR
+    with tempfile.TemporaryDirectory() as d, use_io(HeadlessIO()):
+        main.DATA_DIR = d
+        try:
+            yield d
+        finally:
+            main.DEFAULT_SAVE_SLOTS, main.DATA_DIR = slots, data_dir
+
+
+def run(benches: List[Bench], repeat: int = 5, pattern: str = '') -> Dict[str, dict]:
+    """Time ``benches``; call it inside scratch()."""
+    results = {}
+    for b in benches:
+        if pattern not in b.name:
+            continue
+        times = []
+        for _ in range(repeat):
+            state = b.setup() if b.setup else None
+            t = time.perf_counter()
+            for _ in range(b.number):
+                b.fn(state)
+            times.append((time.perf_counter() - t) / b.number)
+        results[b.name] = {'best': min(times), 'median': statistics.median(times), 'runs': repeat}
+    return results
+
+
+def compare(results: Dict[str, dict], baseline: Dict[str, dict], threshold: float) -> List[tuple]:
+    """(name, baseline s, now s, change) for every benchmark slower than baseline by more than ``threshold``."""
+    slower = []
+    for name, r in results.items():
+        base = baseline.get(name)
+        if base and base['best'] > 0:
+            change = r['best'] / base['best'] - 1
+            if change > threshold:
+                slower.append((name, base['best'], r['best'], change))
+    return slower
+
+
+def _load(path: str) -> Optional[dict]:
+    try:
+        with open(path, 'r') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def _dump(path: str, results: Dict[str, dict]):
+    doc = {'python': sys.version.split()[0], 'platform': platform.platform(),
+           'timestamp': main.now_ts(), 'results': results}
+    tmp = path + '.tmp'
+    with open(tmp, 'w') as f:
+        json.dump(doc, f, indent=2)
+    os.replace(tmp, path)
+
+
+def cli(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument('-k', dest='pattern', default='', help='only run benchmarks whose name contains this')
+    ap.add_argument('--repeat', type=int, default=5)
+    ap.add_argument('--sizes', type=int, nargs='+', default=list(SIZES), help='inventory sizes')
+    ap.add_argument('--out', default=RESULTS_FILE)
+    ap.add_argument('--baseline', default=BASELINE_FILE)
+    ap.add_argument('--save-baseline', action='store_true', help='write this run to the baseline file')
+    ap.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                    help='allowed slowdown vs the baseline, as a fraction (default %(default)s)')
+    args = ap.parse_args(argv)
+
+    baseline = _load(args.baseline)
+    base = baseline['results'] if baseline else {}
+    with scratch():
+        results = run(suite(args.sizes), args.repeat, args.pattern)
+    print(f"{'benchmark':<40} {'best ms':>11} {'median ms':>11} {'vs base':>9}")
+    for name, r in results.items():
+        vs = f"{r['best'] / base[name]['best'] - 1:>+9.1%}" if name in base and base[name]['best'] else ''
+        print(f"{name:<40} {r['best'] * 1000:>11.3f} {r['median'] * 1000:>11.3f} {vs}")
+    _dump(args.out, results)
+    if args.save_baseline:
+        # a partial run (-k) only replaces the benchmarks it ran
+        _dump(args.baseline, {**base, **results})
+        print(f'baseline saved to {args.baseline}')
+        return 0
+    slower = compare(results, base, args.threshold)
+    for name, was, now, change in slower:
+        print(f'REGRESSION {name}: {was * 1000:.3f} ms -> {now * 1000:.3f} ms ({change:+.1%})')
+    return 1 if slower else 0
+
+
+if __name__ == '__main__':
+    sys.exit(cli())
@@ -0,0 +1,63 @@
+"""Item memory benchmark (tracemalloc): per-instance dict items vs interned templates.
+
+    python bench_memory.py            # 1M items
+    python bench_memory.py -n 100000
+"""
+import argparse
+import gc
+import random
+import tracemalloc
+
+from inventory import Inventory
+from main import Item
+
+DROPS = [('Herb', 'material', 0, 2), ('Iron Ore', 'material', 0, 5), ('Bone', 'material', 0, 1),
+         ('Scale', 'material', 0, 20), ('Gold Nugget', 'material', 0, 30), ('Potion', 'consumable', 20, 10),
+         ('Iron Sword', 'weapon', 6, 50), ('Leather Armor', 'armor', 3, 40)]
+
+
+class LegacyItem:
+    """The Item class as it was before templates: four attributes in a per-instance __dict__."""
+
+    def __init__(self, name: str, type_: str, power: int = 0, value: int = 0):
+        self.name = name
+        self.type = type_
+        self.power = power
+        self.value = value
+
+
+def measure(build):
+    gc.collect()
+    tracemalloc.start()
+    obj = build()
+    size, _peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del obj
+    return size
+
+
+def run(n: int, seed: int = 0):
+    rng = random.Random(seed)
+    drops = [rng.choice(DROPS) for _ in range(n)]
+    # names come from the game's literals, so share the string objects like real drops do
+    cases = [
+        ('list of dict-based items (before)', lambda: [LegacyItem(*d) for d in drops]),
+        ('list of slotted template items', lambda: [Item(*d) for d in drops]),
+        ('stacked Inventory of template items', lambda: Inventory(Item(*d) for d in drops)),
+    ]
+    return [(label, measure(build)) for label, build in cases]
+
+
+def cli(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument('-n', type=int, default=1_000_000)
+    args = ap.parse_args(argv)
+    rows = run(args.n)
+    base = rows[0][1]
+    print(f"{'layout':<38} {'KiB':>10} {'bytes/item':>11} {'vs before':>10}")
+    for label, size in rows:
+        print(f'{label:<38} {size / 1024:>10.1f} {size / args.n:>11.2f} {size / base:>9.1%}')
+
+
+if __name__ == '__main__':
+    cli()
@@ -0,0 +1,84 @@
+"""Compare the JSON and binary save formats: file size, save and load latency.
+
+    python bench_saves.py                 # 10, 10k and 1M item inventories
+    python bench_saves.py --sizes 10 1000
+"""
+import argparse
+import contextlib
+import io
+import os
+import random
+import tempfile
+import time
+
+import main
+from main import Item, Player
+
+ITEM_POOL = [
+    Item('Herb', 'material', value=3), Item('Iron Ore', 'material', value=5), Item('Wood', 'material', value=2),
+    Item('Bone', 'material', value=1), Item('Scale', 'material', value=20), Item('Potion', 'consumable', 20, 10),
+    Item('Health Potion', 'consumable', 30, 15), Item('Iron Sword', 'weapon', 6, 50),
+    Item('Leather Armor', 'armor', 3, 40), Item('Gold Nugget', 'material', value=30),
+]
+
+
+def item_kinds(n: int) -> list:
+    """``n`` distinct items: the pool, then numbered variants of it ("Herb 2", ...)."""
+    kinds = []
+    for i in range(n):
+        base = ITEM_POOL[i % len(ITEM_POOL)]
+        name = base.name if i < len(ITEM_POOL) else f'{base.name} {i // len(ITEM_POOL) + 1}'
+        kinds.append(Item(name, base.type, base.power, base.value))
+    return kinds
+
+
+def make_player(n_items: int, seed: int = 0) -> Player:
+    # identical items share a stack, so the number of kinds grows with the item count
+    # (about four units per stack); otherwise every size would save the same ten stacks
+    rng = random.Random(seed)
+    kinds = item_kinds(max(len(ITEM_POOL), n_items // 4))
+    p = Player('Bench', 'Rogue')
+    p.inventory = [Item.of(rng.choice(kinds).template) for _ in range(n_items)]
+    p.equipment.equip(ITEM_POOL[7])
+    p.equipment.equip(ITEM_POOL[8])
+    return p
+
+
+def _best(fn, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        t = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t)
+    return best
+
+
+def run(sizes, repeat=3):
+    rows = []
+    with tempfile.TemporaryDirectory() as d, contextlib.redirect_stdout(io.StringIO()):
+        main.DATA_DIR = d
+        for n in sizes:
+            player = make_player(n)
+            r = 1 if n >= 100_000 else repeat
+            for fmt in ('json', 'binary'):
+                save = _best(lambda: main.save_to_slot(player, 1, fmt), r)
+                size = os.path.getsize(main.save_path(1, fmt))
+                load = _best(lambda: main.load_from_slot(1), r)
+                loaded = main.load_from_slot(1)
+                assert loaded.to_dict()['inventory'] == player.to_dict()['inventory']
+                rows.append((n, fmt, size, save, load))
+    return rows
+
+
+def cli(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument('--sizes', type=int, nargs='+', default=[10, 10_000, 1_000_000])
+    ap.add_argument('--repeat', type=int, default=3)
+    args = ap.parse_args(argv)
+    print(f"{'items':>9} {'format':>7} {'bytes':>12} {'save ms':>10} {'load ms':>10}")
+    for n, fmt, size, save, load in run(args.sizes, args.repeat):
+        print(f'{n:>9} {fmt:>7} {size:>12} {save * 1000:>10.2f} {load * 1000:>10.2f}')
+
+
+if __name__ == '__main__':
+    cli()
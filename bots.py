@@ -0,0 +1,337 @@
+"""Bots that play the real game loop, and a harness that runs many full playthroughs.
+
+    python bots.py -n 500                          # 500 seeded runs of the standard policy, one worker per CPU
+    python bots.py -n 200 --policy rush --class Mage -j 4
+    python bots.py -n 1000 --out bot_runs          # where the tables go (see below)
+
+A bot is a game I/O object: ``play_game`` asks it for input like it would a
+player, and the bot answers every prompt from its ``Policy`` and the live
+``Player``. Each game-loop menu choice is one *action*, the harness's unit of
+time. The built-in policies grind in the Forest until a target level, keep
+potions bought from the Shop, craft and equip an Iron Sword, fast travel to
+the Boss Lair (which walks the story forward) and attempt the boss, raising
+their target level after every loss. Subclass ``Policy`` for other play styles.
+
+Every run is seeded (its fights use ``random.Random(seed)``) and traced:
+the action each level was reached at, gold every ``--sample`` actions and
+where each death happened. Runs are spread over a process pool. The
+results are four tables: ``runs`` (one row per playthrough), ``levels``,
+``gold`` and ``deaths``. With pyarrow installed each is written as
+``<out>/<table>.parquet``. Otherwise they all go to ``<out>/tables.json`` as
+``{table: {column: [values]}}``, which loads straight into a DataFrame.
+"""
+import argparse
+import concurrent.futures
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+from collections import Counter
+from typing import Dict, List, Optional
+
+import main
+from gameio import use_io
+from main import Player
+from session import use_rng
+
+CLASSES = ('Warrior', 'Mage', 'Rogue')
+MAX_ACTIONS = 5_000
+SAMPLE_EVERY = 25
+POTION = 'Potion'
+SWORD = 'Iron Sword'
+
+
+def prices():
+    """NPC shop prices, from the loaded content packs."""
+    return {name: it.value for name, it in main.content().shop.items()}
+
+
+class BotStuck(Exception):
+    """The game asked something the bot has no answer for."""
+
+
+class OutOfActions(Exception):
+    pass
+
+
+class Policy:
+    """Decides what a bot does; override any of the methods."""
+
+    def __init__(self, grind_level: int = 6, grind_at: str = 'Forest', potions: int = 5, heal_below: float = 0.4,
+                 sword: bool = True, retry_levels: int = 2):
+        self.grind_level = grind_level    # level to reach before going for the boss
+        self.grind_at = grind_at
+        self.potions = potions            # how many Potions to keep
+        self.heal_below = heal_below      # drink when HP is below this fraction of max
+        self.sword = sword                # craft and equip an Iron Sword
+        self.retry_levels = retry_levels  # extra levels to grind after losing to the boss
+
+    def sword_shopping(self, bot: 'Bot') -> Dict[str, int]:
+        """Materials to buy (name -> qty) before the sword can be crafted."""
+        return dict(main.content().recipe_book.plan(SWORD, 1, bot.player.inventory.count).missing)
+
+    def next_action(self, bot: 'Bot') -> str:
+        """One of: quit, equip, craft, shop, heal, travel, explore, boss."""
+        p = bot.player
+        if p.story_progress >= 99:
+            return 'quit'
+        gold = p.gold
+        if self.sword and (p.equipment.weapon is None or p.equipment.weapon.name != SWORD):
+            if p.inventory.count(SWORD):
+                bot.equip = SWORD
+                return 'equip'
+            if main.content().recipe_book.plan(SWORD, 1, p.inventory.count).ok:
+                bot.craft = SWORD
+                return 'craft'
+            need = self.sword_shopping(bot)
+            price = prices()
+            cost = sum(price.get(m, 0) * n for m, n in need.items())
+            if all(m in price for m in need) and gold >= cost:
+                bot.buy = [m for m, n in need.items() for _ in range(n)]
+                return 'shop'
+            gold -= cost  # save up for it before spending on potions
+        have = p.inventory.count(POTION)
+        potion = prices()[POTION]
+        if have < self.potions and gold >= potion:
+            bot.buy = [POTION] * min(self.potions - have, gold // potion)
+            return 'shop'
+        if p.health < self.heal_below * p.max_health() and have:
+            return 'heal'
+        target = self.grind_at if p.level < self.grind_level else 'Boss Lair'
+        if p.location != target:
+            bot.destination = target
+            return 'travel'
+        return 'explore' if target == self.grind_at else 'boss'
+
+    def combat_action(self, bot: 'Bot') -> str:
+        p = bot.player
+        if p.health < self.heal_below * p.max_health() and p.inventory.count(POTION):
+            return 'u'
+        return 's'  # every class's skill out-damages a plain attack
+
+    def boss_action(self, bot: 'Bot') -> str:
+        p = bot.player
+        if p.health < self.heal_below * p.max_health() and p.inventory.count(POTION):
+            return 'u'
+        return 'a'
+
+    def lost_to_boss(self, bot: 'Bot'):
+        self.grind_level = max(self.grind_level, bot.player.level) + self.retry_levels
+
+
+POLICIES = {
+    'standard': lambda: Policy(),
+    'rush': lambda: Policy(grind_level=1, potions=3, sword=False, retry_levels=1),
+    'careful': lambda: Policy(grind_level=10, potions=10, heal_below=0.6, retry_levels=3),
+}
+
+# game-loop menu choices for Policy.next_action()
+MENU = {'travel': '1', 'explore': '2', 'equip': '3', 'heal': '3', 'craft': '4', 'shop': '5', 'boss': '7', 'quit': '9'}
+
+
+class Bot:
+    """Answers the game's prompts for ``player`` and records the run's trace."""
+
+    def __init__(self, policy: Policy, player: Player, max_actions: int = MAX_ACTIONS,
+                 sample_every: int = SAMPLE_EVERY):
+        self.policy = policy
+        self.player = player
+        self.max_actions = max_actions
+        self.sample_every = sample_every
+        self.actions = 0
+        self.mode = None
+        self.destination = None
+        self.equip = None
+        self.craft = None
+        self.buy: List[str] = []
+        # trace
+        self.levels = {player.level: 0}
+        self.gold = []
+        self.deaths = []  # (action, location, level, 'enemy' | 'boss')
+        self.boss_attempts = 0
+        self.completed_at = None
+
+    def write(self, text: str):
+        if text.startswith('You were defeated'):
+            self.deaths.append((self.actions, self.player.location, self.player.level, 'enemy'))
+        elif text.startswith('You were slain by the boss'):
+            self.deaths.append((self.actions, self.player.location, self.player.level, 'boss'))
+            self.policy.lost_to_boss(self)
+
+    def _tick(self):
+        p = self.player
+        for lvl in range(max(self.levels) + 1, p.level + 1):
+            self.levels[lvl] = self.actions
+        if self.actions % self.sample_every == 0:
+            self.gold.append((self.actions, p.gold))
+        if p.story_progress >= 99 and self.completed_at is None:
+            self.completed_at = self.actions
+        if self.actions >= self.max_actions:
+            raise OutOfActions
+        self.actions += 1
+
+    def read(self, prompt: str) -> str:
+        if prompt == 'Choose> ':
+            self._tick()
+            self.mode = self.policy.next_action(self)
+            if self.mode == 'boss':
+                self.boss_attempts += 1
+            return MENU[self.mode]
+        if prompt.startswith('Choose action:'):
+            return self.policy.combat_action(self)
+        if prompt.startswith('Attack (a) or Use Item (u)'):
+            return self.policy.boss_action(self)
+        if prompt in ('Item name to use: ', 'Item name: '):
+            return POTION
+        if prompt == 'Choose destination number: ':
+            return 'f'
+        if prompt == 'Fast travel to: ':
+            return self.destination
+        if prompt in ('Travel? (y/n) ', 'Exit to main menu? (y/n) '):
+            return 'y'
+        if prompt.startswith('Enter recipe name'):
+            return self.craft
+        if prompt.startswith('Enter item name to equip'):
+            return self.equip
+        if prompt.startswith('-- page'):
+            return 'q'
+        if prompt == '> ':
+            if self.mode == 'shop':
+                return f'buy {self.buy.pop()}' if self.buy else 'exit'
+            if self.mode == 'equip':
+                return '2'
+            if self.mode == 'heal':
+                return '3'
+        raise BotStuck(f'no answer for {prompt!r} while doing {self.mode!r}')
+
+
+def play(seed: int, policy: str = 'standard', pclass: Optional[str] = None, max_actions: int = MAX_ACTIONS,
+         sample_every: int = SAMPLE_EVERY) -> dict:
+    """One seeded playthrough; returns its trace. Runs in a worker."""
+    pclass = pclass or CLASSES[seed % len(CLASSES)]
+    player = Player(f'Bot{seed}', pclass)
+    bot = Bot(POLICIES[policy](), player, max_actions, sample_every)
+    error = ''
+    try:
+        with use_io(bot), use_rng(random.Random(seed)):
+            main.play_game(player)
+    except OutOfActions:
+        pass
+    except BotStuck as exc:
+        error = str(exc)
+    bot.gold.append((bot.actions, player.gold))
+    return {
+        'seed': seed, 'policy': policy, 'pclass': pclass, 'completed': bot.completed_at is not None,
+        'actions': bot.completed_at if bot.completed_at is not None else bot.actions,
+        'final_level': player.level, 'final_gold': player.gold, 'boss_attempts': bot.boss_attempts,
+        'deaths': bot.deaths, 'levels': sorted(bot.levels.items()), 'gold': bot.gold, 'error': error,
+    }
+
+
+def _init_worker(data_dir: str):
+    # bots never save; anything the game does write (world state) stays out of game_saves
+    main.DATA_DIR = data_dir
+    main.AUTOSAVE = False
+
+
+def run(seeds, policy: str = 'standard', pclass: Optional[str] = None, workers: Optional[int] = None,
+        max_actions: int = MAX_ACTIONS, sample_every: int = SAMPLE_EVERY) -> List[dict]:
+    seeds = list(seeds)
+    with tempfile.TemporaryDirectory(prefix='pyrealm-bots-') as d:
+        with concurrent.futures.ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(d,)) as pool:
+            futs = [pool.submit(play, s, policy, pclass, max_actions, sample_every) for s in seeds]
+            return [f.result() for f in futs]
+
+
+def tables(results: List[dict]) -> Dict[str, Dict[str, list]]:
+    """The runs as columns: {table: {column: values}}."""
+    runs = {k: [] for k in ('seed', 'policy', 'pclass', 'completed', 'actions', 'final_level', 'final_gold',
+                            'boss_attempts', 'deaths', 'error')}
+    levels = {'seed': [], 'level': [], 'action': []}
+    gold = {'seed': [], 'action': [], 'gold': []}
+    deaths = {'seed': [], 'action': [], 'location': [], 'level': [], 'cause': []}
+    for r in results:
+        for k in runs:
+            runs[k].append(len(r['deaths']) if k == 'deaths' else r[k])
+        for lvl, action in r['levels']:
+            levels['seed'].append(r['seed'])
+            levels['level'].append(lvl)
+            levels['action'].append(action)
+        for action, g in r['gold']:
+            gold['seed'].append(r['seed'])
+            gold['action'].append(action)
+            gold['gold'].append(g)
+        for action, loc, lvl, cause in r['deaths']:
+            for k, v in zip(('seed', 'action', 'location', 'level', 'cause'), (r['seed'], action, loc, lvl, cause)):
+                deaths[k].append(v)
+    return {'runs': runs, 'levels': levels, 'gold': gold, 'deaths': deaths}
+
+
+def write_tables(out_dir: str, cols: Dict[str, Dict[str, list]]) -> List[str]:
+    os.makedirs(out_dir, exist_ok=True)
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        path = os.path.join(out_dir, 'tables.json')
+        tmp = path + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(cols, f)
+        os.replace(tmp, path)
+        return [path]
+    paths = []
+    for name, table in cols.items():
+        path = os.path.join(out_dir, f'{name}.parquet')
+        pq.write_table(pa.table(table), path)
+        paths.append(path)
+    return paths
+
+
+def summary(results: List[dict]) -> List[str]:
+    done = [r for r in results if r['completed']]
+    out = [f"{len(done)}/{len(results)} runs finished the story"]
+    if done:
+        acts = sorted(r['actions'] for r in done)
+        out.append(f"actions to finish: median {statistics.median(acts):g}, "
+                   f"p90 {acts[min(len(acts) - 1, int(len(acts) * 0.9))]}, fastest {acts[0]}")
+        out.append(f"level at the end: median {statistics.median(r['final_level'] for r in done):g}; "
+                   f"boss attempts: median {statistics.median(r['boss_attempts'] for r in done):g}")
+    by_level: Dict[int, List[int]] = {}
+    for r in results:
+        for lvl, action in r['levels']:
+            by_level.setdefault(lvl, []).append(action)
+    if len(by_level) > 1:
+        out.append('median actions to reach level: ' + ', '.join(
+            f'{lvl}: {statistics.median(a):g}' for lvl, a in sorted(by_level.items())[1:]))
+    deaths = Counter((loc, cause) for r in results for _, loc, _, cause in r['deaths'])
+    if deaths:
+        out.append('deaths: ' + ', '.join(f'{loc} ({cause}) {n}' for (loc, cause), n in deaths.most_common()))
+    stuck = [r for r in results if r['error']]
+    if stuck:
+        out.append(f"{len(stuck)} runs got stuck, e.g. seed {stuck[0]['seed']}: {stuck[0]['error']}")
+    return out
+
+
+def cli(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument('-n', '--runs', type=int, default=100)
+    ap.add_argument('--seed', type=int, default=0, help='first seed; runs use seed, seed+1, ...')
+    ap.add_argument('--policy', choices=sorted(POLICIES), default='standard')
+    ap.add_argument('--class', dest='pclass', choices=CLASSES, help='default: rotate through the classes')
+    ap.add_argument('-j', '--workers', type=int, default=None, help='worker processes (default: one per CPU)')
+    ap.add_argument('--max-actions', type=int, default=MAX_ACTIONS, help='give up on a run after this many')
+    ap.add_argument('--sample', type=int, default=SAMPLE_EVERY, help='record gold every N actions')
+    ap.add_argument('--out', default='bot_runs', help='directory for the result tables')
+    args = ap.parse_args(argv)
+    results = run(range(args.seed, args.seed + args.runs), args.policy, args.pclass, args.workers,
+                  args.max_actions, args.sample)
+    print('\n'.join(summary(results)))
+    for path in write_tables(args.out, tables(results)):
+        print(f'wrote {path}')
+    return 1 if any(r['error'] for r in results) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(cli())
@@ -0,0 +1,264 @@
+"""Game content (map, recipes, shop, enemies, boss, quests) loaded from data packs.
+
+A pack is a JSON file in one of the pack directories (``packs/base.json``
+is the stock game). Packs load in directory order, then file-name order, and
+a later pack overrides an earlier one key by key:
+
+    world     location -> neighbouring locations (a list, or {location: travel cost})
+    frontier  the location the procedural world attaches to
+    recipes   name -> {"materials": {item: qty}, "result": item}
+    shop      [item, ...] (by name)
+    spawns    location -> [{"enemy": {...}, "loot": [[item, chance]], "weight", "levels", "rarity"}]
+              ("*" is the fallback table for everywhere else)
+    boss      {"name", "health", "power", "exp", "gold", "phases", "loot": [item]}
+    quests    [{"id", "desc", "objectives", "reward", "reward_exp"}] (by id, see quests.py)
+
+Items are ``{"name", "type", "power", "value"}``, as in saves.
+
+The merged packs are validated once and the result is stored in
+``cache_dir`` as a marshal blob named by the SHA-256 of the pack files. When
+the packs haven't changed, ``load()`` reads them only to hash them; the JSON
+parse, merge and validation are skipped. ``signature()`` is a cheap
+stat-based check for whether the pack files changed on disk, which is what
+hot reloading polls.
+
+``Content`` turns the compiled data into game objects. main.py passes the
+constructors for items, enemies and bosses, so this module never imports it.
+"""
+import glob
+import hashlib
+import json
+import marshal
+import os
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+import metrics
+import saveformat
+from crafting import RecipeBook
+from quests import ANY, QuestDef
+from spawns import RARITY_WEIGHTS, SpawnRegistry
+from worldgraph import WorldGraph
+
+COMPILED_VERSION = 1  # bump when the compiled layout changes; old cache files are then ignored
+ITEM_TYPES = ('weapon', 'armor', 'consumable', 'material')
+SECTIONS = ('world', 'frontier', 'recipes', 'shop', 'spawns', 'boss', 'quests')
+
+
+class ContentError(ValueError):
+    pass
+
+
+def pack_files(dirs: Iterable[str]) -> List[str]:
+    files = []
+    for d in dirs:
+        files.extend(sorted(glob.glob(os.path.join(d, '*.json'))))
+    return files
+
+
+def signature(dirs: Iterable[str]) -> Tuple:
+    """Changes whenever a pack file is added, removed or rewritten."""
+    sig = []
+    for p in pack_files(dirs):
+        try:
+            st = os.stat(p)
+        except FileNotFoundError:
+            continue
+        sig.append((p, st.st_mtime_ns, st.st_size))
+    return tuple(sig)
+
+
+# -------------------------
+# Validation
+# -------------------------
+
+def _int(where: str, v, lo: int = 0) -> int:
+    if not isinstance(v, int) or isinstance(v, bool) or v < lo:
+        raise ContentError(f'{where}: expected an integer >= {lo}, got {v!r}')
+    return v
+
+
+def _item(where: str, d) -> dict:
+    if not isinstance(d, dict) or not isinstance(d.get('name'), str) or not d['name']:
+        raise ContentError(f'{where}: an item needs a name')
+    if d.get('type') not in ITEM_TYPES:
+        raise ContentError(f"{where}: item {d['name']!r} has unknown type {d.get('type')!r}")
+    return {'name': d['name'], 'type': d['type'], 'power': _int(where, d.get('power', 0)),
+            'value': _int(where, d.get('value', 0))}
+
+
+def _enemy(where: str, d) -> dict:
+    if not isinstance(d, dict) or not isinstance(d.get('name'), str):
+        raise ContentError(f'{where}: an enemy needs a name')
+    return {'name': d['name'], 'health': _int(where, d.get('health'), 1), 'power': _int(where, d.get('power'), 1),
+            'exp': _int(where, d.get('exp', 10)), 'gold': _int(where, d.get('gold', 5))}
+
+
+def _spawn(where: str, d) -> dict:
+    levels = d.get('levels', [1, None])
+    if not isinstance(levels, list) or len(levels) != 2:
+        raise ContentError(f'{where}: levels must be [min, max or null]')
+    lo = _int(where, levels[0], 1)
+    if levels[1] is not None and _int(where, levels[1], 1) < lo:
+        raise ContentError(f'{where}: max level is below min level')
+    if d.get('rarity', 'common') not in RARITY_WEIGHTS:
+        raise ContentError(f"{where}: unknown rarity {d['rarity']!r}")
+    weight = d.get('weight', 1.0)
+    if not isinstance(weight, (int, float)) or weight <= 0:
+        raise ContentError(f'{where}: weight must be positive')
+    loot = []
+    for item, chance in d.get('loot', ()):
+        if not isinstance(chance, (int, float)) or not 0 < chance <= 1:
+            raise ContentError(f'{where}: drop chance must be in (0, 1]')
+        loot.append([_item(where, item), float(chance)])
+    return {'enemy': _enemy(where, d.get('enemy')), 'loot': loot, 'weight': float(weight),
+            'levels': [levels[0], levels[1]], 'rarity': d.get('rarity', 'common')}
+
+
+def validate(d: dict) -> dict:
+    """Check merged pack data; returns it normalized (every default filled in)."""
+    missing = [s for s in SECTIONS if s not in d]
+    if missing:
+        raise ContentError(f"missing sections: {', '.join(missing)}")
+    world = {}
+    places = set(d['world'])  # a location only ever named as a destination is a dead end
+    for loc, dests in d['world'].items():
+        if isinstance(dests, dict):
+            for dst, cost in dests.items():
+                if not isinstance(cost, (int, float)) or cost < 0:
+                    raise ContentError(f'world: travel cost {loc!r} -> {dst!r} must be >= 0')
+        world[loc] = dict(dests) if isinstance(dests, dict) else list(dests)  # {dst: cost} or [dst]
+        places.update(dests)
+    if d['frontier'] is not None and d['frontier'] not in places:
+        raise ContentError(f"frontier: unknown location {d['frontier']!r}")
+    recipes = {}
+    for name, r in d['recipes'].items():
+        where = f'recipes.{name}'
+        mats = {k: _int(where, v, 1) for k, v in r.get('materials', {}).items()}
+        if not mats:
+            raise ContentError(f'{where}: a recipe needs materials')
+        recipes[name] = {'materials': mats, 'result': _item(where, r.get('result'))}
+    spawns = {}
+    for loc, entries in d['spawns'].items():
+        if loc != ANY and loc not in places:
+            raise ContentError(f'spawns: unknown location {loc!r}')
+        spawns[loc] = [_spawn(f'spawns.{loc}', e) for e in entries]
+    boss = d['boss']
+    quests = []
+    for q in d['quests']:
+        try:
+            QuestDef.from_dict(q)
+        except (KeyError, TypeError, ValueError) as exc:
+            raise ContentError(f"quests.{q.get('id', '?')}: {exc}") from None
+        quests.append({'id': q['id'], 'desc': q['desc'], 'objectives': [list(o) for o in q['objectives']],
+                       'reward': _int(q['id'], q.get('reward', 0)), 'reward_exp': _int(q['id'], q.get('reward_exp', 0))})
+    return {
+        'world': world,
+        'frontier': d['frontier'],
+        'recipes': recipes,
+        'shop': [_item('shop', it) for it in d['shop']],
+        'spawns': spawns,
+        'boss': {**_enemy('boss', boss), 'phases': _int('boss', boss.get('phases', 2), 1),
+                 'loot': [_item('boss', it) for it in boss.get('loot', ())]},
+        'quests': quests,
+    }
+
+
+def merge(packs: Iterable[Tuple[str, dict]]) -> dict:
+    """Overlay packs in order: dict sections merge by key, shop items by name, quests by id."""
+    out: dict = {'world': {}, 'recipes': {}, 'spawns': {}, 'shop': {}, 'quests': {}}
+    for path, pack in packs:
+        if not isinstance(pack, dict):
+            raise ContentError(f'{path}: a pack is a JSON object')
+        for key, v in pack.items():
+            if key not in SECTIONS:
+                raise ContentError(f'{path}: unknown section {key!r}')
+            if key == 'shop':
+                out['shop'].update((it.get('name'), it) for it in v)
+            elif key == 'quests':
+                out['quests'].update((q.get('id'), q) for q in v)
+            elif key in ('world', 'recipes', 'spawns'):
+                out[key].update(v)
+            else:
+                out[key] = v
+    out['shop'] = list(out['shop'].values())
+    out['quests'] = list(out['quests'].values())
+    return out
+
+
+# -------------------------
+# Loading and the compiled cache
+# -------------------------
+
+def _compile(blobs: List[Tuple[str, bytes]]) -> dict:
+    packs = []
+    for path, raw in blobs:
+        try:
+            packs.append((path, json.loads(raw)))
+        except ValueError as exc:
+            raise ContentError(f'{path}: {exc}') from None
+    return validate(merge(packs))
+
+
+def load(dirs: Iterable[str], cache_dir: Optional[str] = None) -> Tuple[str, dict, Tuple]:
+    """(content hash, compiled data, signature) for the packs in ``dirs``."""
+    dirs = list(dirs)
+    sig = signature(dirs)  # taken first, so an edit during the load shows up on the next check
+    blobs = []
+    h = hashlib.sha256(b'v%d' % COMPILED_VERSION)
+    for p in pack_files(dirs):
+        with open(p, 'rb') as f:
+            raw = f.read()
+        blobs.append((p, raw))
+        h.update(b'%s\0%d\0' % (os.path.basename(p).encode(), len(raw)))
+        h.update(raw)
+    if not blobs:
+        raise ContentError(f"no content packs in {', '.join(dirs)}")
+    digest = h.hexdigest()
+    cached = os.path.join(cache_dir, f'content-{digest}.bin') if cache_dir else None
+    if cached:
+        try:
+            with open(cached, 'rb') as f:
+                data = marshal.load(f)
+            metrics.count('content_cache_hits_total')
+            return digest, data, sig
+        except (OSError, EOFError, ValueError, TypeError):
+            pass  # missing or unreadable; compile again
+    data = _compile(blobs)
+    metrics.count('content_compiles_total')
+    if cached:
+        os.makedirs(cache_dir, exist_ok=True)
+        saveformat.atomic_write(cached, marshal.dumps(data))
+        for old in glob.glob(os.path.join(cache_dir, 'content-*.bin')):
+            if old != cached:
+                try:
+                    os.remove(old)
+                except OSError:
+                    pass
+    return digest, data, sig
+
+
+class Content:
+    """Game objects built from compiled pack data."""
+
+    def __init__(self, digest: str, data: dict, sig: Tuple, make_item: Callable[[dict], object],
+                 make_enemy: Callable[[dict, list], object], make_boss: Callable[[dict, list], object],
+                 make_frontier: Optional[Callable[[WorldGraph, str], object]] = None):
+        self.digest = digest
+        self.signature = sig
+        self.world_map: dict = data['world']
+        self.world = WorldGraph(self.world_map)
+        # generated regions past the frontier location, see worldgen.py
+        self.frontier = make_frontier(self.world, data['frontier']) if make_frontier and data['frontier'] else None
+        self.recipes = {name: {'materials': r['materials'], 'result': make_item(r['result'])}
+                        for name, r in data['recipes'].items()}
+        self.recipe_book = RecipeBook(self.recipes)
+        self.shop = {it['name']: make_item(it) for it in data['shop']}
+        self.spawns = SpawnRegistry()
+        for loc, entries in data['spawns'].items():
+            for e in entries:
+                self.spawns.register(None if loc == ANY else loc, make_enemy(e['enemy'], []), e['weight'],
+                                     tuple(e['levels']), e['rarity'], [(make_item(it), c) for it, c in e['loot']])
+        b = data['boss']
+        self.boss = make_boss(b, [make_item(it) for it in b['loot']])
+        self.quest_list: List[dict] = data['quests']  # pack order, which daily quest draws follow
+        self.quests: Dict[str, QuestDef] = {q.id: q for q in map(QuestDef.from_dict, self.quest_list)}
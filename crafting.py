@@ -0,0 +1,121 @@
+"""Crafting planner: multi-level recipes, craftable-now queries and batch crafting.
+
+``RecipeBook`` wraps a ``CRAFT_RECIPES``-style dict (``name -> {'materials':
+{ingredient: qty}, 'result': item}``). Ingredients that are themselves
+recipes are crafted on demand, using any already in stock first. The full
+ingredient tree of each recipe is expanded once and memoized, and an index
+from every ingredient to the recipes that use it (at any depth) lets
+``CraftableTracker`` recompute only the recipes a change can affect.
+"""
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+CountFn = Callable[[str], int]
+
+MAX_BATCH = 1_000_000
+
+
+class Plan:
+    def __init__(self, recipe: str, qty: int):
+        self.recipe = recipe
+        self.qty = qty
+        self.steps: List[Tuple[str, int]] = []  # (recipe, times), intermediates first
+        self.consumed: Dict[str, int] = {}
+        self.missing: Dict[str, int] = {}
+
+    @property
+    def ok(self) -> bool:
+        return not self.missing
+
+
+class RecipeBook:
+    def __init__(self, recipes: Dict[str, dict]):
+        self.recipes = recipes
+        self._tree: Dict[str, Set[str]] = {}
+        self._used_by: Dict[str, Set[str]] = {}
+        for name in recipes:
+            for ing in self.ingredients(name):
+                self._used_by.setdefault(ing, set()).add(name)
+
+    def ingredients(self, name: str) -> Set[str]:
+        """Every item that can end up consumed when crafting ``name`` (memoized)."""
+        tree = self._tree.get(name)
+        if tree is None:
+            tree = self._tree[name] = set()  # placeholder also stops recipe cycles
+            for mat in self.recipes[name]['materials']:
+                tree.add(mat)
+                if mat in self.recipes:
+                    tree |= self.ingredients(mat)
+        return tree
+
+    def used_by(self, ingredient: str) -> Set[str]:
+        return self._used_by.get(ingredient, set())
+
+    def plan(self, name: str, qty: int, count: CountFn) -> Plan:
+        """Work out how to craft ``qty`` x ``name`` from what ``count`` reports in stock."""
+        plan = Plan(name, qty)
+        avail: Dict[str, int] = {}
+        for mat, n in self.recipes[name]['materials'].items():
+            self._need(mat, n * qty, count, avail, plan, {name})
+        plan.steps.append((name, qty))
+        return plan
+
+    def _need(self, item: str, qty: int, count: CountFn, avail: Dict[str, int], plan: Plan, path: Set[str]):
+        have = avail[item] if item in avail else count(item)
+        use = min(have, qty)
+        avail[item] = have - use
+        if use:
+            plan.consumed[item] = plan.consumed.get(item, 0) + use
+        short = qty - use
+        if not short:
+            return
+        rec = self.recipes.get(item)
+        if rec is None or item in path:
+            plan.missing[item] = plan.missing.get(item, 0) + short
+            return
+        for mat, n in rec['materials'].items():
+            self._need(mat, n * short, count, avail, plan, path | {item})
+        plan.steps.append((item, short))
+
+    def max_craftable(self, name: str, count: CountFn) -> int:
+        if not self.plan(name, 1, count).ok:
+            return 0
+        lo, hi = 1, 2
+        while self.plan(name, hi, count).ok:
+            if hi >= MAX_BATCH:
+                return MAX_BATCH
+            lo, hi = hi, hi * 2
+        # plan(lo) works, plan(hi) doesn't
+        while hi - lo > 1:
+            mid = (lo + hi) // 2
+            if self.plan(name, mid, count).ok:
+                lo = mid
+            else:
+                hi = mid
+        return lo
+
+
+class CraftableTracker:
+    """Keeps "how many of each recipe can I craft" current as an Inventory changes."""
+
+    def __init__(self, book: RecipeBook, inventory):
+        self.book = book
+        self.inventory = inventory
+        self._cache: Dict[str, int] = {}
+        self._dirty: Set[str] = set(book.recipes)
+        inventory.on_change = self.mark
+
+    def mark(self, item_name: str):
+        self._dirty |= self.book.used_by(item_name)
+
+    def counts(self) -> Dict[str, int]:
+        """Recipe -> how many can be crafted right now (0 included)."""
+        for name in self._dirty:
+            self._cache[name] = self.book.max_craftable(name, self.inventory.count)
+        self._dirty.clear()
+        return self._cache
+
+    def craftable(self) -> Dict[str, int]:
+        return {name: n for name, n in self.counts().items() if n}
+
+    def how_many(self, name: str) -> Optional[int]:
+        return self.counts().get(name)
@@ -0,0 +1,48 @@
+"""Pluggable terminal I/O for the game.
+
+Game code calls ``say()`` and ``ask()`` instead of print()/input(). They go
+to the I/O bound to the current context, which is the console unless a
+session (e.g. a network connection in server.py) has installed its own
+with ``use_io()``.
+"""
+import contextlib
+import sys
+from contextvars import ContextVar
+
+
+class SessionClosed(Exception):
+    """Raised from ask()/say() when the session's connection is gone or timed out."""
+
+
+class ConsoleIO:
+    def write(self, text: str):
+        # look stdout up per call so contextlib.redirect_stdout keeps working
+        sys.stdout.write(text)
+
+    def read(self, prompt: str) -> str:
+        return input(prompt)
+
+
+CONSOLE = ConsoleIO()
+_current: ContextVar = ContextVar('game_io', default=CONSOLE)
+
+
+def current_io():
+    return _current.get()
+
+
+@contextlib.contextmanager
+def use_io(io):
+    token = _current.set(io)
+    try:
+        yield io
+    finally:
+        _current.reset(token)
+
+
+def say(*args, sep=' ', end='\n'):
+    _current.get().write(sep.join(map(str, args)) + end)
+
+
+def ask(prompt: str = '') -> str:
+    return _current.get().read(prompt)
@@ -0,0 +1,172 @@
+"""Stacked inventory container and the serialized inventory layout.
+
+Items sharing a template (same name, type, power and value) share one stack
+with a quantity, so a thousand Herbs are one entry. Stacks keep the order they
+were first acquired in. Per-name and per-type indexes make lookups, counts and
+removals independent of how many items the player carries.
+
+Iterating an Inventory still yields one item per unit, so code written
+against the old ``List[Item]`` keeps working.
+
+In a ``Player.to_dict()`` document items are referenced by template id:
+``items`` is a table of item definitions, ``inventory`` a list of
+``[template id, qty]`` stacks and ``equipment`` maps slots to template ids.
+Older saves listed one item dict per unit and stored equipment as dicts;
+``normalize_doc`` converts those.
+"""
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import metrics
+
+
+def item_key(item):
+    # templates are interned, so identity is the item's definition
+    return item.template
+
+
+def dict_key(d: dict) -> tuple:
+    return (d['name'], d['type'], d.get('power', 0), d.get('value', 0))
+
+
+class Inventory:
+    def __init__(self, items: Iterable = ()):
+        self._stacks: Dict[object, list] = {}  # template -> [item, qty], in acquisition order
+        self._by_name: Dict[str, list] = {}
+        self._by_type: Dict[str, dict] = {}
+        self._counts: Dict[str, int] = {}
+        self._len = 0
+        # called with the item name whenever a count changes (see crafting.CraftableTracker)
+        self.on_change: Optional[Callable[[str], None]] = None
+        for it in items:
+            self.add(it)
+
+    def to_table(self) -> Tuple[List[dict], List[List[int]], dict]:
+        """Serialized form: (item table, [template id, qty] stacks, template -> id)."""
+        table, stacks, ids = [], [], {}
+        for it, n in self._stacks.values():
+            ids[item_key(it)] = len(table)
+            stacks.append([len(table), n])
+            table.append(it.to_dict())
+        return table, stacks, ids
+
+    @metrics.timed('inventory_add')
+    def add(self, item, qty: int = 1):
+        key = item_key(item)
+        st = self._stacks.get(key)
+        if st is None:
+            self._stacks[key] = [item, qty]
+            self._by_name.setdefault(item.name, []).append(key)
+            self._by_type.setdefault(item.type, {})[key] = None
+        else:
+            st[1] += qty
+        self._counts[item.name] = self._counts.get(item.name, 0) + qty
+        self._len += qty
+        if self.on_change is not None:
+            self.on_change(item.name)
+
+    @metrics.timed('inventory_discard')
+    def discard(self, item, qty: int = 1):
+        """Remove ``qty`` units of the stack ``item`` belongs to."""
+        key = item_key(item)
+        st = self._stacks[key]
+        if st[1] < qty:
+            raise ValueError(f'only {st[1]}x {item.name} in inventory')
+        st[1] -= qty
+        self._counts[item.name] -= qty
+        self._len -= qty
+        if st[1] == 0:
+            del self._stacks[key]
+            keys = self._by_name[item.name]
+            keys.remove(key)
+            if not keys:
+                del self._by_name[item.name]
+                del self._counts[item.name]
+            del self._by_type[item.type][key]
+            if not self._by_type[item.type]:
+                del self._by_type[item.type]
+        if self.on_change is not None:
+            self.on_change(item.name)
+
+    @metrics.timed('inventory_find')
+    def find(self, name: str, types: Optional[Tuple[str, ...]] = None):
+        """First item named ``name`` (optionally restricted to ``types``), or None."""
+        for key in self._by_name.get(name, ()):
+            it = self._stacks[key][0]
+            if types is None or it.type in types:
+                return it
+        return None
+
+    @metrics.timed('inventory_count')
+    def count(self, name: str) -> int:
+        return self._counts.get(name, 0)
+
+    def counts(self) -> Dict[str, int]:
+        """Units held per item name."""
+        return dict(self._counts)
+
+    def quantity(self, item) -> int:
+        st = self._stacks.get(item_key(item))
+        return st[1] if st else 0
+
+    def of_type(self, type_: str) -> Iterator:
+        """One item per stack of the given type."""
+        for key in self._by_type.get(type_, ()):
+            yield self._stacks[key][0]
+
+    def stacks(self) -> List[Tuple[object, int]]:
+        return [(it, n) for it, n in self._stacks.values()]
+
+    def iter_stacks(self) -> Iterator[Tuple[object, int]]:
+        """stacks() without building the list."""
+        for it, n in self._stacks.values():
+            yield it, n
+
+    def stack_count(self) -> int:
+        return len(self._stacks)
+
+    def __iter__(self):
+        for it, n in self._stacks.values():
+            for _ in range(n):
+                yield it
+
+    def __len__(self):
+        return self._len
+
+    def __contains__(self, name: str):
+        return name in self._counts
+
+
+def normalize_doc(pl: dict) -> dict:
+    """Return ``pl`` (a Player.to_dict() document) in the template-id layout.
+
+    Documents already in that layout are returned as is; older ones are
+    converted into a new dict, leaving the input untouched.
+    """
+    if 'items' in pl:
+        return pl
+    out = dict(pl)
+    table: List[dict] = []
+    ids: Dict[tuple, int] = {}
+    stacks: List[List[int]] = []
+    stack_of: Dict[int, List[int]] = {}
+
+    def ref(d):
+        k = dict_key(d)
+        i = ids.get(k)
+        if i is None:
+            i = ids[k] = len(table)
+            table.append(d)
+        return i
+
+    for d in pl.get('inventory', []):
+        tid = ref(d)
+        st = stack_of.get(tid)
+        if st is None:
+            st = stack_of[tid] = [tid, 0]
+            stacks.append(st)
+        st[1] += 1
+    eq = pl.get('equipment') or {}
+    out['equipment'] = {slot: ref(d) if d else None for slot, d in eq.items()}
+    out['items'] = table
+    out['inventory'] = stacks
+    return out
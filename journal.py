@@ -0,0 +1,138 @@
+"""Append-only save journals.
+
+A journal sits next to a full slot snapshot and holds one JSON line per
+incremental save::
+
+    {"base": "<snapshot timestamp>", "set": {...}, "equip": {...}, "inv": [...], "timestamp": "..."}
+
+``set`` carries changed player fields (scalars and the quest log),
+``equip`` replaced equipment slots and ``inv`` the inventory operations
+since the previous entry, in order: ``["+", item_dict, qty]`` adds items and
+``["-", item_dict, qty]`` removes them. Entries whose ``base`` doesn't match the snapshot they are
+replayed onto are stale (left over from before a compaction) and skipped.
+A line torn by a crash is cut off by the next append.
+"""
+import json
+import os
+from typing import Iterator
+
+import metrics
+from inventory import dict_key, normalize_doc
+
+
+def _complete_length(f) -> int:
+    """Length of the file up to and including its last newline."""
+    pos = f.seek(0, os.SEEK_END)
+    while pos:
+        n = min(pos, 65536)
+        pos -= n
+        f.seek(pos)
+        i = f.read(n).rfind(b'\n')
+        if i >= 0:
+            return pos + i + 1
+    return 0
+
+
+def append(path: str, entry: dict) -> int:
+    """Append one entry and return the journal's new size in bytes.
+
+    A torn last line (a crash mid-write) is cut off first, so the new entry
+    starts on a line of its own instead of being glued onto the fragment.
+    """
+    line = (json.dumps(entry, separators=(',', ':')) + '\n').encode()
+    metrics.count('journal_bytes_written_total', len(line))
+    with open(path, 'ab+') as f:
+        end = f.seek(0, os.SEEK_END)
+        if end:
+            f.seek(end - 1)
+            if f.read(1) != b'\n':
+                f.truncate(_complete_length(f))
+        f.write(line)
+        f.flush()
+        os.fsync(f.fileno())
+        return f.tell()
+
+
+def entries(path: str) -> Iterator[dict]:
+    """Yield journal entries in order, skipping a torn trailing line and any unreadable one."""
+    try:
+        f = open(path, 'r')
+    except FileNotFoundError:
+        return
+    with f:
+        for line in f:
+            if not line.endswith('\n'):
+                break
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                # older versions appended onto a torn line; the whole entry is the one at the end
+                try:
+                    entry = json.loads(line[line.rfind('{"base":', 1):])
+                except ValueError:
+                    continue
+            yield entry
+
+
+class _DocInventory:
+    """Applies journal ops to the template-id layout of a player document."""
+
+    def __init__(self, pl: dict):
+        self.table = pl['items']
+        self.stacks = pl['inventory']
+        self.ids = {dict_key(d): i for i, d in enumerate(self.table)}
+        self.stack_of = {st[0]: st for st in self.stacks}
+
+    def ref(self, d: dict) -> int:
+        k = dict_key(d)
+        i = self.ids.get(k)
+        if i is None:
+            i = self.ids[k] = len(self.table)
+            self.table.append(d)
+        return i
+
+    def add(self, d: dict, qty: int):
+        tid = self.ref(d)
+        st = self.stack_of.get(tid)
+        if st is None:
+            st = self.stack_of[tid] = [tid, 0]
+            self.stacks.append(st)
+        st[1] += qty
+
+    def remove(self, d: dict, qty: int):
+        tid = self.ref(d)
+        st = self.stack_of[tid]
+        st[1] -= qty
+        if st[1] <= 0:
+            del self.stack_of[tid]
+            self.stacks.remove(st)
+
+
+def apply(player: dict, entry: dict, inv: _DocInventory):
+    """Apply one journal entry to a normalized ``Player.to_dict()`` document in place."""
+    player.update(entry.get('set', {}))
+    if 'equip' in entry:
+        eq = dict(player.get('equipment') or {})
+        for slot, d in entry['equip'].items():
+            eq[slot] = inv.ref(d) if d else None
+        player['equipment'] = eq
+    for op, d, qty in entry.get('inv', ()):
+        if op == '+':
+            inv.add(d, qty)
+        else:
+            inv.remove(d, qty)
+
+
+def replay(data: dict, path: str) -> int:
+    """Replay the journal at ``path`` onto a loaded save document; returns entries applied."""
+    n = 0
+    inv = None
+    for e in entries(path):
+        if e.get('base') != data.get('timestamp'):
+            continue
+        if inv is None:
+            data['player'] = normalize_doc(data['player'])
+            inv = _DocInventory(data['player'])
+        apply(data['player'], e, inv)
+        n += 1
+    return n
@@ -1,29 +1,82 @@
 import json
-import random
 import os
-import sys
 import datetime
-from typing import List, Dict, Optional
-
-DATA_DIR = "game_saves"
-if not os.path.exists(DATA_DIR):
-    os.makedirs(DATA_DIR, exist_ok=True)
+import hashlib
+import threading
+from contextvars import ContextVar
+from typing import List, Dict, Optional, Set
+
+import analytics
+import content as content_packs
+import journal
+import metrics
+import saveformat
+import schema
+from autosave import AUTOSAVE_SLOT, AutosaveWriter
+from content import Content
+from gameio import ask, current_io, say
+from market import Market, MarketError
+from progression import ExpCurve, StatCurve
+from quests import QuestLog
+from render import frame, paginate, release
+from crafting import CraftableTracker
+from inventory import Inventory, normalize_doc
+from session import Session, checkpoint, new_seed, rng, shared_read, use_session
+from sqlstore import SQLiteStore
+from worldgen import ProceduralWorld
+from worldgraph import WorldGraph
+
+DATA_DIR = "game_saves"  # created on first write
+# per-session save directory (server accounts); falls back to DATA_DIR
+SAVE_DIR: ContextVar[Optional[str]] = ContextVar('save_dir', default=None)
+# per-session account name, the key the sqlite backend files saves under
+ACCOUNT: ContextVar[str] = ContextVar('account', default='')
+# server accounts allowed into the metrics menu (server: --admin); the console always is
+ADMIN_ACCOUNTS: Set[str] = set()
 
 DEFAULT_SAVE_SLOTS = 4
-WORLD_MAP = {
-    'Town': ['Forest', 'Blacksmith', 'Inn'],
-    'Forest': ['Town', 'Cave', 'Ruins'],
-    'Cave': ['Forest', 'Underground Lake'],
-    'Ruins': ['Forest', 'Ancient Temple'],
-    'Ancient Temple': ['Ruins', 'Boss Lair'],
-    'Boss Lair': [],
-    'Blacksmith': ['Town'],
-    'Inn': ['Town']
-}
+SAVE_BACKEND = 'files'  # or 'sqlite': every account in DATA_DIR/saves.db, see sqlstore.py
+SAVE_FORMAT = 'json'  # or 'binary', see saveformat.py (files backend)
+INCREMENTAL_SAVES = True  # menu saves append to a per-slot journal, see journal.py
+JOURNAL_COMPACT_BYTES = 256 * 1024
+RECORD_SESSIONS = False  # log every session's inputs and RNG draws for replay.py (server: --record-sessions)
+SESSION_LOGS_KEPT = 20  # per save directory; starting a session deletes the older logs
+METRICS = False  # time hot paths from the start (see metrics.py and the in-game 'm' menu)
+AUTOSAVE = True  # save to slot 0 in the background after fights, crafting and travel (see autosave.py)
+ANALYTICS = True  # keep leaderboards/economy stats current as slots are saved (see analytics.py)
+# content packs (map, recipes, shop, enemies, boss, quests); later directories override
+# earlier ones, see content.py
+PACK_DIRS = [os.path.join(os.path.dirname(os.path.abspath(__file__)), 'packs')]
+
+
+def saves_dir() -> str:
+    return SAVE_DIR.get() or DATA_DIR
+
+
+# endless generated regions past the packs' frontier location, loaded on first visit (see worldgen.py)
+WORLD_SEED = 1337
+
+
+def save_path(slot:int, fmt:str='json') -> str:
+    ext = 'sav' if fmt == 'binary' else 'json'
+    return os.path.join(saves_dir(), f"save_slot_{slot}.{ext}")
+
 
+def slot_file(slot:int) -> Optional[str]:
+    """Path of whichever save file currently exists for the slot."""
+    for fmt in ('json', 'binary'):
+        p = save_path(slot, fmt)
+        if os.path.exists(p):
+            return p
+    return None
+
+
+def journal_path(slot:int) -> str:
+    return os.path.join(saves_dir(), f"save_slot_{slot}.journal")
 
-def save_path(slot:int) -> str:
-    return os.path.join(DATA_DIR, f"save_slot_{slot}.json")
+
+def index_path() -> str:
+    return os.path.join(saves_dir(), "slots_index.json")
 
 
 def now_ts():
@@ -32,30 +85,107 @@ def now_ts():
 # -------------------------
 # Base game entities
 # -------------------------
+class ItemTemplate:
+    """Immutable item definition, shared by every item with the same stats.
+
+    Create them through ITEM_TEMPLATES.intern() so each definition exists once.
+    """
+    __slots__ = ('id', 'name', 'type', 'power', 'value')
+
+    def __init__(self, id_: int, name: str, type_: str, power: int, value: int):
+        for attr, v in (('id', id_), ('name', name), ('type', type_), ('power', power), ('value', value)):
+            object.__setattr__(self, attr, v)
+
+    def __setattr__(self, attr, value):
+        raise AttributeError('item templates are immutable')
+
+    def __reduce__(self):
+        # unpickle through the registry so templates stay interned across processes
+        return (_intern_template, (self.name, self.type, self.power, self.value))
+
+    def to_dict(self):
+        return {"name": self.name, "type": self.type, "power": self.power, "value": self.value}
+
+class ItemRegistry:
+    def __init__(self):
+        self._by_key: Dict[tuple, ItemTemplate] = {}
+        self._by_id: List[ItemTemplate] = []
+        self._lock = threading.Lock()
+
+    def intern(self, name: str, type_: str, power: int=0, value: int=0) -> ItemTemplate:
+        key = (name, type_, power, value)
+        t = self._by_key.get(key)
+        if t is None:
+            # server sessions intern concurrently; one template (and id) per key
+            with self._lock:
+                t = self._by_key.get(key)
+                if t is None:
+                    t = ItemTemplate(len(self._by_id), name, type_, power, value)
+                    self._by_id.append(t)
+                    self._by_key[key] = t
+        return t
+
+    def get(self, template_id: int) -> ItemTemplate:
+        return self._by_id[template_id]
+
+    def __len__(self):
+        return len(self._by_id)
+
+ITEM_TEMPLATES = ItemRegistry()
+
+def _intern_template(name, type_, power, value):
+    return ITEM_TEMPLATES.intern(name, type_, power, value)
+
 class Item:
+    # the definition lives in the shared template; per-instance state goes in __slots__ here
+    __slots__ = ('template',)
+
     def __init__(self, name: str, type_: str, power: int=0, value:int=0):
-        self.name = name
-        self.type = type_  # weapon, armor, consumable, material
-        self.power = power
-        self.value = value
+        self.template = ITEM_TEMPLATES.intern(name, type_, power, value)
+
+    @staticmethod
+    def of(template: ItemTemplate) -> 'Item':
+        it = Item.__new__(Item)
+        it.template = template
+        return it
+
+    @property
+    def name(self):
+        return self.template.name
+
+    @property
+    def type(self):  # weapon, armor, consumable, material
+        return self.template.type
+
+    @property
+    def power(self):
+        return self.template.power
+
+    @property
+    def value(self):
+        return self.template.value
 
     def to_dict(self):
-        return {"name": self.name, "type": self.type, "power": self.power, "value": self.value}
+        return self.template.to_dict()
 
     @staticmethod
     def from_dict(d):
         return Item(d['name'], d['type'], d.get('power',0), d.get('value',0))
 
 class Equipment:
+    # equipment slot (same as the item type it takes) -> derived stat the item's power adds to
+    SLOTS = {'weapon': 'attack_power', 'armor': 'defense'}
+
     def __init__(self):
         self.weapon: Optional[Item] = None
         self.armor: Optional[Item] = None
+        # bumped on every change so cached player stats know to recompute
+        self.rev = 0
 
     def equip(self, item: Item):
-        if item.type == 'weapon':
-            self.weapon = item
-        elif item.type == 'armor':
-            self.armor = item
+        if item.type in self.SLOTS:
+            setattr(self, item.type, item)
+            self.rev += 1
 
     def to_dict(self):
         return {"weapon": self.weapon.to_dict() if self.weapon else None, "armor": self.armor.to_dict() if self.armor else None}
@@ -64,90 +194,215 @@ class Equipment:
     def from_dict(d):
         eq = Equipment()
         if d.get('weapon'):
-            eq.weapon = Item.from_dict(d['weapon'])
+            eq.equip(Item.from_dict(d['weapon']))
         if d.get('armor'):
-            eq.armor = Item.from_dict(d['armor'])
+            eq.equip(Item.from_dict(d['armor']))
         return eq
 
 # -------------------------
 # Player & Classes
 # -------------------------
+# Class modifiers for the derived stats. Unknown classes use DEFAULT_CLASS_STATS.
+CLASS_STATS = {
+    'Warrior': {'max_health': 120, 'attack_power': 4, 'defense': 0},
+    'Mage': {'max_health': 80, 'attack_power': -1, 'defense': 0},
+    'Rogue': {'max_health': 90, 'attack_power': 1, 'defense': 0},
+}
+DEFAULT_CLASS_STATS = {'max_health': 100, 'attack_power': 0, 'defense': 0}
+# per-level growth on top of the class's level-1 stats, see progression.py
+STAT_GROWTH = {'max_health': 10, 'attack_power': 2, 'defense': 1}
+CLASS_CURVES = {
+    pclass: StatCurve({'max_health': cls['max_health'], 'attack_power': 12 + cls['attack_power'],
+                       'defense': 3 + cls['defense']}, STAT_GROWTH)
+    for pclass, cls in {**CLASS_STATS, None: DEFAULT_CLASS_STATS}.items()
+}
+EXP_CURVE = ExpCurve(base=50, step=20)
+
 class Player:
     def __init__(self, name:str, pclass:str='Warrior'):
+        # incremental save tracking, set up by save_to_slot/load_from_slot
+        self._journal: Optional[dict] = None
+        self._inv_log: Optional[list] = None
+        # derived stats cache: dropped when level/class/equipment/modifiers change
+        self._stats: Optional[Dict[str, int]] = None
+        self._stats_rev = -1
+        self._modifiers: Dict[str, tuple] = {}
+        self._craft_tracker = None
         self.name = name
         self.pclass = pclass
         self.level = 1
         self.exp = 0
+        self.equipment = Equipment()
         self.health = self.max_health()
         self.gold = 100
-        self.inventory: List[Item] = []
-        self.equipment = Equipment()
+        self.inventory = Inventory()
         self.location = 'Town'
         self.story_progress = 0
+        self.quests = QuestLog(content().quests)
         self.save_ts = now_ts()
+        self.market_seq = 0  # the last of the player's own market changes their save has (see market.py)
+
+    @property
+    def inventory(self) -> Inventory:
+        return self._inventory
+
+    @inventory.setter
+    def inventory(self, items):
+        # a wholesale replacement can't be journaled; the next save is a full snapshot
+        self._inventory = items if isinstance(items, Inventory) else Inventory(items)
+        self._journal = None
+        self._inv_log = None
+
+    @property
+    def level(self) -> int:
+        return self._level
+
+    @level.setter
+    def level(self, value:int):
+        self._level = value
+        self._stats = None
+
+    @property
+    def pclass(self) -> str:
+        return self._pclass
+
+    @pclass.setter
+    def pclass(self, value:str):
+        self._pclass = value
+        self._stats = None
+
+    @property
+    def equipment(self) -> Equipment:
+        return self._equipment
+
+    @equipment.setter
+    def equipment(self, eq:Equipment):
+        self._equipment = eq
+        self._stats = None
+
+    def add_modifier(self, name:str, stat:str, amount:int):
+        """Add (or replace) a named buff/debuff on one derived stat."""
+        self._modifiers[name] = (stat, amount)
+        self._stats = None
+
+    def remove_modifier(self, name:str):
+        if self._modifiers.pop(name, None) is not None:
+            self._stats = None
+
+    def _compute_stats(self) -> Dict[str, int]:
+        curve = CLASS_CURVES.get(self._pclass) or CLASS_CURVES[None]
+        stats = curve.at(self._level)
+        for slot, stat in Equipment.SLOTS.items():
+            it = getattr(self._equipment, slot)
+            if it:
+                stats[stat] += it.power
+        for stat, amount in self._modifiers.values():
+            stats[stat] += amount
+        return stats
+
+    def stats(self) -> Dict[str, int]:
+        """Derived stats, recomputed only after something they depend on changed."""
+        st = self._stats
+        if st is None or self._stats_rev != self._equipment.rev:
+            st = self._stats = self._compute_stats()
+            self._stats_rev = self._equipment.rev
+        return st
 
     def max_health(self):
-        base = 100
-        if self.pclass == 'Warrior':
-            base = 120
-        elif self.pclass == 'Mage':
-            base = 80
-        elif self.pclass == 'Rogue':
-            base = 90
-        return base + (self.level - 1) * 10
+        return self.stats()['max_health']
 
     def attack_power(self):
-        base = 10 + self.level * 2
-        if self.pclass == 'Warrior':
-            base += 4
-        elif self.pclass == 'Mage':
-            base -= 1
-        elif self.pclass == 'Rogue':
-            base += 1
-        if self.equipment.weapon:
-            base += self.equipment.weapon.power
-        return base
+        return self.stats()['attack_power']
 
     def defense(self):
-        base = 2 + self.level
-        if self.equipment.armor:
-            base += self.equipment.armor.power
-        return base
+        return self.stats()['defense']
 
     def gain_exp(self, amount):
         self.exp += amount
-        while self.exp >= self.exp_to_next():
-            self.exp -= self.exp_to_next()
-            self.level += 1
-            self.health = self.max_health()
-            print(f"*** {self.name} leveled up! Now level {self.level} ***")
+        if self.exp < self.exp_to_next():
+            return
+        # however many levels the grant is worth, in one step and one message
+        level, self.exp = EXP_CURVE.advance(self.level, self.exp)
+        gained, self.level = level - self.level, level
+        self.health = self.max_health()
+        if gained == 1:
+            say(f"*** {self.name} leveled up! Now level {self.level} ***")
+        else:
+            say(f"*** {self.name} gained {gained} levels! Now level {self.level} ***")
 
     def exp_to_next(self):
-        return 50 + (self.level - 1) * 20
+        return EXP_CURVE.needed(self.level)
+
+    def _log_inv(self, op:str, item:Item, qty:int):
+        if self._inv_log is None:
+            return
+        d = item.to_dict()
+        last = self._inv_log[-1] if self._inv_log else None
+        if last and last[0] == op and last[1] == d:
+            last[2] += qty
+        else:
+            self._inv_log.append([op, d, qty])
 
-    def add_item(self, item:Item):
-        self.inventory.append(item)
+    def add_item(self, item:Item, qty:int=1):
+        self.inventory.add(item, qty)
+        self._log_inv('+', item, qty)
+        quest_event(self, 'gain', item.name, qty)
+
+    def discard_item(self, item:Item, qty:int=1):
+        self.inventory.discard(item, qty)
+        self._log_inv('-', item, qty)
 
     def remove_item(self, item_name:str) -> bool:
-        for i, it in enumerate(self.inventory):
-            if it.name == item_name:
-                del self.inventory[i]
-                return True
-        return False
+        it = self.inventory.find(item_name)
+        if it is None:
+            return False
+        self.discard_item(it)
+        return True
+
+    def remove_items(self, needs:Dict[str,int]) -> bool:
+        """Remove several items at once (e.g. crafting materials); all or nothing."""
+        if any(self.inventory.count(name) < n for name, n in needs.items()):
+            return False
+        for name, n in needs.items():
+            self.take_items(name, n)
+        return True
+
+    def take_items(self, name:str, n:int) -> Optional[List[list]]:
+        """Remove ``n`` units named ``name`` and return them as [item, qty] lots (None if there aren't enough)."""
+        if self.inventory.count(name) < n:
+            return None
+        lots = []
+        while n:
+            it = self.inventory.find(name)
+            take = min(n, self.inventory.quantity(it))
+            self.discard_item(it, take)
+            lots.append([it, take])
+            n -= take
+        return lots
 
     def use_consumable(self, item_name:str):
-        for i, it in enumerate(self.inventory):
-            if it.name == item_name and it.type == 'consumable':
-                # simple healing effect
-                heal = it.power
-                self.health = min(self.max_health(), self.health + heal)
-                del self.inventory[i]
-                print(f"You used {item_name} and healed {heal} HP.")
-                return True
-        print("No consumable by that name in inventory.")
-        return False
+        it = self.inventory.find(item_name, ('consumable',))
+        if it is None:
+            say("No consumable by that name in inventory.")
+            return False
+        # simple healing effect
+        heal = it.power
+        self.health = min(self.max_health(), self.health + heal)
+        self.discard_item(it)
+        say(f"You used {item_name} and healed {heal} HP.")
+        return True
 
     def to_dict(self):
+        # items are saved once in a table and referenced by id (see inventory.py)
+        table, stacks, ids = self.inventory.to_table()
+        def ref(it):
+            if it is None:
+                return None
+            i = ids.get(it.template)
+            if i is None:
+                i = ids[it.template] = len(table)
+                table.append(it.to_dict())
+            return i
         return {
             'name': self.name,
             'pclass': self.pclass,
@@ -155,25 +410,38 @@ class Player:
             'exp': self.exp,
             'health': self.health,
             'gold': self.gold,
-            'inventory': [it.to_dict() for it in self.inventory],
-            'equipment': self.equipment.to_dict(),
+            'items': table,
+            'inventory': stacks,
+            'equipment': {'weapon': ref(self.equipment.weapon), 'armor': ref(self.equipment.armor)},
             'location': self.location,
             'story_progress': self.story_progress,
-            'save_ts': self.save_ts
+            'quests': self.quests.to_dict(),
+            'save_ts': self.save_ts,
+            'market_seq': self.market_seq
         }
 
     @staticmethod
     def from_dict(d):
+        d = normalize_doc(d)
         p = Player(d['name'], d.get('pclass','Warrior'))
         p.level = d.get('level',1)
         p.exp = d.get('exp',0)
         p.health = d.get('health', p.max_health())
         p.gold = d.get('gold',100)
-        p.inventory = [Item.from_dict(it) for it in d.get('inventory',[])]
-        p.equipment = Equipment.from_dict(d.get('equipment',{}))
+        templates = [ITEM_TEMPLATES.intern(t['name'], t['type'], t.get('power',0), t.get('value',0)) for t in d['items']]
+        inv = Inventory()
+        for tid, qty in d['inventory']:
+            inv.add(Item.of(templates[tid]), qty)
+        p.inventory = inv
+        eq = d.get('equipment') or {}
+        for slot in ('weapon', 'armor'):
+            if eq.get(slot) is not None:
+                p.equipment.equip(Item.of(templates[eq[slot]]))
         p.location = d.get('location','Town')
         p.story_progress = d.get('story_progress',0)
+        p.quests = QuestLog.from_dict(d.get('quests', {}), content().quests)
         p.save_ts = d.get('save_ts', now_ts())
+        p.market_seq = d.get('market_seq', 0)
         return p
 
 # -------------------------
@@ -189,7 +457,14 @@ class Enemy:
         self.gold = gold
 
     def attack(self):
-        return random.randint(1, self.power)
+        return rng().randint(1, self.power)
+
+    def clone(self) -> 'Enemy':
+        """Copy of this enemy (used as a spawn prototype) without running __init__."""
+        e = type(self).__new__(type(self))
+        e.__dict__.update(self.__dict__)
+        e.loot = list(self.loot)
+        return e
 
 class Boss(Enemy):
     def __init__(self, name:str, health:int, power:int, phases:int=2, loot:List[Item]=None, exp:int=100, gold:int=200):
@@ -197,105 +472,182 @@ class Boss(Enemy):
         self.phases = phases
 
 # -------------------------
-# Crafting System
+# Content packs
 # -------------------------
-CRAFT_RECIPES = {
-    'Iron Sword': {'materials': {'Iron Ingot':2, 'Wood':1}, 'result': Item('Iron Sword','weapon',power=6,value=50)},
-    'Health Potion': {'materials': {'Herb':3, 'Water':1}, 'result': Item('Health Potion','consumable',power=30,value=15)},
-    'Leather Armor': {'materials': {'Leather':4}, 'result': Item('Leather Armor','armor',power=3,value=40)}
+_content: Optional[Content] = None
+_content_lock = threading.Lock()
+_rejected: Optional[tuple] = None  # signature of packs that failed validation, not retried until they change
+
+def _enemy_from_dict(d:dict, loot:List[Item]) -> Enemy:
+    return Enemy(d['name'], health=d['health'], power=d['power'], loot=loot, exp=d['exp'], gold=d['gold'])
+
+def _boss_from_dict(d:dict, loot:List[Item]) -> Boss:
+    return Boss(d['name'], health=d['health'], power=d['power'], phases=d['phases'], loot=loot, exp=d['exp'], gold=d['gold'])
+
+def _frontier(graph:WorldGraph, attach_to:str) -> ProceduralWorld:
+    return ProceduralWorld(graph, seed=WORLD_SEED, attach_to=attach_to,
+                           state_dir=lambda: os.path.join(DATA_DIR, 'world'))
+
+def _load_content() -> Content:
+    digest, data, sig = content_packs.load(PACK_DIRS, os.path.join(DATA_DIR, 'cache'))
+    return Content(digest, data, sig, Item.from_dict, _enemy_from_dict, _boss_from_dict, _frontier)
+
+def content() -> Content:
+    """The loaded content packs, compiled (or read from the cache) on first use."""
+    global _content
+    c = _content
+    if c is None:
+        with _content_lock:
+            c = _content
+            if c is None:
+                c = _content = _load_content()
+    return c
+
+def reload_content() -> bool:
+    """Swap in the packs as they are on disk now if they changed; True if they did.
+
+    Sessions pick the new content up at their next action. Players keep the quests
+    they are on unless the reload removed or changed them. A pack that fails
+    validation raises ContentError and the running content stays.
+    """
+    global _content, _rejected
+    with _content_lock:
+        old = _content
+        sig = content_packs.signature(PACK_DIRS)
+        if old is not None and sig in (old.signature, _rejected):
+            return False
+        try:
+            new = _load_content()
+        except content_packs.ContentError:
+            _rejected = sig
+            raise
+        if old is not None and new.digest == old.digest:
+            old.signature = new.signature  # touched, not changed
+            return False
+        _content = new
+    if old is not None and old.frontier is not None:
+        old.frontier.flush()  # the new frontier reads player changes back from disk
+    metrics.count('content_reloads_total')
+    return True
+
+# the names content used to have as module constants, for tools and old scripts
+_CONTENT_NAMES = {
+    'WORLD_MAP': 'world_map', 'WORLD': 'world', 'PROC_WORLD': 'frontier', 'CRAFT_RECIPES': 'recipes',
+    'RECIPES': 'recipe_book', 'SPAWNS': 'spawns', 'BOSS': 'boss', 'DAILY_QUESTS': 'quest_list', 'QUESTS': 'quests',
 }
 
-def craft_item(player:Player, recipe_name:str):
-    rec = CRAFT_RECIPES.get(recipe_name)
-    if not rec:
-        print('Unknown recipe')
+def __getattr__(name):
+    if name in _CONTENT_NAMES:
+        return getattr(content(), _CONTENT_NAMES[name])
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+# -------------------------
+# Crafting System
+# -------------------------
+# recipes whose materials are other recipes (Iron Sword <- Iron Ingot <- Iron Ore) craft the
+# intermediates on demand, see crafting.RecipeBook
+
+def craft_tracker(player:Player) -> CraftableTracker:
+    # follows the inventory, which gets replaced wholesale on load, and content reloads
+    tracker = player._craft_tracker
+    book = content().recipe_book
+    if tracker is None or tracker.inventory is not player.inventory or tracker.book is not book:
+        tracker = player._craft_tracker = CraftableTracker(book, player.inventory)
+    return tracker
+
+@metrics.timed('craft_item')
+def craft_item(player:Player, recipe_name:str, n:int=1):
+    c = content()
+    rec = c.recipes.get(recipe_name)
+    if not rec or n < 1:
+        say('Unknown recipe')
         return False
-    mats = rec['materials']
-    inv_counts = {}
-    for it in player.inventory:
-        inv_counts[it.name] = inv_counts.get(it.name,0) + 1
-    for mat, need in mats.items():
-        if inv_counts.get(mat,0) < need:
-            print(f"Missing materials for {recipe_name}: need {need}x {mat}")
-            return False
-    # consume
-    for mat, need in mats.items():
-        to_remove = need
-        new_inv = []
-        for it in player.inventory:
-            if it.name == mat and to_remove>0:
-                to_remove -= 1
-                continue
-            new_inv.append(it)
-        player.inventory = new_inv
-    # add result
-    player.add_item(rec['result'])
-    print(f"Crafted {rec['result'].name}!")
+    plan = c.recipe_book.plan(recipe_name, n, player.inventory.count)
+    if not plan.ok:
+        for mat, short in plan.missing.items():
+            say(f"Missing materials for {recipe_name}: need {short}x {mat}")
+        return False
+    # consume, intermediates first
+    for name, times in plan.steps:
+        step = c.recipes[name]
+        player.remove_items({mat: need * times for mat, need in step['materials'].items()})
+        player.add_item(step['result'], times)
+    if n > 1:
+        say(f"Crafted {n}x {rec['result'].name}!")
+    else:
+        say(f"Crafted {rec['result'].name}!")
+    # every step is a craft, so intermediates made on the way count towards quests too
+    for name, times in plan.steps:
+        quest_event(player, 'craft', name, times)
     return True
 
 # -------------------------
 # Shops / NPCs
 # -------------------------
 class Shop:
-    def __init__(self):
-        # dynamic stock
-        self.stock = {
-            'Potion': Item('Potion','consumable',power=20,value=10),
-            'Iron Ore': Item('Iron Ore','material',power=0,value=5),
-            'Herb': Item('Herb','material',power=0,value=3),
-            'Wood': Item('Wood','material',power=0,value=2)
-        }
+    def __init__(self, stock:Optional[Dict[str, Item]]=None):
+        # None: the content packs' stock, which follows reloads
+        self._stock = stock
+
+    @property
+    def stock(self) -> Dict[str, Item]:
+        return content().shop if self._stock is None else self._stock
 
     def display(self):
-        print('\n-- Shop Stock --')
-        for name, item in self.stock.items():
-            print(f"{name} - {item.value} gold ({item.type})")
+        with frame() as f:
+            f.line('\n-- Shop Stock --')
+            for name, item in self.stock.items():
+                f.line(f"{name} - {item.value} gold ({item.type})")
+            f.line('Commands: buy <name>, sell <name>, exit')
 
     def buy(self, player:Player, item_name:str):
         it = self.stock.get(item_name)
         if not it:
-            print('Item not available')
+            say('Item not available')
             return False
         if player.gold < it.value:
-            print('Not enough gold')
+            say('Not enough gold')
             return False
         player.gold -= it.value
         player.add_item(it)
-        print(f'Bought {item_name}')
+        say(f'Bought {item_name}')
         return True
 
     def sell(self, player:Player, item_name:str):
-        for i,it in enumerate(player.inventory):
-            if it.name == item_name:
-                sell_price = max(1, it.value//2)
-                player.gold += sell_price
-                del player.inventory[i]
-                print(f'Sold {item_name} for {sell_price} gold')
-                return True
-        print('You do not have that item')
-        return False
+        it = player.inventory.find(item_name)
+        if it is None:
+            say('You do not have that item')
+            return False
+        sell_price = max(1, it.value//2)
+        player.gold += sell_price
+        player.discard_item(it)
+        say(f'Sold {item_name} for {sell_price} gold')
+        return True
 
 # -------------------------
 # World & Quests
 # -------------------------
-def spawn_enemy_for_location(location:str) -> Enemy:
-    if location == 'Forest':
-        return Enemy('Goblin', health=40, power=8, loot=[Item('Herb','material',value=2)], exp=15, gold=8)
-    if location == 'Cave':
-        return Enemy('Cave Bat', health=30, power=6, loot=[Item('Iron Ore','material',value=5)], exp=12, gold=6)
-    if location == 'Ruins':
-        return Enemy('Skeleton', health=60, power=10, loot=[Item('Bone','material',value=1)], exp=20, gold=12)
-    if location == 'Underground Lake':
-        return Enemy('Water Serpent', health=80, power=14, loot=[Item('Scale','material',value=20)], exp=30, gold=20)
-    return Enemy('Wandering Thief', health=35, power=7, loot=[Item('Gold Nugget','material',value=30)], exp=10, gold=10)
-
-BOSS = Boss('Ancient Guardian', health=300, power=25, phases=3, loot=[Item('Guardian Core','material',value=500)], exp=500, gold=1000)
-
+# Per-location enemy tables come from the content packs (spawns.py does the drawing).
+def spawn_enemy_for_location(location:str, level:int=1) -> Enemy:
+    c = content()
+    spec = c.frontier.enemy_spec(location) if c.frontier else None
+    if spec:
+        shared_read('frontier')  # the region's kill counts are every session's
+        loot_name, loot_value = spec['loot']
+        return Enemy(spec['name'], health=spec['health'], power=spec['power'],
+                     loot=[Item(loot_name,'material',value=loot_value)], exp=spec['exp'], gold=spec['gold'])
+    return c.spawns.spawn(location, level, rng())
+
+@metrics.timed('encounter')
 def encounter(player:Player):
     # random encounter based on location
-    e = spawn_enemy_for_location(player.location)
-    print(f"A wild {e.name} appears in the {player.location}!")
+    e = spawn_enemy_for_location(player.location, player.level)
+    say(f"A wild {e.name} appears in the {player.location}!")
     combat(player, e)
+    if e.health <= 0:
+        frontier = content().frontier
+        if frontier:
+            frontier.record_kill(player.location)
 
 # -------------------------
 # Combat
@@ -303,40 +655,42 @@ def encounter(player:Player):
 
 def combat(player:Player, enemy:Enemy):
     while enemy.health > 0 and player.health > 0:
-        print(f"\n{player.name} HP: {player.health}/{player.max_health()}  |  {enemy.name} HP: {enemy.health}")
-        action = input("Choose action: [a]ttack, [s]kill, [u]se item, [r]un: ")
+        with frame() as f:
+            f.line(f"\n{player.name} HP: {player.health}/{player.max_health()}  |  {enemy.name} HP: {enemy.health}")
+        action = ask("Choose action: [a]ttack, [s]kill, [u]se item, [r]un: ")
+        t = metrics.clock()
         if action == 'a':
-            damage = max(1, player.attack_power() - random.randint(0, enemy.power//2))
+            damage = max(1, player.attack_power() - rng().randint(0, enemy.power//2))
             enemy.health -= damage
-            print(f"You strike {enemy.name} for {damage} damage")
+            say(f"You strike {enemy.name} for {damage} damage")
         elif action == 's':
             # class-based skill
             if player.pclass == 'Warrior':
                 dmg = player.attack_power() + 10
                 enemy.health -= dmg
-                print(f"Warrior Charge deals {dmg} damage!")
+                say(f"Warrior Charge deals {dmg} damage!")
             elif player.pclass == 'Mage':
                 dmg = 20 + player.level * 2
                 enemy.health -= dmg
-                print(f"Mage Fireball deals {dmg} damage!")
+                say(f"Mage Fireball deals {dmg} damage!")
             elif player.pclass == 'Rogue':
-                dmg = player.attack_power() + random.randint(5,15)
+                dmg = player.attack_power() + rng().randint(5,15)
                 enemy.health -= dmg
-                print(f"Rogue Backstab deals {dmg} damage!")
+                say(f"Rogue Backstab deals {dmg} damage!")
         elif action == 'u':
-            name = input('Item name to use: ')
+            name = ask('Item name to use: ')
             used = player.use_consumable(name)
             if not used:
                 continue
         elif action == 'r':
-            chance = random.random()
+            chance = rng().random()
             if chance < 0.5:
-                print('You escaped!')
+                say('You escaped!')
                 return
             else:
-                print('Failed to escape!')
+                say('Failed to escape!')
         else:
-            print('Invalid action')
+            say('Invalid action')
             continue
         # enemy turn
         if enemy.health > 0:
@@ -344,54 +698,59 @@ def combat(player:Player, enemy:Enemy):
             # simple defense
             reduced = max(0, ed - player.defense()//2)
             player.health -= reduced
-            print(f"{enemy.name} hits you for {reduced} damage")
+            say(f"{enemy.name} hits you for {reduced} damage")
+        metrics.observe('combat_round_seconds', t)
     if player.health <= 0:
-        print('You were defeated...')
+        say('You were defeated...')
         # simple death: lose half gold, respawn at town
         lost = player.gold//2
         player.gold -= lost
         player.health = player.max_health()
         player.location = 'Town'
-        print(f'You wake up in Town, lost {lost} gold.')
+        say(f'You wake up in Town, lost {lost} gold.')
     else:
-        print(f'You defeated {enemy.name}!')
+        say(f'You defeated {enemy.name}!')
+        quest_event(player, 'kill', enemy.name)
         player.gain_exp(enemy.exp)
         player.gold += enemy.gold
         for it in enemy.loot:
             player.add_item(it)
-        print(f"Gained {enemy.exp} EXP and {enemy.gold} gold")
+        say(f"Gained {enemy.exp} EXP and {enemy.gold} gold")
 
 # Boss fight has phases
 
 def boss_battle(player:Player, boss:Boss):
-    print('\n--- BOSS ENCOUNTER: ' + boss.name + ' ---')
+    say('\n--- BOSS ENCOUNTER: ' + boss.name + ' ---')
     phase = 1
     while boss.health>0 and player.health>0:
-        print(f"Boss Phase {phase}: Boss HP {boss.health} | Player HP {player.health}/{player.max_health()}")
-        combat_action = input('Attack (a) or Use Item (u): ')
+        say(f"Boss Phase {phase}: Boss HP {boss.health} | Player HP {player.health}/{player.max_health()}")
+        combat_action = ask('Attack (a) or Use Item (u): ')
+        t = metrics.clock()
         if combat_action == 'a':
-            dmg = max(1, player.attack_power() - random.randint(0, boss.power//3))
+            dmg = max(1, player.attack_power() - rng().randint(0, boss.power//3))
             boss.health -= dmg
-            print(f'You hit boss for {dmg}')
+            say(f'You hit boss for {dmg}')
         elif combat_action == 'u':
-            name = input('Item name: ')
+            name = ask('Item name: ')
             player.use_consumable(name)
         # boss retaliates with stronger attacks per phase
         if boss.health>0:
-            bd = random.randint(1, boss.power + phase*5)
+            bd = rng().randint(1, boss.power + phase*5)
             player.health -= bd
-            print(f'Boss hits you for {bd}')
+            say(f'Boss hits you for {bd}')
         if boss.health < (boss.health // 2) and phase < boss.phases:
             phase += 1
-            print('The boss enrages and enters phase', phase)
+            say('The boss enrages and enters phase', phase)
+        metrics.observe('boss_round_seconds', t)
     if player.health <= 0:
-        print('You were slain by the boss...')
+        say('You were slain by the boss...')
         player.health = player.max_health()
         player.location = 'Town'
         player.gold = max(0, player.gold - 100)
-        print('You wake up at the town healer, poorer but alive.')
+        say('You wake up at the town healer, poorer but alive.')
     else:
-        print('Boss defeated!')
+        say('Boss defeated!')
+        quest_event(player, 'kill', boss.name)
         player.gain_exp(boss.exp)
         player.gold += boss.gold
         for it in boss.loot:
@@ -401,141 +760,473 @@ def boss_battle(player:Player, boss:Boss):
 # Save / Load (slots)
 # -------------------------
 
+# slots_index.json keeps a small metadata record per slot so the slot list
+# never has to parse full saves. Each entry remembers the file's size and
+# mtime; if those no longer match (or the entry is missing) the save is
+# re-read once and the entry refreshed.
+
+# the index is rewritten by menu saves and the autosave thread alike; every
+# read-modify-write of it holds this lock so neither loses the other's entry
+_index_lock = threading.RLock()
+
+def _load_slot_index() -> Dict[str, dict]:
+    try:
+        with open(index_path(),'r') as f:
+            idx = json.load(f)
+        return idx if isinstance(idx, dict) else {}
+    except (OSError, ValueError):
+        return {}
+
+def _write_slot_index(idx: Dict[str, dict]):
+    saveformat.atomic_write(index_path(), json.dumps(idx).encode())
+
+def _slot_meta(data: dict, raw: bytes, st: os.stat_result) -> dict:
+    pl = data.get('player', {})
+    return {
+        'format': 'binary' if saveformat.is_binary(raw) else 'json',
+        'name': pl.get('name','<unknown>'),
+        'pclass': pl.get('pclass'),
+        'level': pl.get('level'),
+        'location': pl.get('location'),
+        'timestamp': data.get('timestamp'),
+        'size': st.st_size,
+        'mtime': st.st_mtime_ns,
+        'checksum': hashlib.sha256(raw).hexdigest(),
+    }
+
+def _read_slot_meta(p: str, st: os.stat_result) -> dict:
+    with open(p,'rb') as f:
+        raw = f.read()
+    try:
+        data = saveformat.decode_meta(raw) if saveformat.is_binary(raw) else json.loads(raw)
+        return _slot_meta(data, raw, st)
+    except Exception:
+        return {'name': '<corrupt>', 'timestamp': None, 'size': st.st_size, 'mtime': st.st_mtime_ns}
+
+def _slot_index_entries(slots) -> Dict[int, dict]:
+    with _index_lock:
+        return _refresh_slot_index(slots)
+
+def _refresh_slot_index(slots) -> Dict[int, dict]:
+    idx = _load_slot_index()
+    dirty = False
+    out = {}
+    for i in slots:
+        key = str(i)
+        p = slot_file(i)
+        if p is None:
+            if idx.pop(key, None) is not None:
+                dirty = True
+            continue
+        st = os.stat(p)
+        meta = idx.get(key)
+        if not meta or meta.get('size') != st.st_size or meta.get('mtime') != st.st_mtime_ns:
+            meta = _read_slot_meta(p, st)
+            idx[key] = meta
+            dirty = True
+        out[i] = meta
+    if dirty:
+        _write_slot_index(idx)
+    return out
+
+def _decode_save(raw: bytes) -> dict:
+    if saveformat.is_binary(raw):
+        return saveformat.decode(raw)
+    return json.loads(raw)
+
+# A storage backend provides:
+#   save(slot, data, fmt) -> bytes written   replace the slot with a full save document
+#   append(slot, entry) -> bool              apply an incremental save entry (see journal.py);
+#                                            False if it needs a full save instead
+#   load(slot) -> data or None               the document, incremental saves applied
+#   entries(slots) -> {slot: meta}           listing metadata of the non-empty slots
+# FileStore is the one-file-per-slot layout above; sqlstore.SQLiteStore keeps
+# every account in one database.
+
+class FileStore:
+    def save(self, slot:int, data:dict, fmt:str) -> int:
+        if fmt == 'binary':
+            raw = saveformat.encode(data)
+        else:
+            raw = json.dumps(data,indent=2).encode()
+        p = save_path(slot, fmt)
+        os.makedirs(os.path.dirname(p), exist_ok=True)
+        saveformat.atomic_write(p, raw)
+        # a slot holds one save; drop the file in the other format if there was one
+        other = save_path(slot, 'json' if fmt == 'binary' else 'binary')
+        if os.path.exists(other):
+            os.remove(other)
+        # the new snapshot supersedes any journal (stale entries are skipped by base anyway)
+        if os.path.exists(journal_path(slot)):
+            os.remove(journal_path(slot))
+        with _index_lock:
+            idx = _load_slot_index()
+            idx[str(slot)] = _slot_meta(data, raw, os.stat(p))
+            _write_slot_index(idx)
+        return len(raw)
+
+    def append(self, slot:int, entry:dict) -> bool:
+        if slot_file(slot) is None:
+            return False
+        size = journal.append(journal_path(slot), entry)
+        if size > JOURNAL_COMPACT_BYTES:
+            return False  # compact: the full save replaces the journal
+        with _index_lock:
+            idx = _load_slot_index()
+            meta = idx.get(str(slot))
+            if meta:
+                pl = entry.get('set', {})
+                meta.update({k: pl[k] for k in ('level', 'location') if k in pl})
+                meta['timestamp'] = entry['timestamp']
+                _write_slot_index(idx)
+        return True
+
+    def load(self, slot:int) -> Optional[dict]:
+        pth = slot_file(slot)
+        if pth is None:
+            return None
+        with open(pth,'rb') as f:
+            raw = f.read()
+        metrics.count('load_bytes_read_total', len(raw))
+        data = _decode_save(raw)
+        journal.replay(data, journal_path(slot))
+        return data
+
+    def entries(self, slots) -> Dict[int, dict]:
+        return _slot_index_entries(slots)
+
+_stores: Dict[tuple, object] = {}
+_stores_lock = threading.Lock()
+
+def storage():
+    """The SAVE_BACKEND store."""
+    key = (SAVE_BACKEND, DATA_DIR)
+    store = _stores.get(key)
+    if store is None:
+        with _stores_lock:
+            store = _stores.get(key)
+            if store is None:
+                if SAVE_BACKEND == 'sqlite':
+                    store = SQLiteStore(os.path.join(DATA_DIR, 'saves.db'), account=ACCOUNT.get)
+                else:
+                    store = FileStore()
+                _stores[key] = store
+    return store
+
+_analytics: Dict[str, analytics.Analytics] = {}
+_analytics_lock = threading.Lock()
+
+def stats() -> analytics.Analytics:
+    """Leaderboards over every save in DATA_DIR; rescanned once if there is no saved state."""
+    a = _analytics.get(DATA_DIR)
+    if a is None:
+        with _analytics_lock:
+            a = _analytics.get(DATA_DIR)
+            if a is None:
+                data_dir = DATA_DIR
+                a = analytics.Analytics(state_dir=lambda: data_dir)
+                if not a.load():
+                    if SAVE_BACKEND == 'sqlite':
+                        a.rebuild(analytics.scan_sqlite(storage().path))
+                    else:
+                        a.rebuild(analytics.scan_files(DATA_DIR))
+                _analytics[DATA_DIR] = a
+    return a
+
+def slot_info(slot:int) -> Optional[dict]:
+    """Metadata for one slot, or None if the slot is empty."""
+    return storage().entries(range(slot, slot+1)).get(slot)
+
+@metrics.timed('list_save_slots')
 def list_save_slots():
+    entries = storage().entries(range(1, DEFAULT_SAVE_SLOTS+1))
     slots = []
     for i in range(1, DEFAULT_SAVE_SLOTS+1):
-        p = save_path(i)
-        if os.path.exists(p):
-            with open(p,'r') as f:
-                try:
-                    data = json.load(f)
-                    slots.append((i, data.get('player',{}).get('name','<unknown>'), data.get('timestamp')))
-                except Exception:
-                    slots.append((i, '<corrupt>', None))
+        meta = entries.get(i)
+        if meta:
+            slots.append((i, meta['name'], meta['timestamp']))
         else:
             slots.append((i, None, None))
     return slots
 
-def save_to_slot(player:Player, slot:int):
-    data = {'player': player.to_dict(), 'timestamp': now_ts()}
-    with open(save_path(slot),'w') as f:
-        json.dump(data,f,indent=2)
-    print(f'Saved to slot {slot}')
-DAILY_QUESTS = [
-    {"desc": "Defeat 3 Goblins", "reward": 20},
-    {"desc": "Collect 5 Herbs", "reward": 15},
-    {"desc": "Travel to the Cave", "reward": 10},
-]
+# Fields an incremental save compares against the last persisted values.
+JOURNAL_FIELDS = ('name', 'pclass', 'level', 'exp', 'health', 'gold', 'location', 'story_progress', 'market_seq')
+
+def _journal_fields(player:Player) -> dict:
+    fields = {k: getattr(player, k) for k in JOURNAL_FIELDS}
+    fields['quests'] = player.quests.to_dict()
+    return fields
+
+def _track_journal(player:Player, slot:int, base_ts:str):
+    """Remember what was just persisted so the next save only writes changes."""
+    player._journal = {
+        'slot': slot,
+        'base': base_ts,
+        'fields': _journal_fields(player),
+        'equipment': player.equipment.to_dict(),
+    }
+    player._inv_log = []
+
+@metrics.timed('save_to_slot')
+def save_to_slot(player:Player, slot:int, fmt:Optional[str]=None, announce:bool=True):
+    fmt = fmt or SAVE_FORMAT
+    if slot == AUTOSAVE_SLOT:
+        AUTOSAVER.flush((saves_dir(), ACCOUNT.get()))  # a queued autosave must not land on top
+    data = {'schema': schema.CURRENT, 'player': player.to_dict(), 'timestamp': now_ts()}
+    metrics.count('save_bytes_written_total', storage().save(slot, data, fmt))
+    if ANALYTICS and slot != AUTOSAVE_SLOT:  # the autosave is a copy of a real slot, not a player of its own
+        stats().update((ACCOUNT.get(), slot), analytics.record_of(data))
+    _track_journal(player, slot, data['timestamp'])
+    if announce:
+        say(f'Saved to slot {slot}')
+
+@metrics.timed('save_incremental')
+def save_incremental(player:Player, slot:int, announce:bool=True):
+    """Save only what changed since the last save of this slot (a journal entry for files).
+
+    Falls back to a full snapshot when there is nothing to append to, when the
+    inventory was replaced wholesale instead of through add_item/discard_item,
+    and when the journal grows past JOURNAL_COMPACT_BYTES (compaction). The
+    autosave slot is always saved in full: the background writer replaces its
+    snapshot without telling the player, so a journal entry could hang off a
+    base that is gone.
+    """
+    tr = player._journal
+    if tr is None or tr['slot'] != slot or slot == AUTOSAVE_SLOT:
+        save_to_slot(player, slot, announce=announce)
+        return
+    entry = {'base': tr['base'], 'timestamp': now_ts()}
+    fields = _journal_fields(player)
+    changed = {k: v for k, v in fields.items() if tr['fields'].get(k) != v}
+    if changed:
+        entry['set'] = changed
+    eq = player.equipment.to_dict()
+    eq_changed = {k: v for k, v in eq.items() if tr['equipment'].get(k) != v}
+    if eq_changed:
+        entry['equip'] = eq_changed
+    if player._inv_log:
+        entry['inv'] = player._inv_log
+    if len(entry) == 2:
+        if announce:
+            say('Nothing changed since the last save.')
+        return
+    if not storage().append(slot, entry):
+        save_to_slot(player, slot, announce=announce)
+        return
+    if ANALYTICS and slot != AUTOSAVE_SLOT:
+        stats().update((ACCOUNT.get(), slot), analytics.record_of_player(player, entry['timestamp']))
+    tr['fields'] = fields
+    tr['equipment'] = eq
+    player._inv_log = []
+    if announce:
+        say(f'Saved to slot {slot}')
+
+AUTOSAVER = AutosaveWriter()
+
+def _write_autosave(data:dict):
+    # runs on the writer thread, in the context autosave() was called from
+    storage().save(AUTOSAVE_SLOT, data, SAVE_FORMAT)
+
+def autosave(player:Player):
+    """Hand a snapshot of the player to the background writer (the autosave slot)."""
+    if not AUTOSAVE:
+        return
+    key = (saves_dir(), ACCOUNT.get())
+    err = AUTOSAVER.error(key)
+    if err is not None:
+        say(f'Autosave failed: {err}')
+    data = {'schema': schema.CURRENT, 'player': player.to_dict(), 'timestamp': now_ts()}
+    AUTOSAVER.submit(key, data, _write_autosave)
+
+def save_game(player:Player, slot:int):
+    if INCREMENTAL_SAVES:
+        save_incremental(player, slot)
+    else:
+        save_to_slot(player, slot)
+
+
+def quest_log(player: Player) -> QuestLog:
+    # follows content reloads: progress carries over, quests that were removed or changed are dropped
+    quests = content().quests
+    if player.quests.defs is not quests:
+        player.quests = QuestLog.from_dict(player.quests.to_dict(), quests)
+    return player.quests
 
 def give_daily_quest(player: Player):
-    quest = random.choice(DAILY_QUESTS)
-    print(f"New Quest: {quest['desc']} | Reward: {quest['reward']} gold")
-    player.daily_quest = quest
+    c = content()
+    quest = c.quests[rng().choice(c.quest_list)['id']]
+    if not quest_log(player).accept(quest.id):
+        say(f"You are already on it: {quest.desc}")
+        return
+    say(f"New Quest: {quest.desc} | Reward: {quest.reward} gold")
+
+def quest_event(player: Player, event: str, target: str, n: int = 1):
+    """Report a game event to the player's quests and pay out the ones it completes."""
+    for quest in quest_log(player).emit(event, target, n):
+        say(f"Quest complete: {quest.desc}! +{quest.reward} gold")
+        player.gold += quest.reward
+        if quest.reward_exp:
+            player.gain_exp(quest.reward_exp)
+
+
+@metrics.timed('load_from_slot')
 def load_from_slot(slot:int) -> Optional[Player]:
-    pth = save_path(slot)
-    if not os.path.exists(pth):
-        print('No save in that slot')
+    data = storage().load(slot)
+    if data is None:
+        say('No save in that slot')
         return None
-    with open(pth,'r') as f:
-        data = json.load(f)
-    return Player.from_dict(data['player'])
+    data = schema.migrate(data)
+    p = Player.from_dict(data['player'])
+    _track_journal(p, slot, data['timestamp'])
+    reconcile_market(p)
+    return p
 
 # -------------------------
 # Game Menus
 # -------------------------
 
 def choose_class_menu():
-    print('Choose a class:')
-    print('1) Warrior — high health and strong melee')
-    print('2) Mage — powerful spells, lower HP')
-    print('3) Rogue — sneaky, high criticals')
-    choice = input('>Select> ')
+    say('Choose a class:')
+    say('1) Warrior — high health and strong melee')
+    say('2) Mage — powerful spells, lower HP')
+    say('3) Rogue — sneaky, high criticals')
+    choice = ask('>Select> ')
     mapping = {'1':'Warrior','2':'Mage','3':'Rogue'}
     return mapping.get(choice,'Warrior')
 
 
 def main_menu():
-    print('\n=== Welcome to The Ancient Path - Enhanced RPG ===')
-    print('1) New Game')
-    print('2) Load Game')
-    print('3) List Save Slots')
-    print('4) Quit')
+    with frame() as f:
+        f.line('\n=== Welcome to The Ancient Path - Enhanced RPG ===')
+        f.line('1) New Game')
+        f.line('2) Load Game')
+        f.line('3) List Save Slots')
+        f.line('4) Quit')
+        f.line('5) Leaderboards')
 
 
 def in_game_menu(player:Player, shop:Shop):
-    print(f"\n-- {player.name} the {player.pclass} | Level {player.level} | HP {player.health}/{player.max_health()} | Gold {player.gold} | Loc: {player.location} --")
-    print('1) Travel')
-    print('2) Explore / Encounter')
-    print('3) Inventory / Use / Equip')
-    print('4) Crafting')
-    print('5) Shop')
-    print('6) Save Game')
-    print('7) Boss Challenge (story)')
-    print('8) View Stats')
-    print('9) Exit to Main Menu')
+    with frame('in_game_menu') as f:
+        f.line(f"\n-- {player.name} the {player.pclass} | Level {player.level} | HP {player.health}/{player.max_health()} | Gold {player.gold} | Loc: {player.location} --")
+        f.line('1) Travel')
+        f.line('2) Explore / Encounter')
+        f.line('3) Inventory / Use / Equip')
+        f.line('4) Crafting')
+        f.line('5) Shop')
+        f.line('6) Save Game')
+        f.line('7) Boss Challenge (story)')
+        f.line('8) View Stats')
+        f.line('p) Player Market')
+        f.line('q) Quests')
+        if is_admin():
+            f.line('m) Metrics')
+        f.line('9) Exit to Main Menu')
 
 # -------------------------
 # Travel & Map navigation
 # -------------------------
 
+def _touch(c:Content, loc:str):
+    # generates the frontier region loc is in, if it is in one
+    if c.frontier is not None and c.frontier.touch(loc) is not None:
+        shared_read('frontier')
+
 def travel_menu(player:Player):
     loc = player.location
-    print(f'You are at {loc}. Adjacent locations: {WORLD_MAP.get(loc,[])}')
-    choices = WORLD_MAP.get(loc, [])
+    c = content()
+    _touch(c, loc)
+    choices = c.world.neighbors(loc)
+    say(f'You are at {loc}. Adjacent locations: {choices}')
     if not choices:
-        print('No where to travel.')
+        say('No where to travel.')
+        return
+    for i, dest in enumerate(choices, start=1):
+        say(f'{i}) {dest}')
+    say('f) Fast travel')
+    sel = ask('Choose destination number: ')
+    if sel == 'f':
+        fast_travel_menu(player)
         return
-    for i, c in enumerate(choices, start=1):
-        print(f'{i}) {c}')
-    sel = input('Choose destination number: ')
     try:
         idx = int(sel)-1
-        if idx < 0 or idx >= len(choices):
-            print('Invalid')
-            return
-        newloc = choices[idx]
-        player.location = newloc
-        print(f'You travel to {newloc}')
-    except Exception:
-        print('Invalid')
+    except ValueError:
+        say('Invalid')
+        return
+    if idx < 0 or idx >= len(choices):
+        say('Invalid')
+        return
+    newloc = choices[idx]
+    player.location = newloc
+    _touch(c, newloc)
+    say(f'You travel to {newloc}')
+    quest_event(player, 'enter', newloc)
+
+def fast_travel_menu(player:Player):
+    dest = ask('Fast travel to: ').strip()
+    c = content()
+    found = c.world.route(player.location, dest)
+    if not found or dest == player.location:
+        say(f'No route from {player.location} to {dest!r}.')
+        return
+    path, cost = found
+    say(f"Route: {' -> '.join(path)} (cost {cost})")
+    if ask('Travel? (y/n) ').lower() != 'y':
+        return
+    # walk the route so story events along the way still fire
+    for hop in path[1:-1]:
+        player.location = hop
+        story_progression(player)
+        quest_event(player, 'enter', hop)
+    player.location = path[-1]
+    _touch(c, path[-1])
+    say(f'You travel to {path[-1]}')
+    quest_event(player, 'enter', path[-1])
 
 # -------------------------
 # Inventory / Equip
 # -------------------------
 
 def show_inventory(player:Player):
-    print('\n-- Inventory --')
     if not player.inventory:
-        print('Empty')
+        say('\n-- Inventory --\nEmpty')
         return
-    for i,it in enumerate(player.inventory,start=1):
-        print(f"{i}) {it.name} ({it.type}) - Power:{it.power} Value:{it.value}")
+    # rows are formatted a page at a time, so a huge inventory only costs what's on screen
+    rows = (f"{i}) {it.name}{f' x{qty}' if qty > 1 else ''} ({it.type}) - Power:{it.power} Value:{it.value}"
+            for i, (it, qty) in enumerate(player.inventory.iter_stacks(), start=1))
+    paginate(rows, player.inventory.stack_count(), '\n-- Inventory --')
 
 def equip_menu(player:Player):
     show_inventory(player)
-    choice = input('Enter item name to equip (weapon/armor) or blank: ')
+    choice = ask('Enter item name to equip (weapon/armor) or blank: ')
     if not choice:
         return
-    for it in player.inventory:
-        if it.name == choice and it.type in ('weapon','armor'):
-            player.equipment.equip(it)
-            print(f'Equipped {it.name}')
-            return
-    print('Item not equippable or not found')
+    it = player.inventory.find(choice, ('weapon','armor'))
+    if it is None:
+        say('Item not equippable or not found')
+        return
+    player.equipment.equip(it)
+    say(f'Equipped {it.name}')
 
 # -------------------------
 # Crafting Menu
 # -------------------------
 
 def crafting_menu(player:Player):
-    print('\n-- Crafting Station --')
-    print('Available recipes:')
-    for name, rec in CRAFT_RECIPES.items():
-        print(f"{name}: requires {', '.join([f'{k}x{v}' for k,v in rec['materials'].items()])}")
-    choice = input('Enter recipe name to craft or blank: ')
+    counts = craft_tracker(player).counts()
+    with frame() as f:
+        f.line('\n-- Crafting Station --')
+        f.line('Available recipes:')
+        for name, rec in content().recipes.items():
+            can = f" (can craft {counts[name]})" if counts.get(name) else ''
+            f.line(f"{name}: requires {', '.join([f'{k}x{v}' for k,v in rec['materials'].items()])}{can}")
+    choice = ask('Enter recipe name to craft (add " x3" for several) or blank: ')
     if not choice:
         return
-    craft_item(player, choice)
+    name, n = choice, 1
+    head, _, tail = choice.rpartition(' x')
+    if head and tail.isdigit():
+        name, n = head.strip(), int(tail)
+    craft_item(player, name, n)
 
 # -------------------------
 # Shop Menu
@@ -544,8 +1235,7 @@ def crafting_menu(player:Player):
 def shop_menu(player:Player, shop:Shop):
     while True:
         shop.display()
-        print('Commands: buy <name>, sell <name>, exit')
-        cmd = input('> ')
+        cmd = ask('> ')
         if cmd.startswith('buy '):
             name = cmd[4:]
             shop.buy(player, name)
@@ -555,7 +1245,202 @@ def shop_menu(player:Player, shop:Shop):
         elif cmd == 'exit':
             break
         else:
-            print('Unknown command')
+            say('Unknown command')
+
+# -------------------------
+# Player Market
+# -------------------------
+
+_markets: Dict[str, Market] = {}
+_markets_lock = threading.Lock()
+
+def market_path() -> str:
+    return os.path.join(DATA_DIR, 'market.json')
+
+def market() -> Market:
+    """The market shared by every session of this process, loaded from DATA_DIR on first use."""
+    shared_read('market')
+    m = _markets.get(DATA_DIR)
+    if m is None:
+        with _markets_lock:
+            m = _markets.get(DATA_DIR)
+            if m is None:
+                m = _markets[DATA_DIR] = Market.load(market_path(), Item.from_dict)
+    return m
+
+def save_markets():
+    """Fold every loaded market's order log into a snapshot (at shutdown)."""
+    for m in list(_markets.values()):
+        if m.dirty:
+            m.save()
+        else:
+            m.sync()
+
+def commit_market(player:Player, m:Market):
+    """Make the player's market change durable, then save their side of it.
+
+    Placing an order takes goods from the player and collecting hands them
+    back. The market's log is synced first, then the player is saved to the
+    slot they're playing from (or to the autosave slot if they haven't saved
+    yet), then the change is settled. If the game stops in between, the
+    change stays unsettled and loading the save applies it (reconcile_market),
+    so goods are never both in the market and in the save.
+    """
+    owner = market_owner(player)
+    pending = m.unsettled(owner, player.market_seq)
+    if not pending:
+        m.sync()
+        return
+    seq = pending[-1][0]
+    m.sync(seq)
+    player.market_seq = seq
+    tr = player._journal
+    save_incremental(player, AUTOSAVE_SLOT if tr is None else tr['slot'], announce=False)
+    m.settle(owner, seq)
+
+def reconcile_market(player:Player):
+    """Apply the player's market changes that reached the market but not their save."""
+    for seq, gold, taken, given in market().unsettled(market_owner(player), player.market_seq):
+        player.gold += gold
+        for it, n in taken:
+            n = min(n, player.inventory.quantity(it))
+            if n:
+                player.discard_item(it, n)
+        for it, n in given:
+            player.add_item(it, n)
+        player.market_seq = seq
+
+def market_owner(player:Player) -> str:
+    account = ACCOUNT.get()
+    return f'{account}/{player.name}' if account else player.name
+
+def collect_market(player:Player):
+    """Hand the player whatever their orders earned or returned while they were away."""
+    m = market()
+    gold, lots = m.collect(market_owner(player))
+    for it, n in lots:
+        player.add_item(it, n)
+    if gold or lots:
+        player.gold += gold
+        commit_market(player, m)
+        got = [f'{gold} gold'] if gold else []
+        got += [f'{n}x {it.name}' for it, n in lots]
+        say(f"Market: received {', '.join(got)}")
+
+def _market_order(cmd:str):
+    # "<item name> <qty> <price>"
+    name, qty, price = cmd.rsplit(' ', 2)
+    return name.strip(), int(qty), int(price)
+
+def market_menu(player:Player, shop:Shop):
+    m = market()
+    owner = market_owner(player)
+    while True:
+        collect_market(player)
+        say('\n-- Player Market --')
+        for name in m.items():
+            q = m.quote(name)
+            npc = shop.stock.get(name)
+            npc = f" | shop sells at {npc.value}" if npc else ''
+            say(f"{name}: bid {q['bid'] or '-'} / ask {q['ask'] or '-'}, last {q['last'] or '-'}, "
+                f"volume {q['volume']}{npc}")
+        say('Commands: sell <item> <qty> <price>, buy <item> <qty> <price>, orders, cancel <id>, '
+            'history <item>, exit')
+        cmd = ask('> ').strip()
+        try:
+            if cmd.startswith('sell '):
+                name, qty, price = _market_order(cmd[5:])
+                lots = player.take_items(name, qty) if qty > 0 and price > 0 else None
+                if lots is None:
+                    say(f"You don't have {qty}x {name} to sell" if qty > 0 and price > 0 else 'Invalid order')
+                    continue
+                order, trades = m.sell(owner, name, price, lots)
+                commit_market(player, m)
+                say(f'Sell order #{order.id}: {qty}x {name} at {price}, {qty - order.qty} sold')
+            elif cmd.startswith('buy '):
+                name, qty, price = _market_order(cmd[4:])
+                if qty < 1 or price < 1:
+                    say('Invalid order')
+                    continue
+                if player.gold < qty * price:
+                    say('Not enough gold')
+                    continue
+                player.gold -= qty * price
+                order, trades = m.buy(owner, name, price, qty)
+                commit_market(player, m)
+                say(f'Buy order #{order.id}: {qty}x {name} at up to {price}, {qty - order.qty} bought')
+            elif cmd == 'orders':
+                mine = m.orders(owner)
+                for o in mine:
+                    say(f'#{o.id} {o.side} {o.qty}x {o.item} at {o.price}')
+                if not mine:
+                    say('No open orders')
+            elif cmd.startswith('cancel '):
+                if m.cancel(owner, int(cmd[7:].lstrip('#'))):
+                    m.sync()  # the refund waits in the mailbox until the next collect
+                    say('Cancelled')
+                else:
+                    say('No such open order')
+            elif cmd.startswith('history '):
+                trades = m.trades(cmd[8:].strip())
+                for t in trades:
+                    say(f"{datetime.datetime.fromtimestamp(t.time):%H:%M:%S} {t.qty}x at {t.price}")
+                if not trades:
+                    say('No trades yet')
+            elif cmd == 'exit':
+                break
+            else:
+                say('Unknown command')
+        except (ValueError, MarketError):
+            say('Invalid order')
+
+# -------------------------
+# Metrics (admin)
+# -------------------------
+
+def is_admin() -> bool:
+    """The console session (no account) or a server account listed in ADMIN_ACCOUNTS."""
+    account = ACCOUNT.get()
+    return not account or account in ADMIN_ACCOUNTS
+
+def metrics_menu():
+    # the numbers cover every session on the server, and 'on'/'reset' change them for everyone
+    if not is_admin():
+        say('Invalid')
+        return
+    while True:
+        say(f"\n-- Metrics ({'on' if metrics.enabled else 'off'}) --")
+        for line in metrics.summary() or ['Nothing recorded yet.']:
+            say(line)
+        say('Commands: on, off, reset, json, prom, exit')
+        cmd = ask('> ')
+        if cmd in ('on', 'off'):
+            metrics.enable(cmd == 'on')
+        elif cmd == 'reset':
+            metrics.reset()
+        elif cmd in ('json', 'prom'):
+            p = os.path.join(saves_dir(), 'metrics.json' if cmd == 'json' else 'metrics.prom')
+            metrics.write(p, 'json' if cmd == 'json' else 'prometheus')
+            say(f'Wrote {p}')
+        elif cmd == 'exit':
+            break
+        else:
+            say('Unknown command')
+
+# -------------------------
+# Leaderboards
+# -------------------------
+
+def leaderboards_menu():
+    a = stats()
+    for board, title in (('level', 'Highest level'), ('gold', 'Most gold'), ('story', 'Story completed')):
+        say(f'\n== {title} ==')
+        lines = analytics.format_board(board, a.top(board, 10))
+        for line in lines or ['  (nobody yet)']:
+            say(line)
+    say('\n== Economy ==')
+    for line in analytics.format_economy(a.economy()):
+        say(line)
 
 # -------------------------
 # Story & Quests
@@ -563,23 +1448,45 @@ def shop_menu(player:Player, shop:Shop):
 
 def story_progression(player:Player):
     if player.story_progress == 0 and player.location == 'Ruins':
-        print('\nYou discover an inscription hinting at a sealed guardian deep in the Ancient Temple.')
+        say('\nYou discover an inscription hinting at a sealed guardian deep in the Ancient Temple.')
         player.story_progress = 1
     elif player.story_progress == 1 and player.location == 'Ancient Temple':
-        print('\nA puzzle opens a passage to the Boss Lair.')
+        say('\nA puzzle opens a passage to the Boss Lair.')
         player.story_progress = 2
 
+def quests_menu(player:Player):
+    while True:
+        say('\n-- Quests --')
+        log = quest_log(player)
+        active = list(log.active)
+        for i, line in enumerate(log.describe(), start=1):
+            say(f'{i}) {line}')
+        if not active:
+            say('No active quests.')
+        say('Commands: new (take a daily quest), drop <number>, exit')
+        cmd = ask('> ').strip()
+        if cmd == 'new':
+            give_daily_quest(player)
+        elif cmd.startswith('drop ') and cmd[5:].strip().isdigit() and 1 <= int(cmd[5:]) <= len(active):
+            qid = active[int(cmd[5:]) - 1]
+            log.abandon(qid)
+            say(f'Dropped: {log.defs[qid].desc}')
+        elif cmd == 'exit':
+            break
+        else:
+            say('Unknown command')
+
 # Boss challenge if conditions met
 
 def attempt_boss(player:Player):
     if player.location != 'Boss Lair' and player.story_progress < 2:
-        print('The way is sealed. You must progress the story to enter the Boss Lair.')
+        say('The way is sealed. You must progress the story to enter the Boss Lair.')
         return
     # copy boss for fight
-    boss_copy = Boss(BOSS.name, BOSS.health, BOSS.power, BOSS.phases, loot=BOSS.loot, exp=BOSS.exp, gold=BOSS.gold)
+    boss_copy = content().boss.clone()
     boss_battle(player, boss_copy)
     if boss_copy.health <= 0:
-        print('With the Guardian defeated the world feels at peace... You completed the main story!')
+        say('With the Guardian defeated the world feels at peace... You completed the main story!')
         player.story_progress = 99
 
 # -------------------------
@@ -588,46 +1495,63 @@ def attempt_boss(player:Player):
 
 def play_game(player:Player):
     shop = Shop()
+    # replays start from these (see session.py / replay.py)
+    checkpoint(player, force=True)
     while True:
+        checkpoint(player)
         in_game_menu(player, shop)
-        choice = input('Choose> ')
+        choice = ask('Choose> ')
         if choice == '1':
             travel_menu(player)
             # after move, maybe story hint
             story_progression(player)
+            autosave(player)
         elif choice == '2':
             encounter(player)
+            autosave(player)
         elif choice == '3':
-            print('\n1) Show inventory 2) Equip item 3) Use consumable 0) Back')
-            sub = input('> ')
+            say('\n1) Show inventory 2) Equip item 3) Use consumable 0) Back')
+            sub = ask('> ')
             if sub == '1':
                 show_inventory(player)
             elif sub == '2':
                 equip_menu(player)
             elif sub == '3':
-                name = input('Item name to use: ')
+                name = ask('Item name to use: ')
                 player.use_consumable(name)
         elif choice == '4':
             crafting_menu(player)
+            autosave(player)
         elif choice == '5':
             shop_menu(player, shop)
         elif choice == '6':
-            print('Save to which slot?')
+            say('Save to which slot?')
             slots = list_save_slots()
             for s in slots:
-                print(s)
-            slot = int(input('Slot number: '))
-            save_to_slot(player, slot)
+                say(s)
+            slot = int(ask('Slot number: '))
+            save_game(player, slot)
         elif choice == '7':
             attempt_boss(player)
+            autosave(player)
         elif choice == '8':
-            print(json.dumps(player.to_dict(), indent=2))
+            say(json.dumps(player.to_dict(), indent=2))
+        elif choice == 'p':
+            market_menu(player, shop)
+        elif choice == 'q':
+            quests_menu(player)
+        elif choice == 'm':
+            metrics_menu()
         elif choice == '9':
-            confirm = input('Exit to main menu? (y/n) ')
+            confirm = ask('Exit to main menu? (y/n) ')
             if confirm.lower()=='y':
+                if content().frontier:
+                    content().frontier.flush()
+                AUTOSAVER.flush((saves_dir(), ACCOUNT.get()))
+                release(current_io())  # the main menu scrolls like everything else
                 break
         else:
-            print('Invalid')
+            say('Invalid')
 
 # -------------------------
 # Entrypoint
@@ -636,32 +1560,66 @@ def play_game(player:Player):
 def start():
     while True:
         main_menu()
-        sel = input('> ')
+        sel = ask('> ')
         if sel == '1':
-            name = input('Enter character name: ')
+            name = ask('Enter character name: ')
             pclass = choose_class_menu()
             player = Player(name, pclass)
-            print(f'Created {player.name} the {player.pclass}')
+            say(f'Created {player.name} the {player.pclass}')
             play_game(player)
         elif sel == '2':
-            print('Select slot to load:')
+            say('Select slot to load:')
             slots = list_save_slots()
             for s in slots:
-                print(s)
-            slot = int(input('Slot: '))
+                say(s)
+            auto = slot_info(AUTOSAVE_SLOT)
+            if auto:
+                say((AUTOSAVE_SLOT, f"{auto['name']} (autosave)", auto['timestamp']))
+            slot = int(ask('Slot: '))
             p = load_from_slot(slot)
             if p:
-                print(f'Loaded {p.name}')
+                say(f'Loaded {p.name}')
                 play_game(p)
         elif sel == '3':
             slots = list_save_slots()
             for s in slots:
-                print(s)
+                say(s)
         elif sel == '4':
-            print('Goodbye!')
-            sys.exit(0)
+            say('Goodbye!')
+            return
+        elif sel == '5':
+            leaderboards_menu()
         else:
-            print('Invalid choice')
+            say('Invalid choice')
+
+def new_session(seed:Optional[int]=None) -> Session:
+    """A seeded session, logged under <saves>/sessions/ if RECORD_SESSIONS is on."""
+    if seed is None:
+        seed = new_seed()
+    if not RECORD_SESSIONS:
+        return Session(seed)
+    d = os.path.join(saves_dir(), 'sessions')
+    prune_session_logs(d, SESSION_LOGS_KEPT - 1)  # room for the new one
+    stamp = datetime.datetime.utcnow().strftime('%Y%m%d-%H%M%S')
+    return Session(seed, os.path.join(d, f'{stamp}-{seed:016x}.plog'))
+
+def prune_session_logs(d:str, keep:int):
+    """Delete all but the ``keep`` newest logs in ``d`` (names start with their UTC time)."""
+    try:
+        logs = sorted(n for n in os.listdir(d) if n.endswith('.plog'))
+    except FileNotFoundError:
+        return
+    for name in logs[:max(0, len(logs) - keep)]:
+        try:
+            os.remove(os.path.join(d, name))
+        except OSError:
+            pass
 
 if __name__ == '__main__':
-    start()
+    metrics.enable(METRICS)
+    try:
+        with use_session(new_session()):
+            start()
+    finally:
+        AUTOSAVER.close()
+        save_markets()
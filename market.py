@@ -0,0 +1,556 @@
+"""Shared player-to-player market: per-item order books matched by price, then time.
+
+Each item name has its own ``Book`` with its own lock, so sessions trading
+different items never wait on each other. A book keeps two heaps, bids
+(highest price first) and asks (lowest price first), and a new order is
+matched against the other side in O(log n) per fill. A trade executes at the
+resting order's price. Cancelled orders stay in the heap and are dropped
+when they reach the top.
+
+Orders are escrowed when they're placed. A sell order carries the actual
+items (``lots``, ``[item, qty]`` pairs) and a buy order stands for
+``price * qty`` gold that the caller has already taken from the player.
+Fills, refunds and cancellations are paid into the owner's mailbox, and
+``collect()`` empties it. The counterparty can be offline, or in another
+session, when their order fills.
+
+Changes are appended to an order log next to the snapshot file (``sell``,
+``buy``, ``cancel``, ``collect`` and ``settle`` records, numbered in order)
+while the book's lock is held, so the log has each book's changes in order.
+Logging one is a buffered append; the market is never rewritten per order.
+``sync()`` makes them durable with one fsync for every change logged so far,
+shared by the sessions syncing at the same time. Once the log passes
+``compact_bytes`` it is folded into a new snapshot. Loading reads the snapshot
+and replays the log after it.
+
+A player's save and the market are separate files, so the market also keeps
+each owner's changes to their own goods and gold (an order's escrow, a
+collection) until ``settle()`` says their save has them. Whoever loads a save
+older than that applies ``unsettled()`` to it, and a crash between the two
+writes loses or duplicates nothing.
+
+Every book also keeps the last ``history`` trades in a ring buffer for
+quotes and price charts. Items are opaque here: anything with ``.name`` and
+``.to_dict()``. ``item_from_dict`` rebuilds them when a saved market is loaded.
+The NPC ``Shop`` in main.py stays as a fixed-price buyer and seller next to
+the market.
+"""
+import heapq
+import itertools
+import json
+import os
+import threading
+import time
+from collections import deque
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple
+
+import metrics
+import saveformat
+
+BUY, SELL = 'buy', 'sell'
+HISTORY = 256  # trades kept per item
+COMPACT_BYTES = 1 << 20  # order log size that triggers a new snapshot
+
+
+class MarketError(ValueError):
+    pass
+
+
+class Order:
+    __slots__ = ('id', 'side', 'item', 'price', 'qty', 'owner', 'lots', 'placed', 'open')
+
+    def __init__(self, id: int, side: str, item: str, price: int, qty: int, owner: str,
+                 lots: Optional[List[list]] = None, placed: float = 0.0):
+        self.id = id
+        self.side = side
+        self.item = item
+        self.price = price  # per unit
+        self.qty = qty      # still open
+        self.owner = owner
+        self.lots = lots    # sell orders: the escrowed [item, qty] pairs, sum(qty) == self.qty
+        self.placed = placed
+        self.open = True
+
+    def take(self, n: int) -> List[list]:
+        """Remove ``n`` units from a sell order's escrow."""
+        out = []
+        while n:
+            lot = self.lots[0]
+            k = min(n, lot[1])
+            out.append([lot[0], k])
+            lot[1] -= k
+            if not lot[1]:
+                self.lots.pop(0)
+            n -= k
+        return out
+
+
+class Trade(NamedTuple):
+    item: str
+    price: int
+    qty: int
+    buyer: str
+    seller: str
+    time: float
+
+
+class Book:
+    __slots__ = ('lock', 'bids', 'asks', 'history', 'volume')
+
+    def __init__(self, history: int):
+        self.lock = threading.Lock()
+        self.bids: List[tuple] = []  # (-price, order id, order)
+        self.asks: List[tuple] = []  # (price, order id, order)
+        self.history: deque = deque(maxlen=history)
+        self.volume = 0
+
+    @staticmethod
+    def _top(heap: List[tuple]) -> Optional[Order]:
+        while heap and not heap[0][2].open:
+            heapq.heappop(heap)
+        return heap[0][2] if heap else None
+
+    def best_bid(self) -> Optional[Order]:
+        return self._top(self.bids)
+
+    def best_ask(self) -> Optional[Order]:
+        return self._top(self.asks)
+
+
+class Market:
+    def __init__(self, history: int = HISTORY, clock: Callable[[], float] = time.time,
+                 compact_bytes: int = COMPACT_BYTES):
+        self.history = history
+        self.clock = clock
+        self.compact_bytes = compact_bytes
+        self.path: Optional[str] = None  # snapshot file; its order log is log_path(path)
+        self._books: Dict[str, Book] = {}
+        self._books_lock = threading.Lock()
+        self._orders: Dict[int, Order] = {}  # open orders by id
+        self._ids = itertools.count(1)
+        self._mail: Dict[str, list] = {}  # owner -> [gold, [[item, qty], ...]]
+        self._mail_lock = threading.Lock()  # always taken after a book lock, never before
+        # owner -> [[seq, gold, items taken, items given], ...]: their own changes their save doesn't have yet
+        self._unsettled: Dict[str, List[list]] = {}
+        self._seq = 0  # last change made
+        self._log_lock = threading.Lock()  # taken last, after the book and mail locks
+        self._log = None  # the order log, opened on the first change
+        self._log_bytes = 0  # its length, up to the last whole record
+        self._synced = 0  # changes up to this one are on disk
+        self._disk_lock = threading.Lock()  # one fsync or snapshot at a time
+        self.dirty = False
+
+    def book(self, item: str) -> Book:
+        b = self._books.get(item)
+        if b is None:
+            with self._books_lock:
+                b = self._books.get(item)
+                if b is None:
+                    b = self._books[item] = Book(self.history)
+        return b
+
+    def _pay(self, owner: str, gold: int = 0, lots: Optional[List[list]] = None):
+        with self._mail_lock:
+            box = self._mail.setdefault(owner, [0, []])
+            box[0] += gold
+            if lots:
+                box[1].extend(lots)
+
+    # -------------------------
+    # Orders
+    # -------------------------
+
+    @metrics.timed('market_sell')
+    def sell(self, owner: str, item: str, price: int, lots: List[list]) -> Tuple[Order, List[Trade]]:
+        """Offer the escrowed ``lots`` of ``item`` at ``price`` each."""
+        qty = sum(n for _, n in lots)
+        if price < 1 or qty < 1:
+            raise MarketError('price and quantity must be at least 1')
+        return self._place(Order(next(self._ids), SELL, item, price, qty, owner, [list(l) for l in lots]))
+
+    @metrics.timed('market_buy')
+    def buy(self, owner: str, item: str, price: int, qty: int) -> Tuple[Order, List[Trade]]:
+        """Bid for ``qty`` of ``item`` at up to ``price`` each; the caller has taken ``price * qty`` gold."""
+        if price < 1 or qty < 1:
+            raise MarketError('price and quantity must be at least 1')
+        return self._place(Order(next(self._ids), BUY, item, price, qty, owner))
+
+    def _place(self, order: Order, replay: bool = False) -> Tuple[Order, List[Trade]]:
+        b = self.book(order.item)
+        trades = []
+        with b.lock:
+            if not replay:
+                order.placed = self.clock()
+                rec = {'op': order.side, 'id': order.id, 'owner': order.owner, 'item': order.item,
+                       'price': order.price, 'placed': order.placed}
+                if order.side == BUY:
+                    rec['qty'] = order.qty
+                    effect = (-order.price * order.qty, [], [])
+                else:
+                    rec['lots'] = [[it.to_dict(), n] for it, n in order.lots]
+                    effect = (0, [list(l) for l in order.lots], [])
+            now = order.placed
+            if order.side == BUY:
+                while order.qty:
+                    rest = b.best_ask()
+                    if rest is None or rest.price > order.price:
+                        break
+                    k = min(order.qty, rest.qty)
+                    # the bid escrowed its own price; it gets the difference back
+                    self._pay(order.owner, (order.price - rest.price) * k, rest.take(k))
+                    self._pay(rest.owner, rest.price * k)
+                    trades.append(Trade(order.item, rest.price, k, order.owner, rest.owner, now))
+                    self._fill(b, rest, k)
+                    order.qty -= k
+            else:
+                while order.qty:
+                    rest = b.best_bid()
+                    if rest is None or rest.price < order.price:
+                        break
+                    k = min(order.qty, rest.qty)
+                    self._pay(rest.owner, 0, order.take(k))
+                    self._pay(order.owner, rest.price * k)
+                    trades.append(Trade(order.item, rest.price, k, rest.owner, order.owner, now))
+                    self._fill(b, rest, k)
+                    order.qty -= k
+            for t in trades:
+                b.history.append(t)
+                b.volume += t.qty
+            if order.qty:
+                heap = b.bids if order.side == BUY else b.asks
+                heapq.heappush(heap, (-order.price if order.side == BUY else order.price, order.id, order))
+                self._orders[order.id] = order
+            else:
+                order.open = False
+            if not replay:
+                self._record(rec, effect)  # still under the book lock: the log has each book's changes in order
+        self.dirty = True
+        metrics.count('market_orders_total')
+        if trades:
+            metrics.count('market_trades_total', len(trades))
+        return order, trades
+
+    def _fill(self, b: Book, rest: Order, k: int):
+        rest.qty -= k
+        if not rest.qty:
+            rest.open = False
+            self._orders.pop(rest.id, None)
+            b.best_ask() if rest.side == SELL else b.best_bid()  # drop it from the heap
+
+    def cancel(self, owner: str, order_id: int) -> bool:
+        """Cancel one of ``owner``'s open orders; what it still held goes back to their mailbox."""
+        order = self._orders.get(order_id)
+        if order is None or order.owner != owner:
+            return False
+        with self.book(order.item).lock:
+            if not order.open:
+                return False
+            self._cancel(order)
+            self._record({'op': 'cancel', 'owner': owner, 'id': order.id})
+        self.dirty = True
+        return True
+
+    def _cancel(self, order: Order):
+        order.open = False
+        self._orders.pop(order.id, None)
+        if order.side == BUY:
+            self._pay(order.owner, order.price * order.qty)
+        else:
+            self._pay(order.owner, 0, order.take(order.qty))
+
+    def orders(self, owner: str) -> List[Order]:
+        return sorted((o for o in list(self._orders.values()) if o.owner == owner), key=lambda o: o.id)
+
+    def collect(self, owner: str) -> Tuple[int, List[list]]:
+        """Empty ``owner``'s mailbox: (gold, [[item, qty], ...])."""
+        with self._mail_lock:
+            gold, lots = self._mail.pop(owner, (0, []))
+            if gold or lots:
+                self._record({'op': 'collect', 'owner': owner, 'gold': gold,
+                              'lots': [[it.to_dict(), n] for it, n in lots]}, (gold, [], [list(l) for l in lots]))
+        if gold or lots:
+            self.dirty = True
+        return gold, lots
+
+    # -------------------------
+    # Settling with the players' saves
+    # -------------------------
+
+    def unsettled(self, owner: str, after: int = 0) -> List[tuple]:
+        """``owner``'s own changes after change ``after`` that haven't been settled:
+        ``(seq, gold, items taken, items given)``, oldest first. Placing an order
+        takes its goods or gold from the player; collecting gives them back."""
+        with self._log_lock:
+            return [tuple(u) for u in self._unsettled.get(owner, ()) if u[0] > after]
+
+    def settle(self, owner: str, seq: int):
+        """The owner's save now has their changes up to ``seq``."""
+        with self._log_lock:
+            pending = self._unsettled.get(owner)
+            if not pending or pending[0][0] > seq:
+                return
+            self._settle(owner, seq)
+            self._record_locked({'op': 'settle', 'owner': owner, 'upto': seq})
+
+    def _settle(self, owner: str, seq: int):
+        rest = [u for u in self._unsettled.get(owner, ()) if u[0] > seq]
+        if rest:
+            self._unsettled[owner] = rest
+        else:
+            self._unsettled.pop(owner, None)
+
+    # -------------------------
+    # Quotes
+    # -------------------------
+
+    def quote(self, item: str) -> dict:
+        b = self.book(item)
+        with b.lock:
+            bid, ask = b.best_bid(), b.best_ask()
+            last = b.history[-1].price if b.history else None
+            return {'item': item, 'bid': bid and bid.price, 'ask': ask and ask.price, 'last': last,
+                    'volume': b.volume}
+
+    def items(self) -> List[str]:
+        with self._books_lock:
+            return sorted(self._books)
+
+    def trades(self, item: str, n: int = 20) -> List[Trade]:
+        """The last ``n`` trades of ``item``, newest last."""
+        b = self.book(item)
+        with b.lock:
+            return list(b.history)[-n:]
+
+    # -------------------------
+    # The order log
+    # -------------------------
+
+    def _record(self, rec: dict, effect: Optional[tuple] = None) -> int:
+        with self._log_lock:
+            return self._record_locked(rec, effect)
+
+    def _record_locked(self, rec: dict, effect: Optional[tuple] = None) -> int:
+        self._seq += 1
+        rec['seq'] = self._seq
+        if effect is not None:
+            self._unsettled.setdefault(rec['owner'], []).append([self._seq, *effect])
+        if self.path:
+            if self._log is None:
+                self._open_log()
+            line = (json.dumps(rec, separators=(',', ':')) + '\n').encode()
+            self._log.write(line)
+            self._log_bytes += len(line)
+        return self._seq
+
+    def _open_log(self):
+        path = log_path(self.path)
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self._log = open(path, 'ab')
+        if self._log.tell() != self._log_bytes:
+            self._log.truncate(self._log_bytes)  # a record torn by a crash
+
+    @property
+    def seq(self) -> int:
+        """The last change made to the market."""
+        return self._seq
+
+    def sync(self, seq: Optional[int] = None):
+        """Wait until change ``seq`` (default: every change so far) is on disk.
+
+        One fsync covers every change logged before it, so sessions that sync
+        at the same time share it (group commit). The log is folded into a new
+        snapshot once it passes ``compact_bytes``.
+        """
+        seq = self._seq if seq is None else seq
+        with self._disk_lock:
+            if self._synced < seq and self._log is not None:
+                with self._log_lock:
+                    self._log.flush()
+                    upto = self._seq
+                os.fsync(self._log.fileno())
+                self._synced = upto
+                metrics.count('market_log_syncs_total')
+            if self._log_bytes > self.compact_bytes:
+                self._save(self.path)
+
+    # -------------------------
+    # Persistence
+    # -------------------------
+
+    def to_dict(self) -> dict:
+        return self._snapshot()[0]
+
+    def _snapshot(self) -> Tuple[dict, int]:
+        """A consistent snapshot and the length of the log it covers."""
+        with self._books_lock:
+            books = sorted(self._books.items())
+        for _, b in books:  # every book, then the mailboxes, then the log
+            b.lock.acquire()
+        try:
+            with self._mail_lock, self._log_lock:
+                orders = sorted(self._orders.values(), key=lambda o: o.id)
+                return {
+                    'seq': self._seq,
+                    'next_id': max([o.id for o in orders], default=0) + 1,
+                    'orders': [{'id': o.id, 'side': o.side, 'item': o.item, 'price': o.price, 'qty': o.qty,
+                                'owner': o.owner, 'placed': o.placed,
+                                'lots': o.lots and [[it.to_dict(), n] for it, n in o.lots]} for o in orders],
+                    'history': {name: [list(t) for t in b.history] for name, b in books if b.history},
+                    'volume': {name: b.volume for name, b in books if b.volume},
+                    'mail': {owner: [gold, [[it.to_dict(), n] for it, n in lots]]
+                             for owner, (gold, lots) in self._mail.items()},
+                    'unsettled': {owner: [[seq, gold, [[it.to_dict(), n] for it, n in taken],
+                                           [[it.to_dict(), n] for it, n in given]]
+                                          for seq, gold, taken, given in pending]
+                                  for owner, pending in self._unsettled.items()},
+                }, self._log_bytes
+        finally:
+            for _, b in books:
+                b.lock.release()
+
+    @classmethod
+    def from_dict(cls, d: dict, item_from_dict: Callable[[dict], object], history: int = HISTORY) -> 'Market':
+        m = cls(history)
+        m._seq = m._synced = d.get('seq', 0)
+        m._ids = itertools.count(d.get('next_id', 1))
+        for o in d.get('orders', ()):
+            lots = o['lots'] and [[item_from_dict(it), n] for it, n in o['lots']]
+            order = Order(o['id'], o['side'], o['item'], o['price'], o['qty'], o['owner'], lots, o['placed'])
+            b = m.book(order.item)
+            heapq.heappush(b.bids if order.side == BUY else b.asks,
+                           (-order.price if order.side == BUY else order.price, order.id, order))
+            m._orders[order.id] = order
+        for name, trades in d.get('history', {}).items():
+            m.book(name).history.extend(Trade(*t) for t in trades)
+        for name, vol in d.get('volume', {}).items():
+            m.book(name).volume = vol
+        for owner, (gold, lots) in d.get('mail', {}).items():
+            m._mail[owner] = [gold, [[item_from_dict(it), n] for it, n in lots]]
+        for owner, pending in d.get('unsettled', {}).items():
+            m._unsettled[owner] = [[seq, gold, [[item_from_dict(it), n] for it, n in taken],
+                                    [[item_from_dict(it), n] for it, n in given]]
+                                   for seq, gold, taken, given in pending]
+        return m
+
+    def _replay(self, records: List[dict], item_from_dict: Callable[[dict], object]):
+        """Apply logged changes made after the snapshot.
+
+        Each book's changes are in the log in the order they happened, so
+        replaying them rebuilds the books. Changes to different books can be
+        logged in a different order than they reached the mailboxes, but fills
+        only ever add to a mailbox, so collections are taken out at the end.
+        """
+        collected = []
+        last_id = 0
+        for rec in records:
+            op, owner = rec['op'], rec['owner']
+            effect = None
+            if op in (BUY, SELL):
+                last_id = max(last_id, rec['id'])
+                if op == SELL:
+                    lots = [[item_from_dict(it), n] for it, n in rec['lots']]
+                    order = Order(rec['id'], SELL, rec['item'], rec['price'], sum(n for _, n in lots), owner,
+                                  lots, rec['placed'])
+                    effect = (0, [list(l) for l in lots], [])
+                else:
+                    order = Order(rec['id'], BUY, rec['item'], rec['price'], rec['qty'], owner,
+                                  placed=rec['placed'])
+                    effect = (-rec['price'] * rec['qty'], [], [])
+                self._place(order, replay=True)
+            elif op == 'cancel':
+                order = self._orders.get(rec['id'])
+                if order is not None:
+                    self._cancel(order)
+            elif op == 'collect':
+                lots = [[item_from_dict(it), n] for it, n in rec['lots']]
+                collected.append((owner, rec['gold'], lots))
+                effect = (rec['gold'], [], [list(l) for l in lots])
+            elif op == 'settle':
+                self._settle(owner, rec['upto'])
+            if effect is not None:
+                self._unsettled.setdefault(owner, []).append([rec['seq'], *effect])
+            self._seq = self._synced = rec['seq']
+        for owner, gold, lots in collected:
+            box = self._mail.get(owner)
+            if box is None:
+                continue
+            box[0] -= gold
+            for it, n in lots:
+                d = it.to_dict()
+                for lot in box[1]:
+                    if n and lot[0].to_dict() == d:
+                        k = min(n, lot[1])
+                        lot[1] -= k
+                        n -= k
+            box[1] = [lot for lot in box[1] if lot[1]]
+            if not box[0] and not box[1]:
+                del self._mail[owner]
+        if last_id:
+            nxt = next(self._ids)
+            self._ids = itertools.count(max(nxt, last_id + 1))
+
+    def save(self, path: Optional[str] = None):
+        """Write a snapshot (to the market's own file by default) and drop the log it covers."""
+        with self._disk_lock:
+            self._save(path or self.path)
+
+    def _save(self, path: str):
+        self.dirty = False  # changes made while saving set it again
+        d, covered = self._snapshot()
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        saveformat.atomic_write(path, json.dumps(d).encode())
+        if path != self.path or self._log is None:
+            return
+        with self._log_lock:
+            # keep the records logged while the snapshot was being written
+            self._log.flush()
+            lp = log_path(path)
+            with open(lp, 'rb') as f:
+                f.seek(covered)
+                tail = f.read(self._log_bytes - covered)
+            self._log.close()
+            saveformat.atomic_write(lp, tail)
+            self._log = open(lp, 'ab')
+            self._log_bytes = len(tail)
+            self._synced = self._seq  # atomic_write synced the tail
+        metrics.count('market_compactions_total')
+
+    @classmethod
+    def load(cls, path: str, item_from_dict: Callable[[dict], object]) -> 'Market':
+        """The market saved at ``path`` plus its order log (empty if there are neither).
+
+        Later changes are logged next to ``path``; nothing is written until the first one.
+        """
+        try:
+            with open(path, 'r') as f:
+                m = cls.from_dict(json.load(f), item_from_dict)
+        except FileNotFoundError:
+            m = cls()
+        records, m._log_bytes = read_log(log_path(path))
+        m._replay([r for r in records if r['seq'] > m._seq], item_from_dict)
+        m.path = path
+        return m
+
+
+def log_path(path: str) -> str:
+    """The order log next to the snapshot at ``path``."""
+    return os.path.splitext(path)[0] + '.log'
+
+
+def read_log(path: str) -> Tuple[List[dict], int]:
+    """The records in an order log and the length up to the last whole one."""
+    records, good = [], 0
+    try:
+        f = open(path, 'rb')
+    except FileNotFoundError:
+        return records, good
+    with f:
+        for line in f:
+            if not line.endswith(b'\n'):
+                break  # torn by a crash; the next write cuts it off
+            good += len(line)
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                continue
+    return records, good
@@ -0,0 +1,169 @@
+"""Optional counters and latency histograms for the game's hot paths.
+
+Functions are marked with ``@timed('name')``, which returns them unchanged.
+While metrics are off there is no wrapper to call at all. ``enable()`` swaps
+timing wrappers into the modules/classes that define them and ``enable(False)``
+swaps the originals back. Code that can't be wrapped as a whole (a combat
+round, bytes written) uses ``clock()``/``observe()`` and ``count()``, which
+return straight away while metrics are off.
+
+``snapshot()`` returns everything as a dict; ``to_json()`` and
+``to_prometheus()`` render it for a scraper (see ``write()``).
+"""
+import bisect
+import json
+import os
+import sys
+import threading
+import time
+from typing import Callable, Dict, List
+
+PREFIX = 'pyrealm_'
+# histogram bucket upper bounds, seconds
+BUCKETS = (1e-6, 5e-6, 1e-5, 5e-5, 1e-4, 5e-4, 1e-3, 5e-3, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 30.0)
+
+enabled = False
+_lock = threading.Lock()
+_counters: Dict[str, float] = {}
+_hists: Dict[str, 'Histogram'] = {}
+_timed: List[tuple] = []  # (original function, wrapper)
+
+
+class Histogram:
+    __slots__ = ('buckets', 'count', 'sum')
+
+    def __init__(self):
+        self.buckets = [0] * (len(BUCKETS) + 1)  # last one is +Inf
+        self.count = 0
+        self.sum = 0.0
+
+    def add(self, seconds: float):
+        self.buckets[bisect.bisect_left(BUCKETS, seconds)] += 1
+        self.count += 1
+        self.sum += seconds
+
+
+# -------------------------
+# Recording
+# -------------------------
+
+def count(name: str, n: float = 1):
+    if not enabled:
+        return
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + n
+
+
+def clock() -> float:
+    """Start time for observe(); 0.0 while metrics are off."""
+    return time.perf_counter() if enabled else 0.0
+
+
+def observe(name: str, start: float):
+    """Record the time since ``start`` (from clock()) in histogram ``name``."""
+    if not start or not enabled:
+        return
+    took = time.perf_counter() - start
+    with _lock:
+        h = _hists.get(name)
+        if h is None:
+            h = _hists[name] = Histogram()
+        h.add(took)
+
+
+def timed(name: str) -> Callable:
+    """Mark a module-level function or a method to be timed as ``<name>_seconds`` when metrics are on."""
+    def mark(fn):
+        hist = name + '_seconds'
+
+        def wrapper(*args, **kw):
+            t = time.perf_counter()
+            try:
+                return fn(*args, **kw)
+            finally:
+                observe(hist, t)
+
+        wrapper.__wrapped__ = fn
+        wrapper.__name__ = fn.__name__
+        wrapper.__qualname__ = fn.__qualname__
+        wrapper.__doc__ = fn.__doc__
+        _timed.append((fn, wrapper))
+        return fn
+    return mark
+
+
+def _install(fn, obj):
+    owner = sys.modules[fn.__module__]
+    *path, attr = fn.__qualname__.split('.')
+    for part in path:
+        owner = getattr(owner, part)
+    setattr(owner, attr, obj)
+
+
+def enable(on: bool = True):
+    global enabled
+    with _lock:
+        if on == enabled:
+            return
+        for fn, wrapper in _timed:
+            _install(fn, wrapper if on else fn)
+        enabled = on
+
+
+def reset():
+    with _lock:
+        _counters.clear()
+        _hists.clear()
+
+
+# -------------------------
+# Export
+# -------------------------
+
+def snapshot() -> dict:
+    with _lock:
+        return {
+            'enabled': enabled,
+            'counters': dict(_counters),
+            'histograms': {name: {'count': h.count, 'sum': h.sum,
+                                  'buckets': dict(zip([*map(str, BUCKETS), '+Inf'], h.buckets))}
+                           for name, h in _hists.items()},
+        }
+
+
+def to_json() -> str:
+    return json.dumps(snapshot(), indent=2, sort_keys=True)
+
+
+def to_prometheus() -> str:
+    snap = snapshot()
+    lines = []
+    for name, value in sorted(snap['counters'].items()):
+        lines += [f'# TYPE {PREFIX}{name} counter', f'{PREFIX}{name} {value:g}']
+    for name, h in sorted(snap['histograms'].items()):
+        lines.append(f'# TYPE {PREFIX}{name} histogram')
+        cumulative = 0
+        for le, n in h['buckets'].items():
+            cumulative += n
+            lines.append(f'{PREFIX}{name}_bucket{{le="{le}"}} {cumulative}')
+        lines += [f'{PREFIX}{name}_sum {h["sum"]:.9g}', f'{PREFIX}{name}_count {h["count"]}']
+    return '\n'.join(lines) + '\n'
+
+
+def write(path: str, fmt: str = 'prometheus'):
+    """Atomically write the metrics to ``path`` (e.g. for node_exporter's textfile collector)."""
+    text = to_json() if fmt == 'json' else to_prometheus()
+    tmp = path + '.tmp'
+    with open(tmp, 'w') as f:
+        f.write(text)
+    os.replace(tmp, path)
+
+
+def summary() -> List[str]:
+    """Human-readable lines for the in-game metrics screen."""
+    snap = snapshot()
+    out = [f"{name}: {value:g}" for name, value in sorted(snap['counters'].items())]
+    for name, h in sorted(snap['histograms'].items()):
+        avg = h['sum'] / h['count'] if h['count'] else 0.0
+        out.append(f"{name}: {h['count']} calls, avg {avg * 1000:.3f} ms, total {h['sum'] * 1000:.1f} ms")
+    return out
@@ -0,0 +1,222 @@
+"""Validate every save under a directory and migrate it to the current schema.
+
+    python migrate_saves.py game_saves               # migrate in place, one worker per CPU
+    python migrate_saves.py game_saves --check       # validate only, write nothing
+    python migrate_saves.py game_saves -j 8 --report problems.jsonl
+
+Saves (``save_slot_*.json`` / ``*.sav``, including the account directories)
+are found with a streaming directory walk and handed to a process pool a
+bounded window at a time, so neither the file list nor the saves are ever all
+in memory. Each worker reads one save, migrates it with ``schema.migrate``,
+validates it and, if it changed, rewrites it atomically in the same format.
+Files that can't be decoded are reported as ``corrupt`` (what the slot list
+shows as ``<corrupt>``); files that decode but fail validation are ``invalid``.
+Neither is ever rewritten.
+
+Progress is appended to a state file in the directory as files finish. An
+interrupted run picks up where it left off, skipping files that haven't
+changed since they were done. The state file is removed after a complete run.
+"""
+import argparse
+import concurrent.futures
+import json
+import os
+import re
+import sys
+from typing import Dict, Iterator, Optional, Tuple
+
+import journal
+import saveformat
+import schema
+
+SAVE_RE = re.compile(r'^save_slot_(\d+)\.(json|sav)$')
+STATE_FILE = '.migrate_state'
+STATUSES = ('ok', 'migrated', 'corrupt', 'invalid')
+
+
+def iter_saves(root: str) -> Iterator[str]:
+    stack = [root]
+    while stack:
+        d = stack.pop()
+        try:
+            it = os.scandir(d)
+        except OSError:
+            continue
+        with it:
+            subdirs = []
+            for e in it:
+                if e.is_dir(follow_symlinks=False):
+                    subdirs.append(e.path)
+                elif SAVE_RE.match(e.name):
+                    yield e.path
+        stack.extend(sorted(subdirs, reverse=True))
+
+
+def owner_of(root: str, path: str) -> Tuple[str, int]:
+    """(account, slot) of a save found under ``root``; root-level saves belong to account ''."""
+    d, name = os.path.split(path)
+    # <root>/accounts/<name>/ is the server's per-account directory
+    rel = os.path.relpath(d, root)
+    account = '' if rel == '.' else os.path.relpath(rel, 'accounts') if rel.startswith('accounts' + os.sep) else rel
+    return account, int(SAVE_RE.match(name).group(1))
+
+
+def read_save(path: str) -> dict:
+    """A save file as a current-schema document with its journal applied; raises if it can't be read."""
+    with open(path, 'rb') as f:
+        raw = f.read()
+    data = schema.migrate(saveformat.decode(raw) if saveformat.is_binary(raw) else json.loads(raw))
+    _, slot = owner_of(os.path.dirname(path), path)
+    journal.replay(data, os.path.join(os.path.dirname(path), f'save_slot_{slot}.journal'))
+    return data
+
+
+def process(path: str, check_only: bool) -> Tuple[str, str, str, Optional[int], Optional[int]]:
+    """Migrate/validate one save: (path, status, detail, size, mtime_ns) -- runs in a worker."""
+    try:
+        with open(path, 'rb') as f:
+            raw = f.read()
+        binary = saveformat.is_binary(raw)
+        if binary:
+            data = saveformat.decode(raw)
+            stale = saveformat.version_of(raw) < saveformat.VERSION
+        else:
+            data = json.loads(raw)
+            stale = False
+        if not isinstance(data, dict):
+            raise ValueError('not a save document')
+        before = schema.version_of(data)
+        data = schema.migrate(data)
+    except Exception as exc:
+        return path, 'corrupt', f'{type(exc).__name__}: {exc}', None, None
+    errors = schema.validate(data)
+    if errors:
+        return path, 'invalid', '; '.join(errors[:5]) + (f' (+{len(errors) - 5} more)' if len(errors) > 5 else ''), \
+            None, None
+    status, detail = 'ok', ''
+    if before < schema.CURRENT or stale:
+        detail = f'schema {before} -> {schema.CURRENT}' if before < schema.CURRENT else 'binary format upgrade'
+        if check_only:
+            status = 'needs migration'
+        else:
+            new = saveformat.encode(data) if binary else json.dumps(data, indent=2).encode()
+            saveformat.atomic_write(path, new)
+            status = 'migrated'
+    st = os.stat(path)
+    return path, status, detail, st.st_size, st.st_mtime_ns
+
+
+class State:
+    """Append-only record of finished files, so an interrupted run can resume."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.done: Dict[str, tuple] = {}
+        self.counts = dict.fromkeys(STATUSES, 0)
+        try:
+            with open(path, 'r') as f:
+                header = f.readline()
+                if header.endswith('\n') and json.loads(header).get('schema') == schema.CURRENT:
+                    for line in f:
+                        if not line.endswith('\n'):
+                            break  # torn last line from the interruption
+                        rec = json.loads(line)
+                        if rec['size'] is None:
+                            continue  # corrupt/invalid: check (and report) it again
+                        self.done[rec['path']] = (rec['size'], rec['mtime'])
+                        self.counts[rec['status']] += 1
+        except FileNotFoundError:
+            pass
+        except ValueError:
+            self.done.clear()
+            self.counts = dict.fromkeys(STATUSES, 0)
+        self.resumed = len(self.done)
+        fresh = not self.done
+        self._f = open(path, 'w' if fresh else 'a')
+        if fresh:
+            self._f.write(json.dumps({'schema': schema.CURRENT}) + '\n')
+
+    def finished(self, path: str) -> bool:
+        prev = self.done.get(path)
+        if prev is None:
+            return False
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            return True
+        return prev == (st.st_size, st.st_mtime_ns)
+
+    def record(self, path: str, status: str, size: Optional[int], mtime: Optional[int]):
+        self._f.write(json.dumps({'path': path, 'status': status, 'size': size, 'mtime': mtime}) + '\n')
+        self._f.flush()
+        self.counts[status] += 1
+
+    def close(self, complete: bool):
+        self._f.close()
+        if complete:
+            os.remove(self.path)
+
+
+def run(root: str, workers: Optional[int] = None, check_only: bool = False, report=None, out=sys.stdout) -> dict:
+    counts = dict.fromkeys(STATUSES, 0)
+    counts['needs migration'] = 0
+    state = None if check_only else State(os.path.join(root, STATE_FILE))
+    if state and state.resumed:
+        print(f'resuming: {state.resumed} files already done', file=out)
+    window = (workers or os.cpu_count() or 1) * 8
+    complete = False
+    try:
+        with concurrent.futures.ProcessPoolExecutor(workers) as pool:
+            pending = set()
+
+            def drain(wait_all: bool):
+                nonlocal pending
+                if not pending:
+                    return
+                done, pending = concurrent.futures.wait(
+                    pending, return_when=concurrent.futures.ALL_COMPLETED if wait_all else concurrent.futures.FIRST_COMPLETED)
+                for fut in done:
+                    path, status, detail, size, mtime = fut.result()
+                    counts[status] += 1
+                    if status != 'ok':
+                        print(f'{status:>15}  {path}  {detail}', file=out)
+                    if report is not None and status in ('corrupt', 'invalid', 'needs migration'):
+                        report.write(json.dumps({'path': path, 'status': status, 'detail': detail}) + '\n')
+                    if state and status != 'needs migration':
+                        state.record(path, status, size, mtime)
+
+            for path in iter_saves(root):
+                if state and state.finished(path):
+                    continue
+                pending.add(pool.submit(process, path, check_only))
+                if len(pending) >= window:
+                    drain(False)
+            drain(True)
+        complete = True
+    finally:
+        if state:
+            state.close(complete)
+    if state:
+        counts.update(state.counts)  # includes files finished by earlier, interrupted runs
+    return counts
+
+
+def cli(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument('root', nargs='?', default='game_saves')
+    ap.add_argument('-j', '--workers', type=int, default=None, help='worker processes (default: one per CPU)')
+    ap.add_argument('--check', action='store_true', help='only validate; report what would be migrated')
+    ap.add_argument('--report', metavar='FILE', help='also write corrupt/invalid files to FILE as JSON lines')
+    args = ap.parse_args(argv)
+    report = open(args.report, 'w') if args.report else None
+    try:
+        counts = run(args.root, args.workers, args.check, report)
+    finally:
+        if report:
+            report.close()
+    print(', '.join(f'{n} {status}' for status, n in counts.items() if n or status == 'ok'))
+    return 1 if counts['corrupt'] or counts['invalid'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(cli())
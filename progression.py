@@ -0,0 +1,65 @@
+"""Level progression: the EXP curve and per-class stat growth.
+
+Going from level L to L+1 costs ``base + (L - 1) * step`` EXP. ``ExpCurve``
+keeps the cumulative EXP needed to reach each of the first ``table_size``
+levels, so finding the level for a total is a bisect. Totals past the table
+are solved in closed form (the costs are an arithmetic series). Either way,
+a grant of any size is applied in one step, not one level at a time.
+
+``StatCurve`` gives a class's derived stats at a level: its level-1 values
+plus a fixed growth per level.
+"""
+import bisect
+import math
+from typing import Dict, List, Tuple
+
+TABLE_SIZE = 10_000
+
+
+class ExpCurve:
+    def __init__(self, base: int = 50, step: int = 20, table_size: int = TABLE_SIZE):
+        if base < 1 or step < 0:
+            raise ValueError('a level must cost at least 1 EXP')
+        self.base = base
+        self.step = step
+        # _total[i]: EXP from level 1 (and 0 EXP) to level i + 1
+        self._total: List[int] = [self.total(level) for level in range(1, table_size + 1)]
+
+    def needed(self, level: int) -> int:
+        """EXP to go from ``level`` to the next one."""
+        return self.base + (level - 1) * self.step
+
+    def total(self, level: int) -> int:
+        """EXP from level 1 to ``level``."""
+        n = level - 1
+        return n * self.base + self.step * n * (n - 1) // 2
+
+    def level_at(self, total: int) -> int:
+        """The level a player with ``total`` EXP since level 1 is at."""
+        if total < self._total[-1]:
+            return bisect.bisect_right(self._total, total)
+        if not self.step:
+            return total // self.base + 1
+        # largest n with n*base + step*n*(n-1)/2 <= total
+        b = 2 * self.base - self.step
+        n = (math.isqrt(b * b + 8 * self.step * total) - b) // (2 * self.step)
+        while self.total(n + 2) <= total:
+            n += 1
+        while self.total(n + 1) > total:
+            n -= 1
+        return n + 1
+
+    def advance(self, level: int, exp: int) -> Tuple[int, int]:
+        """(level, EXP into that level) after holding ``exp`` EXP at ``level``."""
+        total = self.total(level) + exp
+        new = self.level_at(total)
+        return new, total - self.total(new)
+
+
+class StatCurve:
+    def __init__(self, base: Dict[str, int], growth: Dict[str, int]):
+        self.base = base      # stats at level 1
+        self.growth = growth  # added per level after the first
+
+    def at(self, level: int) -> Dict[str, int]:
+        return {stat: v + self.growth.get(stat, 0) * (level - 1) for stat, v in self.base.items()}
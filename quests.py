@@ -0,0 +1,127 @@
+"""Event-driven quests.
+
+The game reports what happens as events, each with a target:
+
+    kill   enemy name     an enemy or boss was defeated
+    gain   item name      items were added to the inventory (n = quantity)
+    enter  location       the player arrived somewhere
+    craft  recipe name    something was crafted (n = how many)
+
+A quest is a list of objectives, each ``(event, target, count)``. A target of
+``'*'`` matches any target. Every player has a ``QuestLog`` that indexes its
+unfinished objectives by ``(event, target)``. ``emit()`` looks up that key
+(plus the wildcard) and touches only the objectives listed there, however
+many quests the player has. When a quest's last objective is done it is
+removed from the log and returned, so the caller can pay the reward.
+
+Quest definitions are plain dicts (see ``QuestDef.from_dict``). A save
+stores the ids of active quests with their progress, and how many times each
+quest has been completed.
+"""
+from typing import Dict, Iterable, List, NamedTuple, Tuple
+
+EVENTS = ('kill', 'gain', 'enter', 'craft')
+ANY = '*'
+
+
+class Objective(NamedTuple):
+    event: str
+    target: str
+    count: int = 1
+
+
+class QuestDef(NamedTuple):
+    id: str
+    desc: str
+    objectives: Tuple[Objective, ...]
+    reward: int = 0      # gold
+    reward_exp: int = 0
+
+    @staticmethod
+    def from_dict(d: dict) -> 'QuestDef':
+        objectives = tuple(Objective(*o) for o in d['objectives'])
+        for o in objectives:
+            if o.event not in EVENTS:
+                raise ValueError(f"quest {d['id']!r}: unknown event {o.event!r}")
+        return QuestDef(d['id'], d['desc'], objectives, d.get('reward', 0), d.get('reward_exp', 0))
+
+
+class QuestLog:
+    def __init__(self, defs: Dict[str, QuestDef]):
+        self.defs = defs
+        self.active: Dict[str, List[int]] = {}  # quest id -> progress per objective
+        self.completed: Dict[str, int] = {}     # quest id -> times completed
+        self._index: Dict[Tuple[str, str], Dict[Tuple[str, int], None]] = {}
+
+    def _subscribe(self, qid: str, i: int):
+        o = self.defs[qid].objectives[i]
+        self._index.setdefault((o.event, o.target), {})[(qid, i)] = None
+
+    def _unsubscribe(self, qid: str, i: int):
+        o = self.defs[qid].objectives[i]
+        key = (o.event, o.target)
+        subs = self._index.get(key)
+        if subs is not None:
+            subs.pop((qid, i), None)
+            if not subs:
+                del self._index[key]
+
+    def accept(self, qid: str) -> bool:
+        """Start quest ``qid``; False if it is already active."""
+        if qid in self.active:
+            return False
+        q = self.defs[qid]
+        self.active[qid] = [0] * len(q.objectives)
+        for i in range(len(q.objectives)):
+            self._subscribe(qid, i)
+        return True
+
+    def abandon(self, qid: str) -> bool:
+        progress = self.active.pop(qid, None)
+        if progress is None:
+            return False
+        for i, n in enumerate(progress):
+            if n < self.defs[qid].objectives[i].count:
+                self._unsubscribe(qid, i)
+        return True
+
+    def emit(self, event: str, target: str, n: int = 1) -> List[QuestDef]:
+        """Record an event; returns the quests it completed."""
+        subs = list(self._index.get((event, target), ()))
+        if target != ANY:
+            subs += self._index.get((event, ANY), ())
+        done = []
+        for qid, i in subs:
+            progress = self.active[qid]
+            need = self.defs[qid].objectives[i].count
+            progress[i] = min(need, progress[i] + n)
+            if progress[i] >= need:
+                self._unsubscribe(qid, i)
+                if all(p >= o.count for p, o in zip(progress, self.defs[qid].objectives)):
+                    del self.active[qid]
+                    self.completed[qid] = self.completed.get(qid, 0) + 1
+                    done.append(self.defs[qid])
+        return done
+
+    def describe(self) -> Iterable[str]:
+        for qid, progress in self.active.items():
+            q = self.defs[qid]
+            steps = ', '.join(f'{o.event} {o.target}: {p}/{o.count}' for p, o in zip(progress, q.objectives))
+            yield f'{q.desc} [{steps}] | Reward: {q.reward} gold'
+
+    def to_dict(self) -> dict:
+        return {'active': {qid: list(p) for qid, p in self.active.items()}, 'completed': dict(self.completed)}
+
+    @staticmethod
+    def from_dict(d: dict, defs: Dict[str, QuestDef]) -> 'QuestLog':
+        log = QuestLog(defs)
+        log.completed = dict(d.get('completed', {}))
+        for qid, progress in d.get('active', {}).items():
+            q = defs.get(qid)
+            if q is None or len(progress) != len(q.objectives):
+                continue  # the quest was removed or changed since this save
+            log.active[qid] = list(progress)
+            for i, (p, o) in enumerate(zip(progress, q.objectives)):
+                if p < o.count:
+                    log._subscribe(qid, i)
+        return log
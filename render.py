@@ -0,0 +1,100 @@
+"""Screen frames: a menu is built as a list of lines and sent in one write.
+
+    with frame('in_game_menu') as f:
+        f.line('1) Travel')
+        f.line('2) Explore / Encounter')
+
+One ``write()`` per screen instead of one per line means one packet for a
+remote session.
+
+I/O objects that set ``diff_frames = True`` drive an ANSI terminal. A frame
+with a key (the in-game menu) is pinned to the top of the screen, and everything else (messages,
+prompts) scrolls in the region below it. Showing the same frame again
+rewrites only the lines that changed, in place, so a repeated menu costs
+just its status line. The options stay on screen above the prompt. A
+different frame, or one with a different number of lines, is drawn whole.
+``release()`` gives the terminal its normal scrolling back.
+
+``paginate()`` shows a long listing a page at a time. Rows come from an
+iterator and are only formatted as their page is shown, so a
+hundred-thousand-item inventory costs one page of work, not the whole list.
+"""
+import contextlib
+import itertools
+import weakref
+from typing import Iterable, Iterator, List, Optional
+
+import metrics
+from gameio import ask, current_io
+
+PAGE_SIZE = 20
+CSI = '\x1b['
+SAVE_CURSOR, RESTORE_CURSOR = '\x1b7', '\x1b8'
+
+# io -> (key, lines) of the frame pinned at the top of its screen
+_pinned: 'weakref.WeakKeyDictionary' = weakref.WeakKeyDictionary()
+
+
+def _repaint(io, key: str, lines: List[str]) -> str:
+    prev = _pinned.get(io)
+    try:
+        _pinned[io] = (key, lines)
+    except TypeError:  # can't be weakly referenced; every frame is drawn whole
+        prev = None
+    if prev is not None and prev[0] == key and len(prev[1]) == len(lines):
+        changed = [(row, new) for row, (old, new) in enumerate(zip(prev[1], lines), start=1) if new != old]
+        metrics.count('render_lines_skipped_total', len(lines) - len(changed))
+        if not changed:
+            return ''
+        # jump to each changed row and back to where the prompt is
+        return SAVE_CURSOR + ''.join(f'{CSI}{row};1H{CSI}2K{new}' for row, new in changed) + RESTORE_CURSOR
+    # clear, draw the frame on the top rows, scroll only the rows below it
+    n = len(lines)
+    return f'{CSI}r{CSI}2J{CSI}H' + '\n'.join(lines) + f'{CSI}{n + 1}r{CSI}{n + 1};1H'
+
+
+def release(io):
+    """Unpin the frame and restore normal scrolling on ``io``'s terminal."""
+    if _pinned.pop(io, None) is not None:
+        io.write(f'{CSI}r')
+
+
+class Frame:
+    def __init__(self, key: Optional[str] = None):
+        self.key = key
+        self.lines: List[str] = []
+
+    def line(self, text: str = ''):
+        self.lines.extend(str(text).split('\n'))
+
+    def show(self):
+        io = current_io()
+        if self.key is not None and getattr(io, 'diff_frames', False):
+            text = _repaint(io, self.key, self.lines)
+        else:
+            text = '\n'.join(self.lines) + '\n'
+        if text:
+            io.write(text)
+            metrics.count('render_frames_total')
+
+
+@contextlib.contextmanager
+def frame(key: Optional[str] = None) -> Iterator[Frame]:
+    """Collect a screen's lines and send them when the block ends."""
+    f = Frame(key)
+    yield f
+    f.show()
+
+
+def paginate(rows: Iterable[str], total: int, title: Optional[str] = None, page_size: int = PAGE_SIZE):
+    """Show ``total`` rows a page at a time, asking before each next page."""
+    rows = iter(rows)
+    pages = max(1, -(-total // page_size))
+    for page in range(1, pages + 1):
+        with frame() as f:
+            if title is not None and page == 1:
+                f.line(title)
+            for row in itertools.islice(rows, page_size):
+                f.line(row)
+        if page < pages and ask(f'-- page {page}/{pages}: Enter for more, q to stop: ').strip().lower() == 'q':
+            return
@@ -0,0 +1,181 @@
+"""Headless replay of recorded sessions (see session.py).
+
+    python replay.py game_saves/sessions/20261017-101500-1f2e....plog
+    python replay.py LOG --seek 120      # state after the player's 120th input
+    python replay.py LOG --info
+    python replay.py LOG --show          # also print the game's output
+
+Replays feed the logged inputs back into the game with the session's seed, no
+terminal and no delays. Every random draw is checked against the log, so a
+replay that drifts from the original session fails loudly instead of quietly
+showing something else. Seeking starts from the nearest checkpoint at or before
+the target instead of from the beginning. Saves made during a replay go to a
+scratch directory.
+
+The market and the generated frontier are shared with other sessions and are
+not in the log, only the fact that the session read them. A replay that covers
+such a read raises UsedSharedState (replay.py exits) unless it is forced, since
+what it shows may differ from what the player saw.
+"""
+import argparse
+import bisect
+import json
+import sys
+import tempfile
+import time
+from typing import Optional
+
+import main
+from gameio import SessionClosed, use_io
+from session import SessionLog, SessionRandom, read_log, use_rng
+
+
+class EndOfLog(SessionClosed):
+    """The replay has used up the inputs it was asked to replay."""
+
+
+class ReplayDiverged(Exception):
+    pass
+
+
+class UsedSharedState(Exception):
+    """The replayed inputs read state other sessions could change (the market, the frontier)."""
+
+
+class ScriptIO:
+    def __init__(self, inputs, start: int, stop: int, echo=None):
+        self.inputs = inputs
+        self.pos = start
+        self.stop = stop
+        self.echo = echo
+
+    def write(self, text: str):
+        if self.echo is not None:
+            self.echo.write(text)
+
+    def read(self, prompt: str) -> str:
+        if self.pos >= self.stop:
+            raise EndOfLog()
+        text = self.inputs[self.pos]
+        self.pos += 1
+        if self.echo is not None:
+            self.echo.write(prompt + text + '\n')
+        return text
+
+
+class Replayer:
+    def __init__(self, log: SessionLog, verify: bool = True, scratch_dir: Optional[str] = None, echo=None,
+                 allow_shared: bool = False):
+        self.log = log
+        self.verify = verify
+        self.allow_shared = allow_shared
+        self.echo = echo
+        self._scratch = scratch_dir
+        self._marks = [cp.inputs for cp in log.checkpoints]
+        self._draw = 0
+        self._io: Optional[ScriptIO] = None
+
+    @classmethod
+    def open(cls, path: str, **kw) -> 'Replayer':
+        return cls(read_log(path), **kw)
+
+    def scratch_dir(self) -> str:
+        if self._scratch is None:
+            self._scratch = tempfile.mkdtemp(prefix='pyrealm-replay-')
+        return self._scratch
+
+    def _check(self, kind: int, *values: int):
+        i = self._draw
+        self._draw += 1
+        if i < len(self.log.draws) and self.log.draws[i] != (kind, *values):
+            raise ReplayDiverged(f'random draw {i} (input {self._io.pos}) was {(kind, *values)}, '
+                                 f'the log has {self.log.draws[i]}')
+
+    def _play(self, cp, stop: int):
+        """Run play_game from checkpoint ``cp`` until it returns or ``stop`` inputs are used."""
+        r = SessionRandom(self.log.seed, self._check if self.verify else None)
+        r.setstate(cp.rng_state)
+        self._draw = cp.draws
+        self._io = ScriptIO(self.log.inputs, cp.inputs, stop, self.echo)
+        player = main.Player.from_dict(cp.player)
+        token = main.SAVE_DIR.set(self.scratch_dir())
+        try:
+            with use_io(self._io), use_rng(r):
+                main.play_game(player)
+        except EndOfLog:
+            pass
+        except ReplayDiverged:
+            self._check_shared(cp.inputs, self._io.pos)  # the likely cause
+            raise
+        finally:
+            main.SAVE_DIR.reset(token)
+        self._check_shared(cp.inputs, self._io.pos)
+        return player, self._io.pos
+
+    def _check_shared(self, start: int, stop: int):
+        # reads at the checkpoint itself (loading a game) are already in its player
+        used = sorted({what for at, what in self.log.shared if start < at <= stop})
+        if used and not self.allow_shared:
+            raise UsedSharedState(f"inputs {start + 1}-{stop} read shared state ({', '.join(used)}) "
+                                  f"that the log doesn't have")
+
+    def seek(self, n: int):
+        """The player as it was after the session's first ``n`` inputs (None before any game began)."""
+        n = min(n, len(self.log.inputs))
+        i = bisect.bisect_right(self._marks, n) - 1
+        if i < 0:
+            return None
+        player, pos = self._play(self.log.checkpoints[i], n)
+        # play_game returned (back to the main menu): skip to the next game in the session
+        while pos < n:
+            i = bisect.bisect_left(self._marks, pos, i + 1)
+            if i == len(self._marks) or self._marks[i] > n:
+                break
+            player, pos = self._play(self.log.checkpoints[i], n)
+        return player
+
+    def run(self):
+        """Replay the whole session; returns the final player."""
+        return self.seek(len(self.log.inputs))
+
+
+def cli(argv=None):
+    ap = argparse.ArgumentParser(description='Replay a recorded PyRealm session')
+    ap.add_argument('log')
+    ap.add_argument('--seek', type=int, help='stop after this many inputs')
+    ap.add_argument('--info', action='store_true', help='describe the log and exit')
+    ap.add_argument('--show', action='store_true', help="print the game's output while replaying")
+    ap.add_argument('--no-verify', action='store_true', help="don't check random draws against the log")
+    ap.add_argument('--force', action='store_true',
+                    help='replay even where the session read the market or the frontier')
+    args = ap.parse_args(argv)
+    log = read_log(args.log)
+    print(f'seed {log.seed:016x}: {len(log.inputs)} inputs, {len(log.draws)} random draws, '
+          f'{len(log.checkpoints)} checkpoints{" (log ends mid-record)" if log.torn else ""}')
+    if args.info:
+        for cp in log.checkpoints:
+            print(f"  checkpoint at input {cp.inputs}: {cp.player['name']} level {cp.player['level']} "
+                  f"in {cp.player['location']}")
+        for at, what in log.shared:
+            print(f'  read the {what} after input {at}')
+        return
+    # keep the world state of replays out of the real save directory
+    main.DATA_DIR = tempfile.mkdtemp(prefix='pyrealm-replay-')
+    main.AUTOSAVE = False
+    rep = Replayer(log, verify=not args.no_verify, scratch_dir=main.DATA_DIR,
+                   echo=sys.stdout if args.show else None, allow_shared=args.force)
+    t = time.perf_counter()
+    try:
+        player = rep.run() if args.seek is None else rep.seek(args.seek)
+    except UsedSharedState as e:
+        sys.exit(f'{e}; the replay may not match the session (--force replays it anyway)')
+    took = time.perf_counter() - t
+    if player is None:
+        print('no game had started by then')
+        return
+    print(json.dumps(player.to_dict(), indent=2))
+    print(f'replayed in {took * 1000:.1f} ms')
+
+
+if __name__ == '__main__':
+    cli()
@@ -0,0 +1,177 @@
+"""Compact binary save format.
+
+Layout (little endian)::
+
+    header   MAGIC(4) version:u16 flags:u16 crc32:u32 length:u32
+    payload  meta     u32 length + utf-8 JSON (schema, timestamp, player fields without items)
+             strings  u32 count, then u16 length + utf-8 for each
+             items    u32 count, then name:u32 type:u32 power:i32 value:i32 (string indices)
+             equip    weapon:i32 armor:i32 (item index, -1 when empty)
+             inv      u32 count, then (item index:u32, qty:u32) per stack
+
+Every item template is stored once in the item table and the inventory is a
+list of stacks referring to it. Version 1 files stored one u32 index per
+inventory unit instead of stacks; they still load. The CRC32 covers the
+payload.
+"""
+import json
+import os
+import struct
+import sys
+import tempfile
+import zlib
+from array import array
+
+from inventory import normalize_doc
+
+MAGIC = b'PRLM'
+VERSION = 2
+
+_HEADER = struct.Struct('<4sHHII')
+_U16 = struct.Struct('<H')
+_U32 = struct.Struct('<I')
+_ITEM = struct.Struct('<IIii')
+_EQUIP = struct.Struct('<ii')
+
+
+class SaveFormatError(ValueError):
+    pass
+
+
+def is_binary(raw: bytes) -> bool:
+    return raw[:4] == MAGIC
+
+
+def version_of(raw: bytes) -> int:
+    """Format version in a binary save's header."""
+    return _HEADER.unpack_from(raw)[1]
+
+
+def atomic_write(path: str, raw: bytes):
+    """Write ``raw`` to ``path`` so readers see either the old or the new file, never half of one."""
+    # a unique temp name, so two threads writing the same file don't trip over each other
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path) or '.', prefix=os.path.basename(path) + '.', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            os.fchmod(f.fileno(), 0o644)  # mkstemp makes it owner-only
+            f.write(raw)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+
+
+def encode(data: dict) -> bytes:
+    """Encode a save document (``{'player': Player.to_dict(), 'timestamp': ...}``)."""
+    pl = normalize_doc(data['player'])
+    strings, string_ix = [], {}
+
+    def sidx(s):
+        i = string_ix.get(s)
+        if i is None:
+            i = string_ix[s] = len(strings)
+            strings.append(s)
+        return i
+
+    items = [(sidx(d['name']), sidx(d['type']), d.get('power', 0), d.get('value', 0)) for d in pl['items']]
+    stacks = array('I', [v for st in pl['inventory'] for v in st])
+    eq = pl.get('equipment') or {}
+    weapon, armor = (-1 if eq.get(slot) is None else eq[slot] for slot in ('weapon', 'armor'))
+
+    meta = {k: v for k, v in pl.items() if k not in ('items', 'inventory', 'equipment')}
+    meta = json.dumps({**data, 'player': meta}, separators=(',', ':')).encode()
+
+    out = bytearray()
+    out += _U32.pack(len(meta)) + meta
+    out += _U32.pack(len(strings))
+    for s in strings:
+        b = s.encode()
+        out += _U16.pack(len(b)) + b
+    out += _U32.pack(len(items))
+    for rec in items:
+        out += _ITEM.pack(*rec)
+    out += _EQUIP.pack(weapon, armor)
+    out += _U32.pack(len(stacks) // 2)
+    if sys.byteorder != 'little':
+        stacks.byteswap()
+    out += stacks.tobytes()
+
+    return _HEADER.pack(MAGIC, VERSION, 0, zlib.crc32(out), len(out)) + bytes(out)
+
+
+def _payload(raw: bytes) -> memoryview:
+    if len(raw) < _HEADER.size:
+        raise SaveFormatError('truncated header')
+    magic, version, _flags, crc, length = _HEADER.unpack_from(raw)
+    if magic != MAGIC:
+        raise SaveFormatError('not a binary save')
+    if version > VERSION:
+        raise SaveFormatError(f'save format v{version} is newer than supported v{VERSION}')
+    body = memoryview(raw)[_HEADER.size:]
+    if len(body) != length or zlib.crc32(body) != crc:
+        raise SaveFormatError('checksum mismatch')
+    return body
+
+
+def decode_meta(raw: bytes) -> dict:
+    """Decode only the header block: the save document without inventory/equipment."""
+    body = _payload(raw)
+    (n,) = _U32.unpack_from(body, 0)
+    return json.loads(bytes(body[4:4 + n]))
+
+
+def decode(raw: bytes) -> dict:
+    """Decode a binary save back into the document shape ``Player.to_dict()`` produces."""
+    body = _payload(raw)
+    version = _HEADER.unpack_from(raw)[1]
+    off = 0
+    (n,) = _U32.unpack_from(body, off)
+    off += 4
+    data = json.loads(bytes(body[off:off + n]))
+    off += n
+
+    (n,) = _U32.unpack_from(body, off)
+    off += 4
+    strings = []
+    for _ in range(n):
+        (ln,) = _U16.unpack_from(body, off)
+        off += 2
+        strings.append(str(body[off:off + ln], 'utf-8'))
+        off += ln
+
+    (n,) = _U32.unpack_from(body, off)
+    off += 4
+    table = []
+    for name, type_, power, value in _ITEM.iter_unpack(body[off:off + n * _ITEM.size]):
+        table.append({'name': strings[name], 'type': strings[type_], 'power': power, 'value': value})
+    off += n * _ITEM.size
+
+    weapon, armor = _EQUIP.unpack_from(body, off)
+    off += _EQUIP.size
+    (n,) = _U32.unpack_from(body, off)
+    off += 4
+    # v1 stored one index per unit, v2 stores (index, qty) pairs
+    width = 1 if version == 1 else 2
+    arr = array('I')
+    arr.frombytes(body[off:off + 4 * width * n])
+    if sys.byteorder != 'little':
+        arr.byteswap()
+
+    pl = data['player']
+    pl['items'] = table
+    pl['equipment'] = {'weapon': weapon if weapon >= 0 else None, 'armor': armor if armor >= 0 else None}
+    if version == 1:
+        stacks, stack_of = [], {}
+        for i in arr:
+            st = stack_of.get(i)
+            if st is None:
+                st = stack_of[i] = [i, 0]
+                stacks.append(st)
+            st[1] += 1
+        pl['inventory'] = stacks
+    else:
+        pl['inventory'] = [[arr[i], arr[i + 1]] for i in range(0, len(arr), 2)]
+    return data
@@ -0,0 +1,138 @@
+"""Versioned save document schema: version detection, migrations and validation.
+
+A save document is ``{'schema': N, 'player': Player.to_dict(), 'timestamp': ...}``
+(the binary format carries the same fields). Versions:
+
+    1  one item dict per inventory unit, equipment stored as item dicts
+    2  item table + ``[template id, qty]`` stacks, equipment by template id
+    3  adds the top-level ``schema`` field; player fields are stored explicitly
+       instead of being left for ``Player.from_dict`` to default
+    4  adds ``player.quests``: active quest progress and completion counts
+
+Versions 1 and 2 predate the ``schema`` field and are told apart by layout.
+``migrate()`` upgrades a document one version at a time through
+``MIGRATIONS``. ``validate()`` lists what is wrong with a current-version
+document.
+"""
+from typing import Callable, Dict, List
+
+from inventory import normalize_doc
+
+CURRENT = 4
+
+# defaults Player.from_dict used to fill in silently; health has none (a
+# missing value means full health, which depends on the class)
+PLAYER_DEFAULTS = {'pclass': 'Warrior', 'level': 1, 'exp': 0, 'gold': 100, 'location': 'Town', 'story_progress': 0}
+
+
+class SchemaError(ValueError):
+    pass
+
+
+def version_of(data: dict) -> int:
+    v = data.get('schema')
+    if v is not None:
+        return v
+    pl = data.get('player')
+    return 2 if isinstance(pl, dict) and 'items' in pl else 1
+
+
+def _v1_to_v2(data: dict) -> dict:
+    return {**data, 'player': normalize_doc(data['player'])}
+
+
+def _v2_to_v3(data: dict) -> dict:
+    return {**data, 'schema': 3, 'player': {**PLAYER_DEFAULTS, **data['player']}}
+
+
+def _v3_to_v4(data: dict) -> dict:
+    return {**data, 'schema': 4, 'player': {'quests': {'active': {}, 'completed': {}}, **data['player']}}
+
+
+MIGRATIONS: Dict[int, Callable[[dict], dict]] = {1: _v1_to_v2, 2: _v2_to_v3, 3: _v3_to_v4}
+
+
+def migrate(data: dict) -> dict:
+    """``data`` upgraded to the CURRENT version (``data`` itself if it already is)."""
+    v = version_of(data)
+    if not isinstance(v, int) or v < 1:
+        raise SchemaError(f'bad schema version {v!r}')
+    if v > CURRENT:
+        raise SchemaError(f'schema version {v} is newer than this game ({CURRENT})')
+    if not isinstance(data.get('player'), dict):
+        raise SchemaError('no player in save')
+    while v < CURRENT:
+        data = MIGRATIONS[v](data)
+        v += 1
+    return data
+
+
+def _int(v) -> bool:
+    return isinstance(v, int) and not isinstance(v, bool)
+
+
+def validate(data: dict) -> List[str]:
+    """Problems with a CURRENT-version save document (empty if it is valid)."""
+    errors = []
+    if data.get('schema') != CURRENT:
+        errors.append(f"schema is {data.get('schema')!r}, expected {CURRENT}")
+    if not isinstance(data.get('timestamp'), str):
+        errors.append('timestamp missing or not a string')
+    pl = data.get('player')
+    if not isinstance(pl, dict):
+        return errors + ['player missing or not an object']
+
+    def check(field, ok, what):
+        if field not in pl:
+            errors.append(f'player.{field} missing')
+        elif not ok(pl[field]):
+            errors.append(f'player.{field} should be {what}, got {pl[field]!r}')
+
+    check('name', lambda v: isinstance(v, str) and v != '', 'a non-empty string')
+    check('pclass', lambda v: isinstance(v, str), 'a string')
+    check('level', lambda v: _int(v) and v >= 1, 'an integer >= 1')
+    check('exp', lambda v: _int(v) and v >= 0, 'an integer >= 0')
+    check('gold', lambda v: _int(v) and v >= 0, 'an integer >= 0')
+    check('location', lambda v: isinstance(v, str), 'a string')
+    check('story_progress', lambda v: _int(v) and v >= 0, 'an integer >= 0')
+    if 'health' in pl and not _int(pl['health']):
+        errors.append(f"player.health should be an integer, got {pl['health']!r}")
+    if 'save_ts' in pl and not isinstance(pl['save_ts'], str):
+        errors.append('player.save_ts should be a string')
+
+    quests = pl.get('quests')
+    if not isinstance(quests, dict):
+        errors.append('player.quests missing or not an object')
+    else:
+        active, done = quests.get('active'), quests.get('completed')
+        if not (isinstance(active, dict) and all(isinstance(p, list) and all(_int(n) and n >= 0 for n in p)
+                                                 for p in active.values())):
+            errors.append('player.quests.active should map quest ids to lists of counts')
+        if not (isinstance(done, dict) and all(_int(n) and n >= 0 for n in done.values())):
+            errors.append('player.quests.completed should map quest ids to counts')
+
+    items = pl.get('items')
+    if not isinstance(items, list):
+        return errors + ['player.items missing or not a list']
+    for i, d in enumerate(items):
+        if not (isinstance(d, dict) and isinstance(d.get('name'), str) and isinstance(d.get('type'), str)
+                and _int(d.get('power', 0)) and _int(d.get('value', 0))):
+            errors.append(f'player.items[{i}] is not a valid item: {d!r}')
+    n = len(items)
+    inv = pl.get('inventory')
+    if not isinstance(inv, list):
+        errors.append('player.inventory missing or not a list')
+    else:
+        for i, st in enumerate(inv):
+            if not (isinstance(st, list) and len(st) == 2 and _int(st[0]) and 0 <= st[0] < n
+                    and _int(st[1]) and st[1] >= 1):
+                errors.append(f'player.inventory[{i}] is not a [item id, qty] stack: {st!r}')
+    eq = pl.get('equipment')
+    if not isinstance(eq, dict):
+        errors.append('player.equipment missing or not an object')
+    else:
+        for slot in ('weapon', 'armor'):
+            ref = eq.get(slot)
+            if ref is not None and not (_int(ref) and 0 <= ref < n):
+                errors.append(f'player.equipment.{slot} is not an item id: {ref!r}')
+    return errors
@@ -0,0 +1,270 @@
+"""Multi-session telnet-style game server.
+
+    python server.py --port 4000
+
+All sockets are served from a single asyncio event loop. The game logic in
+main.py is synchronous, so each session runs its menus on a worker thread
+whose say()/ask() calls are bridged onto the loop through SessionIO. Worker
+threads get small stacks so thousands of sessions fit comfortably.
+
+Output applies backpressure: writes are queued onto the loop without waiting,
+but after every WRITE_HIGH_WATER bytes, and before every read, the session's
+thread waits until its socket's write buffer has drained. Input is read one line at a time,
+only when the game asks for it, so TCP flow control throttles chatty clients.
+Sessions that don't answer within the idle timeout are closed. Every account
+gets its own save directory under ``game_saves/accounts/``, and every session
+is seeded (and, with ``--record-sessions``, logged there for replay.py). The content packs are checked for
+changes every ``--reload-every`` seconds and swapped in without dropping anyone.
+"""
+import argparse
+import asyncio
+import concurrent.futures
+import contextvars
+import logging
+import os
+import re
+import threading
+
+import main
+import metrics
+from content import ContentError
+from gameio import SessionClosed, use_io
+from session import use_session
+
+log = logging.getLogger('pyrealm.server')
+
+ACCOUNT_RE = re.compile(r'^[A-Za-z0-9_-]{1,32}$')
+WORKER_STACK_SIZE = 512 * 1024
+WRITE_HIGH_WATER = 64 * 1024
+MAX_LINE = 4096
+
+
+class SessionIO:
+    """Game-thread side of a connection; every call hops onto the event loop."""
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, reader: asyncio.StreamReader,
+                 writer: asyncio.StreamWriter, idle_timeout: float, diff_frames: bool = False):
+        self.loop = loop
+        self.reader = reader
+        self.writer = writer
+        self.idle_timeout = idle_timeout
+        self.diff_frames = diff_frames  # ANSI terminal: the game menu is pinned and updated in place (see render.py)
+        self.closed = False
+        self._unflushed = 0
+
+    def _call(self, coro):
+        if self.closed:
+            coro.close()
+            raise SessionClosed()
+        try:
+            return asyncio.run_coroutine_threadsafe(coro, self.loop).result()
+        except (ConnectionError, asyncio.TimeoutError, asyncio.LimitOverrunError, ValueError,
+                concurrent.futures.CancelledError, RuntimeError) as exc:
+            # RuntimeError: the loop is already closed (server shutting down)
+            self.closed = True
+            raise SessionClosed() from exc
+
+    def _write_nowait(self, data: bytes):
+        if not self.writer.is_closing():
+            self.writer.write(data)
+
+    async def _drain(self):
+        # drain() only waits while the transport buffer is above its high-water mark
+        await asyncio.wait_for(self.writer.drain(), self.idle_timeout)
+
+    async def _readline(self) -> bytes:
+        await self._drain()
+        try:
+            line = await asyncio.wait_for(self.reader.readline(), self.idle_timeout)
+        except asyncio.TimeoutError:
+            self.writer.write(b'\r\nIdle timeout, goodbye.\r\n')
+            raise
+        if not line:
+            raise ConnectionResetError('client disconnected')
+        return line
+
+    def write(self, text: str):
+        if self.closed:
+            raise SessionClosed()
+        data = text.replace('\n', '\r\n').encode()
+        try:
+            self.loop.call_soon_threadsafe(self._write_nowait, data)
+        except RuntimeError as exc:
+            self.closed = True
+            raise SessionClosed() from exc
+        # writes are fire-and-forget until enough piles up, then wait for the socket
+        self._unflushed += len(data)
+        if self._unflushed > WRITE_HIGH_WATER:
+            self._unflushed = 0
+            self._call(self._drain())
+
+    def read(self, prompt: str) -> str:
+        if prompt:
+            self.write(prompt)
+        line = self._call(self._readline())
+        self._unflushed = 0
+        return line.decode('utf-8', 'replace').rstrip('\r\n')
+
+
+class GameServer:
+    def __init__(self, host: str = '0.0.0.0', port: int = 4000, max_sessions: int = 2000,
+                 idle_timeout: float = 600.0, metrics_file: str = None, metrics_every: float = 15.0,
+                 diff_frames: bool = False, reload_every: float = 5.0):
+        self.host = host
+        self.port = port
+        self.max_sessions = max_sessions
+        self.idle_timeout = idle_timeout
+        self.metrics_file = metrics_file
+        self.metrics_every = metrics_every
+        self.diff_frames = diff_frames
+        self.reload_every = reload_every
+        self.sessions = 0
+        self._accounts = set()
+        self._accounts_lock = threading.Lock()
+        self._executor = None
+
+    def _claim_account(self, name: str) -> bool:
+        with self._accounts_lock:
+            if name in self._accounts:
+                return False
+            self._accounts.add(name)
+            return True
+
+    def _release_account(self, name: str):
+        with self._accounts_lock:
+            self._accounts.discard(name)
+
+    def _login(self, io: SessionIO) -> str:
+        io.write('Welcome to PyRealm.\n')
+        while True:
+            name = io.read('Account name: ').strip()
+            if not ACCOUNT_RE.match(name):
+                io.write('Use 1-32 letters, digits, "_" or "-".\n')
+            elif not self._claim_account(name):
+                io.write('That account is already playing.\n')
+            else:
+                return name
+
+    def _run_session(self, io: SessionIO):
+        """Runs on a worker thread, in a fresh context."""
+        account = None
+        try:
+            with use_io(io):
+                account = self._login(io)
+                save_dir = os.path.join(main.DATA_DIR, 'accounts', account)
+                os.makedirs(save_dir, exist_ok=True)
+                main.SAVE_DIR.set(save_dir)
+                main.ACCOUNT.set(account)
+                with use_session(main.new_session()):
+                    main.start()
+        except SessionClosed:
+            pass
+        except Exception:
+            log.exception('session for %s crashed', account or '<login>')
+            try:
+                io.write('\nSomething went wrong, closing the session.\n')
+            except SessionClosed:
+                pass
+        finally:
+            if account:
+                self._release_account(account)
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        if self.sessions >= self.max_sessions:
+            writer.write(b'Server full, try again later.\r\n')
+            writer.close()
+            return
+        writer.transport.set_write_buffer_limits(high=WRITE_HIGH_WATER)
+        self.sessions += 1
+        io = SessionIO(asyncio.get_running_loop(), reader, writer, self.idle_timeout, self.diff_frames)
+        try:
+            await asyncio.get_running_loop().run_in_executor(
+                self._executor, contextvars.Context().run, self._run_session, io)
+        finally:
+            self.sessions -= 1
+            io.closed = True
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except ConnectionError:
+                pass
+
+    async def _dump_metrics(self):
+        fmt = 'json' if self.metrics_file.endswith('.json') else 'prometheus'
+        while True:
+            await asyncio.sleep(self.metrics_every)
+            try:
+                metrics.write(self.metrics_file, fmt)
+            except OSError:
+                log.exception('could not write metrics to %s', self.metrics_file)
+
+    async def _watch_content(self):
+        # sessions keep running across a reload; they see the new content at their next action
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(self.reload_every)
+            try:
+                if await loop.run_in_executor(None, main.reload_content):
+                    log.info('reloaded content packs (%s)', main.content().digest[:12])
+            except ContentError as exc:
+                log.error('content packs not reloaded: %s', exc)
+            except OSError:
+                log.exception('could not read content packs')
+
+    async def serve(self):
+        main.content()  # bad packs fail here, before anyone connects
+        threading.stack_size(WORKER_STACK_SIZE)
+        self._executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=self.max_sessions, thread_name_prefix='session')
+        server = await asyncio.start_server(self._handle, self.host, self.port, limit=MAX_LINE)
+        log.info('listening on %s', ', '.join(str(s.getsockname()) for s in server.sockets))
+        dumper = asyncio.create_task(self._dump_metrics()) if self.metrics_file else None
+        watcher = asyncio.create_task(self._watch_content()) if self.reload_every else None
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            for task in (dumper, watcher):
+                if task:
+                    task.cancel()
+            self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+def cli(argv=None):
+    ap = argparse.ArgumentParser(description='PyRealm multi-session server')
+    ap.add_argument('--host', default='0.0.0.0')
+    ap.add_argument('--port', type=int, default=4000)
+    ap.add_argument('--max-sessions', type=int, default=2000)
+    ap.add_argument('--idle-timeout', type=float, default=600.0, help='seconds')
+    ap.add_argument('--storage', choices=('files', 'sqlite'), default=main.SAVE_BACKEND,
+                    help='save backend (sqlite keeps every account in game_saves/saves.db)')
+    ap.add_argument('--metrics', metavar='FILE',
+                    help='turn on metrics and rewrite FILE (Prometheus text, or JSON for *.json) every 15s')
+    ap.add_argument('--admin', action='append', default=[], metavar='ACCOUNT',
+                    help='let ACCOUNT use the in-game metrics menu (repeatable; nobody else on the server can)')
+    ap.add_argument('--diff-frames', action='store_true',
+                    help='ANSI clients: pin the game menu to the top of the screen and redraw only its changed lines')
+    ap.add_argument('--record-sessions', action='store_true',
+                    help=f'log each session for replay.py, keeping the last {main.SESSION_LOGS_KEPT} per account')
+    ap.add_argument('--reload-every', type=float, default=5.0, metavar='SECONDS',
+                    help='check the content packs for changes this often and reload them (0 turns it off)')
+    args = ap.parse_args(argv)
+    main.SAVE_BACKEND = args.storage
+    main.RECORD_SESSIONS = args.record_sessions
+    main.ADMIN_ACCOUNTS.update(args.admin)
+    if args.metrics:
+        metrics.enable()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(message)s')
+    srv = GameServer(args.host, args.port, args.max_sessions, args.idle_timeout, args.metrics,
+                     diff_frames=args.diff_frames, reload_every=args.reload_every)
+    try:
+        asyncio.run(srv.serve())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        main.AUTOSAVER.close()  # write what disconnected sessions left queued
+        main.save_markets()
+
+
+if __name__ == '__main__':
+    cli()
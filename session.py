@@ -0,0 +1,308 @@
+"""Seeded game sessions with a binary event log, for reproducing bugs.
+
+Game code draws random numbers from ``rng()`` rather than the ``random``
+module. ``rng()`` is the RNG of the session bound to the current context, or
+the ``random`` module when there is none. A ``Session`` owns a
+``random.Random`` seeded once per session. It can also record an event log
+that replay.py re-runs headless.
+
+Log layout (little-endian; "v" is an unsigned LEB128 varint)::
+
+    header      b'PRSL' | u16 version | u64 seed
+    input       0x01 | v length | utf-8 text
+    random()    0x02 | v (value * 2**53)
+    getrandbits 0x03 | v k | v value
+    checkpoint  0x04 | v inputs so far | v draws so far | 625 x u32 RNG state
+                     | v length | zlib(json player)
+    shared      0x05 | v inputs so far | v length | utf-8 name   (version 2)
+
+The RNG calls made by random()/randint()/choice() all boil down to the two
+draw kinds, so the log holds every random number the session used. Checkpoints are
+written whenever a game starts (new or loaded), then at most every
+``CHECKPOINT_EVERY`` inputs, at the top of the in-game menu. At that point
+the player and the RNG are the whole game state, except for what the session
+shares with others: the market and the generated frontier. Reading those is
+logged as a "shared" record (once per kind per input) so a replay can tell it
+may not see what the session saw.
+"""
+import contextlib
+import json
+import os
+import random
+import struct
+import zlib
+from contextvars import ContextVar
+from typing import BinaryIO, List, Optional, Tuple
+
+from gameio import current_io, use_io
+
+MAGIC = b'PRSL'
+VERSION = 2
+_HEADER = struct.Struct('<4sHQ')
+_STATE = struct.Struct('<625I')
+
+INPUT, FLOAT, BITS, CHECKPOINT, SHARED = 1, 2, 3, 4, 5
+CHECKPOINT_EVERY = 200
+
+_session: ContextVar = ContextVar('game_session', default=None)
+_rng: ContextVar = ContextVar('game_rng', default=random)
+
+
+class SessionLogError(ValueError):
+    pass
+
+
+def rng():
+    """The current session's RNG (the ``random`` module outside a session)."""
+    return _rng.get()
+
+
+def current_session() -> Optional['Session']:
+    return _session.get()
+
+
+@contextlib.contextmanager
+def use_rng(r):
+    token = _rng.set(r)
+    try:
+        yield r
+    finally:
+        _rng.reset(token)
+
+
+def new_seed() -> int:
+    return int.from_bytes(os.urandom(8), 'little')
+
+
+# -------------------------
+# Varints
+# -------------------------
+
+def _varint(n: int) -> bytes:
+    out = bytearray()
+    while n > 0x7f:
+        out.append((n & 0x7f) | 0x80)
+        n >>= 7
+    out.append(n)
+    return bytes(out)
+
+
+def _read_varint(buf: bytes, pos: int) -> Tuple[int, int]:
+    n = shift = 0
+    while True:
+        b = buf[pos]  # IndexError on a torn record
+        pos += 1
+        n |= (b & 0x7f) << shift
+        if b < 0x80:
+            return n, pos
+        shift += 7
+
+
+# -------------------------
+# RNG
+# -------------------------
+
+class SessionRandom(random.Random):
+    """random.Random that reports every draw to ``on_draw(kind, *values)``."""
+
+    def __init__(self, seed: int, on_draw=None):
+        self.on_draw = on_draw
+        super().__init__(seed)
+
+    def random(self) -> float:
+        x = super().random()
+        if self.on_draw is not None:
+            self.on_draw(FLOAT, int(x * 9007199254740992.0))
+        return x
+
+    def getrandbits(self, k: int) -> int:
+        n = super().getrandbits(k)
+        if self.on_draw is not None:
+            self.on_draw(BITS, k, n)
+        return n
+
+
+# -------------------------
+# Sessions
+# -------------------------
+
+class Session:
+    def __init__(self, seed: Optional[int] = None, log_path: Optional[str] = None,
+                 checkpoint_every: int = CHECKPOINT_EVERY):
+        self.seed = new_seed() if seed is None else seed
+        self.checkpoint_every = checkpoint_every
+        self.inputs = 0
+        self.draws = 0
+        self._last_checkpoint: Optional[int] = None
+        self._shared_at = {}  # kind -> inputs count of its last shared record
+        self.log_path = log_path
+        self._log: Optional[BinaryIO] = None
+        if log_path:
+            os.makedirs(os.path.dirname(log_path) or '.', exist_ok=True)
+            self._log = open(log_path, 'wb')
+            self._log.write(_HEADER.pack(MAGIC, VERSION, self.seed))
+        self.rng = SessionRandom(self.seed, self._on_draw if self._log else None)
+
+    def _on_draw(self, kind: int, *values: int):
+        self.draws += 1
+        self._log.write(bytes((kind,)) + b''.join(map(_varint, values)))
+
+    def record_input(self, text: str):
+        self.inputs += 1
+        if self._log is not None:
+            data = text.encode('utf-8')
+            self._log.write(bytes((INPUT,)) + _varint(len(data)) + data)
+            # the log is complete up to the last thing the player typed
+            self._log.flush()
+
+    def checkpoint(self, player, force: bool = False):
+        if self._log is None:
+            return
+        if not force and self._last_checkpoint is not None \
+                and self.inputs - self._last_checkpoint < self.checkpoint_every:
+            return
+        self._last_checkpoint = self.inputs
+        _version, state, _gauss = self.rng.getstate()
+        doc = zlib.compress(json.dumps(player.to_dict(), separators=(',', ':')).encode('utf-8'))
+        self._log.write(bytes((CHECKPOINT,)) + _varint(self.inputs) + _varint(self.draws)
+                        + _STATE.pack(*state) + _varint(len(doc)) + doc)
+        self._log.flush()
+
+    def shared_read(self, what: str):
+        if self._log is None or self._shared_at.get(what) == self.inputs:
+            return
+        self._shared_at[what] = self.inputs
+        data = what.encode('utf-8')
+        self._log.write(bytes((SHARED,)) + _varint(self.inputs) + _varint(len(data)) + data)
+        self._log.flush()
+
+    def close(self):
+        if self._log is not None:
+            self._log.close()
+            self._log = None
+
+
+class RecordingIO:
+    """Wraps a game I/O and logs every line the player enters."""
+
+    def __init__(self, inner, session: Session):
+        self.inner = inner
+        self.session = session
+
+    @property
+    def diff_frames(self) -> bool:
+        return getattr(self.inner, 'diff_frames', False)
+
+    def write(self, text: str):
+        self.inner.write(text)
+
+    def read(self, prompt: str) -> str:
+        text = self.inner.read(prompt)
+        self.session.record_input(text)
+        return text
+
+
+@contextlib.contextmanager
+def use_session(session: Session):
+    """Bind ``session`` (its RNG and input recording) to the current context."""
+    token = _session.set(session)
+    try:
+        with use_rng(session.rng), use_io(RecordingIO(current_io(), session)):
+            yield session
+    finally:
+        _session.reset(token)
+        session.close()
+
+
+def checkpoint(player, force: bool = False):
+    """Checkpoint ``player`` into the current session's log, if it's recording."""
+    s = _session.get()
+    if s is not None:
+        s.checkpoint(player, force)
+
+
+def shared_read(what: str):
+    """Note in the current session's log that it read shared state ``what`` (e.g. 'market')."""
+    s = _session.get()
+    if s is not None:
+        s.shared_read(what)
+
+
+# -------------------------
+# Reading logs
+# -------------------------
+
+class Checkpoint:
+    __slots__ = ('inputs', 'draws', 'rng_state', 'player')
+
+    def __init__(self, inputs: int, draws: int, rng_state: tuple, player: dict):
+        self.inputs = inputs
+        self.draws = draws
+        self.rng_state = rng_state
+        self.player = player
+
+
+class SessionLog:
+    def __init__(self, seed: int):
+        self.seed = seed
+        self.inputs: List[str] = []
+        self.draws: List[tuple] = []
+        self.checkpoints: List[Checkpoint] = []
+        self.shared: List[Tuple[int, str]] = []  # (inputs so far, what) for each shared record
+        self.torn = False  # the log ends in a partial record (the session crashed mid-write)
+
+
+def read_log(path: str) -> SessionLog:
+    with open(path, 'rb') as f:
+        buf = f.read()
+    if len(buf) < _HEADER.size:
+        raise SessionLogError(f'{path}: not a session log')
+    magic, version, seed = _HEADER.unpack_from(buf)
+    if magic != MAGIC:
+        raise SessionLogError(f'{path}: not a session log')
+    if not 1 <= version <= VERSION:
+        raise SessionLogError(f'{path}: unsupported session log version {version}')
+    log = SessionLog(seed)
+    pos = _HEADER.size
+    try:
+        while pos < len(buf):
+            kind = buf[pos]
+            pos += 1
+            if kind == INPUT:
+                n, pos = _read_varint(buf, pos)
+                if pos + n > len(buf):
+                    raise IndexError
+                log.inputs.append(buf[pos:pos + n].decode('utf-8'))
+                pos += n
+            elif kind == FLOAT:
+                n, pos = _read_varint(buf, pos)
+                log.draws.append((FLOAT, n))
+            elif kind == BITS:
+                k, pos = _read_varint(buf, pos)
+                n, pos = _read_varint(buf, pos)
+                log.draws.append((BITS, k, n))
+            elif kind == CHECKPOINT:
+                inputs, pos = _read_varint(buf, pos)
+                draws, pos = _read_varint(buf, pos)
+                if pos + _STATE.size > len(buf):
+                    raise IndexError
+                state = _STATE.unpack_from(buf, pos)
+                pos += _STATE.size
+                n, pos = _read_varint(buf, pos)
+                if pos + n > len(buf):
+                    raise IndexError
+                player = json.loads(zlib.decompress(buf[pos:pos + n]))
+                pos += n
+                log.checkpoints.append(Checkpoint(inputs, draws, (3, state, None), player))
+            elif kind == SHARED:
+                inputs, pos = _read_varint(buf, pos)
+                n, pos = _read_varint(buf, pos)
+                if pos + n > len(buf):
+                    raise IndexError
+                log.shared.append((inputs, buf[pos:pos + n].decode('utf-8')))
+                pos += n
+            else:
+                raise SessionLogError(f'{path}: bad record type {kind} at byte {pos - 1}')
+    except IndexError:
+        log.torn = True
+    return log
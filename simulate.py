@@ -0,0 +1,220 @@
+"""Headless Monte Carlo combat simulator for balance runs.
+
+Replays the rules of ``combat()`` and ``boss_battle()`` from main.py without
+any input()/print(), batching thousands of fights per NumPy call.
+
+    python simulate.py --class Rogue --level 3 --location "Underground Lake" -n 1000000
+"""
+import argparse
+import sys
+from typing import Callable, Optional, Union
+
+import numpy as np
+
+from main import Boss, Enemy, Player, content, spawn_enemy_for_location
+
+# action codes, same letters the combat prompt accepts
+ATTACK, SKILL, USE, RUN = 0, 1, 2, 3
+ACTION_CODES = {'a': ATTACK, 's': SKILL, 'u': USE, 'r': RUN}
+
+# fight outcomes
+WIN, LOSS, FLED, TIMEOUT = 0, 1, 2, 3
+OUTCOME_NAMES = ('win', 'loss', 'fled', 'timeout')
+
+CHUNK = 1 << 20
+
+Policy = Union[str, Callable[[int, np.ndarray, np.ndarray, int], np.ndarray]]
+
+
+def heal_below(fraction: float, otherwise: str = 'a'):
+    """Policy: use a consumable when HP drops below ``fraction`` of max, else ``otherwise``."""
+    fallback = ACTION_CODES[otherwise]
+
+    def policy(turn, player_hp, enemy_hp, max_hp):
+        return np.where(player_hp < fraction * max_hp, USE, fallback)
+    return policy
+
+
+class SimResult:
+    def __init__(self, outcome: np.ndarray, turns: np.ndarray, hp_remaining: np.ndarray, max_hp: int):
+        self.outcome = outcome
+        self.turns = turns
+        self.hp_remaining = hp_remaining
+        self.max_hp = max_hp
+
+    @property
+    def n(self):
+        return len(self.outcome)
+
+    def rate(self, outcome: int) -> float:
+        return float(np.count_nonzero(self.outcome == outcome)) / max(1, self.n)
+
+    @property
+    def win_rate(self):
+        return self.rate(WIN)
+
+    def turns_to_kill(self) -> np.ndarray:
+        """Histogram of turns taken in won fights, indexed by turn count."""
+        return np.bincount(self.turns[self.outcome == WIN])
+
+    def hp_distribution(self) -> np.ndarray:
+        """Histogram of player HP left after won fights, indexed by HP."""
+        return np.bincount(np.clip(self.hp_remaining[self.outcome == WIN], 0, None), minlength=self.max_hp + 1)
+
+    def summary(self) -> dict:
+        won = self.outcome == WIN
+        out = {name: self.rate(code) for code, name in enumerate(OUTCOME_NAMES)}
+        out['fights'] = self.n
+        if won.any():
+            t = self.turns[won]
+            hp = self.hp_remaining[won]
+            out['turns_to_kill'] = {'mean': float(t.mean()), 'p50': float(np.percentile(t, 50)),
+                                    'p95': float(np.percentile(t, 95)), 'max': int(t.max())}
+            out['hp_remaining'] = {'mean': float(hp.mean()), 'p5': float(np.percentile(hp, 5)),
+                                   'p50': float(np.percentile(hp, 50)), 'min': int(hp.min())}
+        return out
+
+
+def _potion_heals(player: Player, potion: str) -> np.ndarray:
+    # use_consumable always takes the first matching entry, so order matters
+    return np.array([it.power for it in player.inventory if it.name == potion and it.type == 'consumable'],
+                    dtype=np.int64)
+
+
+def _actions(policy: Policy, turn: int, player_hp: np.ndarray, enemy_hp: np.ndarray, max_hp: int) -> np.ndarray:
+    if isinstance(policy, str):
+        return np.full(len(player_hp), ACTION_CODES[policy], dtype=np.int8)
+    return np.asarray(policy(turn, player_hp, enemy_hp, max_hp))
+
+
+def _skill_damage(player: Player, rng: np.random.Generator, k: int) -> np.ndarray:
+    if player.pclass == 'Warrior':
+        return np.full(k, player.attack_power() + 10, dtype=np.int64)
+    if player.pclass == 'Mage':
+        return np.full(k, 20 + player.level * 2, dtype=np.int64)
+    if player.pclass == 'Rogue':
+        return player.attack_power() + rng.integers(5, 16, size=k)
+    # unknown classes have no skill; the enemy still gets its turn
+    return np.zeros(k, dtype=np.int64)
+
+
+def _run_chunk(player: Player, enemy: Enemy, policy: Policy, n: int, rng: np.random.Generator,
+               max_turns: int, potion: str):
+    is_boss = isinstance(enemy, Boss)
+    atk = player.attack_power()
+    dfn = player.defense()
+    max_hp = player.max_health()
+    heals = _potion_heals(player, potion)
+
+    php = np.full(n, player.health, dtype=np.int64)
+    ehp = np.full(n, enemy.health, dtype=np.int64)
+    used = np.zeros(n, dtype=np.int64)
+    turns = np.zeros(n, dtype=np.int64)
+    outcome = np.full(n, TIMEOUT, dtype=np.int8)
+    active = np.arange(n)
+
+    for turn in range(1, max_turns + 1):
+        if active.size == 0:
+            break
+        k = active.size
+        act = _actions(policy, turn, php[active], ehp[active], max_hp).astype(np.int8, copy=False)
+        if is_boss:
+            # boss_battle only understands attack and use; anything else is a wasted turn
+            act = np.where((act == ATTACK) | (act == USE), act, SKILL)
+        # out of potions: combat() asks again, and a scripted player attacks instead;
+        # boss_battle() has already spent the turn (SKILL does nothing there)
+        no_potion = (act == USE) & (used[active] >= heals.size)
+        act = np.where(no_potion, SKILL if is_boss else ATTACK, act)
+        turns[active] += 1
+
+        # player turn
+        dmg = np.zeros(k, dtype=np.int64)
+        m = act == ATTACK
+        if m.any():
+            cap = enemy.power // 3 if is_boss else enemy.power // 2
+            dmg[m] = np.maximum(1, atk - rng.integers(0, cap + 1, size=int(m.sum())))
+        m = act == SKILL
+        if m.any() and not is_boss:
+            dmg[m] = _skill_damage(player, rng, int(m.sum()))
+        ehp[active] -= dmg
+
+        m = act == USE
+        if m.any():
+            idx = active[m]
+            php[idx] = np.minimum(max_hp, php[idx] + heals[used[idx]])
+            used[idx] += 1
+
+        escaped = np.zeros(k, dtype=bool)
+        m = act == RUN
+        if m.any():
+            escaped[m] = rng.random(int(m.sum())) < 0.5
+            outcome[active[escaped]] = FLED
+
+        # enemy turn
+        hits = (ehp[active] > 0) & ~escaped
+        if hits.any():
+            idx = active[hits]
+            if is_boss:
+                # boss_battle's enrage check compares health against half of
+                # itself, which never fires, so every fight stays in phase 1
+                php[idx] -= rng.integers(1, enemy.power + 5 + 1, size=idx.size)
+            else:
+                raw = rng.integers(1, enemy.power + 1, size=idx.size)
+                php[idx] -= np.maximum(0, raw - dfn // 2)
+
+        won = ehp[active] <= 0
+        lost = php[active] <= 0
+        outcome[active[won & ~lost]] = WIN
+        outcome[active[lost]] = LOSS
+        active = active[~(won | lost | escaped)]
+
+    return outcome, turns, php
+
+
+def simulate(player: Player, enemy: Enemy, policy: Policy = 'a', n: int = 100_000,
+             seed: Optional[int] = None, max_turns: int = 1000, potion: str = 'Potion') -> SimResult:
+    """Run ``n`` independent fights of ``player`` against fresh copies of ``enemy``.
+
+    Neither object is modified. ``policy`` is an action letter ('a', 's', 'u',
+    'r') or a callable ``(turn, player_hp, enemy_hp, max_hp) -> action codes``
+    over the still-running fights.
+    """
+    rng = np.random.default_rng(seed)
+    parts = []
+    for start in range(0, n, CHUNK):
+        parts.append(_run_chunk(player, enemy, policy, min(CHUNK, n - start), rng, max_turns, potion))
+    outcome, turns, hp = (np.concatenate(col) for col in zip(*parts))
+    return SimResult(outcome, turns, hp, player.max_health())
+
+
+def build_player(pclass: str, level: int = 1, weapon=None, armor=None) -> Player:
+    p = Player('Sim', pclass)
+    p.level = level
+    if weapon:
+        p.equipment.equip(weapon)
+    if armor:
+        p.equipment.equip(armor)
+    p.health = p.max_health()
+    return p
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description='Monte Carlo combat balance runs')
+    ap.add_argument('--class', dest='pclass', default='Warrior')
+    ap.add_argument('--level', type=int, default=1)
+    ap.add_argument('--location', default='Forest', help="location to spawn from, or 'boss'")
+    ap.add_argument('--policy', default='a', choices=sorted(ACTION_CODES))
+    ap.add_argument('-n', type=int, default=100_000)
+    ap.add_argument('--seed', type=int)
+    args = ap.parse_args(argv)
+
+    player = build_player(args.pclass, args.level)
+    enemy = content().boss if args.location.lower() == 'boss' else spawn_enemy_for_location(args.location)
+    res = simulate(player, enemy, args.policy, n=args.n, seed=args.seed)
+    print(f"{player.pclass} L{player.level} vs {enemy.name} ({args.n} fights, policy '{args.policy}')")
+    for k, v in res.summary().items():
+        print(f'  {k}: {v}')
+
+
+if __name__ == '__main__':
+    sys.exit(main())
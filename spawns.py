@@ -0,0 +1,122 @@
+"""Data-driven enemy spawn tables.
+
+Each location has a weighted table of enemy prototypes. An entry can be
+limited to a band of player levels, and its weight is scaled by its rarity.
+Every distinct level band is compiled once into an alias-method sampler
+(Vose), so a draw costs one random number and a bisect no matter how many
+enemy types a zone has. Spawning clones the chosen prototype instead of
+running its constructor, then rolls its loot table.
+"""
+import bisect
+import random
+from typing import Dict, List, Optional, Sequence, Tuple
+
+RARITY_WEIGHTS = {'common': 1.0, 'uncommon': 0.35, 'rare': 0.1, 'epic': 0.02}
+
+
+class AliasSampler:
+    """O(1) draws from a fixed discrete distribution (Vose's alias method)."""
+
+    def __init__(self, weights: Sequence[float]):
+        n = len(weights)
+        if n == 0:
+            raise ValueError('cannot sample from an empty table')
+        total = float(sum(weights))
+        scaled = [w * n / total for w in weights]
+        self.prob = [0.0] * n
+        self.alias = list(range(n))
+        small = [i for i, p in enumerate(scaled) if p < 1.0]
+        large = [i for i, p in enumerate(scaled) if p >= 1.0]
+        while small and large:
+            s, l = small.pop(), large.pop()
+            self.prob[s] = scaled[s]
+            self.alias[s] = l
+            scaled[l] -= 1.0 - scaled[s]
+            (small if scaled[l] < 1.0 else large).append(l)
+        for i in small + large:
+            self.prob[i] = 1.0
+        self.n = n
+
+    def sample(self, rng=random) -> int:
+        u = rng.random() * self.n
+        i = int(u)
+        return i if u - i < self.prob[i] else self.alias[i]
+
+
+class SpawnEntry:
+    __slots__ = ('prototype', 'weight', 'min_level', 'max_level', 'loot')
+
+    def __init__(self, prototype, weight: float = 1.0, levels: Tuple[int, Optional[int]] = (1, None),
+                 rarity: str = 'common', loot: Sequence[Tuple[object, float]] = ()):
+        self.prototype = prototype
+        self.weight = weight * RARITY_WEIGHTS[rarity]
+        self.min_level, self.max_level = levels
+        self.loot = list(loot)  # (item, drop chance) pairs
+
+    def allows(self, level: int) -> bool:
+        return level >= self.min_level and (self.max_level is None or level <= self.max_level)
+
+
+class SpawnTable:
+    def __init__(self):
+        self.entries: List[SpawnEntry] = []
+        # (band lower bounds, band samplers), built together and swapped in as one
+        # tuple so a concurrent pick() never sees one list without the other
+        self._compiled: Optional[Tuple[List[int], List[Optional[Tuple[AliasSampler, List[SpawnEntry]]]]]] = None
+
+    def add(self, entry: SpawnEntry):
+        self.entries.append(entry)
+        self._compiled = None  # recompile on next draw
+
+    def _compile(self):
+        # levels where the set of eligible entries can change
+        edges = {1}
+        for e in self.entries:
+            edges.add(e.min_level)
+            if e.max_level is not None:
+                edges.add(e.max_level + 1)
+        bounds = sorted(edges)
+        bands = []
+        for lo in bounds:
+            eligible = [e for e in self.entries if e.allows(lo)]
+            bands.append((AliasSampler([e.weight for e in eligible]), eligible) if eligible else None)
+        self._compiled = compiled = (bounds, bands)
+        return compiled
+
+    def pick(self, level: int, rng=random) -> Optional[SpawnEntry]:
+        compiled = self._compiled
+        if compiled is None:
+            if not self.entries:
+                return None
+            compiled = self._compile()
+        bounds, bands = compiled
+        band = bands[bisect.bisect_right(bounds, max(level, 1)) - 1]
+        if band is None:
+            return None
+        sampler, eligible = band
+        return eligible[sampler.sample(rng)]
+
+
+class SpawnRegistry:
+    def __init__(self):
+        self.tables: Dict[str, SpawnTable] = {}
+        self.default = SpawnTable()
+
+    def register(self, location: Optional[str], prototype, weight: float = 1.0,
+                 levels: Tuple[int, Optional[int]] = (1, None), rarity: str = 'common',
+                 loot: Sequence[Tuple[object, float]] = ()):
+        """Add an enemy to a location's table (``location=None`` for the fallback table)."""
+        table = self.default if location is None else self.tables.setdefault(location, SpawnTable())
+        table.add(SpawnEntry(prototype, weight, levels, rarity, loot))
+
+    def spawn(self, location: str, level: int = 1, rng=random):
+        """A fresh enemy for ``location``, or None if no table has one for this level."""
+        table = self.tables.get(location)
+        entry = table.pick(level, rng) if table else None
+        if entry is None:
+            entry = self.default.pick(level, rng)
+            if entry is None:
+                return None
+        enemy = entry.prototype.clone()
+        enemy.loot = [item for item, chance in entry.loot if chance >= 1.0 or rng.random() < chance]
+        return enemy
@@ -0,0 +1,332 @@
+"""SQLite save backend: every account's slots in one database.
+
+    python sqlstore.py import game_saves                 # copy file saves into game_saves/saves.db
+    python sqlstore.py import game_saves --db other.db --batch 1000
+    python sqlstore.py list --account alice
+
+Select it in main.py with ``SAVE_BACKEND = 'sqlite'`` (or ``server.py
+--storage sqlite``). Tables:
+
+    saves      one row per (account, slot): the player's scalar fields as
+               indexed columns, equipment as item ids, and the snapshot base
+               and last-saved timestamps
+    items      item definitions, stored once and shared by every save
+    inventory  (account, slot, item id) -> qty, pos (acquisition order)
+
+The database runs in WAL mode, so readers never block the single writer, and
+connections come from a small pool shared by all threads. A full save replaces
+one save row and its inventory rows in a single transaction. An incremental
+save applies just the changed fields and inventory deltas. The file importer
+commits a batch of saves per transaction.
+"""
+import argparse
+import contextlib
+import json
+import os
+import queue
+import sqlite3
+import sys
+import threading
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+import schema
+from inventory import dict_key, normalize_doc
+from migrate_saves import iter_saves, owner_of, read_save
+
+PLAYER_COLUMNS = ('name', 'pclass', 'level', 'exp', 'health', 'gold', 'location', 'story_progress', 'save_ts')
+
+DDL = """
+CREATE TABLE IF NOT EXISTS saves (
+    account TEXT NOT NULL,
+    slot INTEGER NOT NULL,
+    schema INTEGER NOT NULL,
+    base TEXT NOT NULL,
+    timestamp TEXT NOT NULL,
+    name TEXT NOT NULL,
+    pclass TEXT,
+    level INTEGER,
+    exp INTEGER,
+    health INTEGER,
+    gold INTEGER,
+    location TEXT,
+    story_progress INTEGER,
+    save_ts TEXT,
+    weapon INTEGER REFERENCES items(id),
+    armor INTEGER REFERENCES items(id),
+    extra TEXT,
+    PRIMARY KEY (account, slot)
+);
+CREATE INDEX IF NOT EXISTS saves_by_level ON saves (level);
+CREATE INDEX IF NOT EXISTS saves_by_class ON saves (pclass, level);
+CREATE INDEX IF NOT EXISTS saves_by_name ON saves (name);
+CREATE INDEX IF NOT EXISTS saves_by_timestamp ON saves (timestamp);
+CREATE TABLE IF NOT EXISTS items (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    type TEXT NOT NULL,
+    power INTEGER NOT NULL,
+    value INTEGER NOT NULL,
+    UNIQUE (name, type, power, value)
+);
+CREATE TABLE IF NOT EXISTS inventory (
+    account TEXT NOT NULL,
+    slot INTEGER NOT NULL,
+    item INTEGER NOT NULL REFERENCES items(id),
+    qty INTEGER NOT NULL,
+    pos INTEGER NOT NULL,
+    PRIMARY KEY (account, slot, item)
+) WITHOUT ROWID;
+"""
+
+
+def _row_bytes(row: tuple) -> int:
+    # the size of the values written, as the save's counterpart to a file's length
+    return sum(len(v.encode()) if isinstance(v, str) else 0 if v is None else 8 for v in row)
+
+
+class SQLiteStore:
+    def __init__(self, path: str, account: Callable[[], str] = lambda: '', pool_size: int = 8,
+                 timeout: float = 10.0):
+        self.path = path
+        self.account = account
+        self.timeout = timeout
+        self._pool: 'queue.LifoQueue[sqlite3.Connection]' = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(pool_size)
+        self._item_ids: Dict[tuple, int] = {}
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        with self.connection() as c:
+            c.executescript(DDL)
+
+    # -------------------------
+    # Connections
+    # -------------------------
+
+    def _connect(self) -> sqlite3.Connection:
+        # autocommit mode: transactions are opened explicitly with BEGIN IMMEDIATE
+        c = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None, check_same_thread=False)
+        c.execute('PRAGMA journal_mode=WAL')
+        c.execute('PRAGMA synchronous=NORMAL')
+        c.execute('PRAGMA foreign_keys=ON')
+        return c
+
+    @contextlib.contextmanager
+    def connection(self):
+        """Borrow a pooled connection; blocks while all ``pool_size`` are in use."""
+        self._slots.acquire()
+        try:
+            try:
+                c = self._pool.get_nowait()
+            except queue.Empty:
+                c = self._connect()
+            try:
+                yield c
+            finally:
+                self._pool.put(c)
+        finally:
+            self._slots.release()
+
+    @contextlib.contextmanager
+    def transaction(self):
+        with self.connection() as c:
+            c.execute('BEGIN IMMEDIATE')
+            try:
+                yield c
+            except BaseException:
+                c.execute('ROLLBACK')
+                raise
+            c.execute('COMMIT')
+
+    def close(self):
+        while True:
+            try:
+                self._pool.get_nowait().close()
+            except queue.Empty:
+                return
+
+    # -------------------------
+    # Items
+    # -------------------------
+
+    def _resolve(self, c: sqlite3.Connection, items: Iterable[dict], new: Dict[tuple, int]) -> List[int]:
+        """Database ids for item dicts, inserting unknown ones. ``new`` collects ids to cache after commit."""
+        keys = [dict_key(d) for d in items]
+        missing = {k for k in keys if k not in self._item_ids and k not in new}
+        if missing:
+            c.executemany('INSERT OR IGNORE INTO items (name, type, power, value) VALUES (?, ?, ?, ?)', missing)
+            for k in missing:
+                new[k] = c.execute('SELECT id FROM items WHERE name=? AND type=? AND power=? AND value=?',
+                                   k).fetchone()[0]
+        return [self._item_ids.get(k) or new[k] for k in keys]
+
+    # -------------------------
+    # Backend interface (see main.FileStore)
+    # -------------------------
+
+    def save(self, slot: int, data: dict, fmt: Optional[str] = None) -> int:
+        """Replace a slot with a full save document; ``fmt`` is ignored. Returns the bytes stored."""
+        return self.save_many([(self.account(), slot, data)])
+
+    def save_many(self, saves: Iterable[Tuple[str, int, dict]]) -> int:
+        """Write ``(account, slot, data)`` saves in one transaction; returns the bytes stored."""
+        new: Dict[tuple, int] = {}
+        size = 0
+        with self.transaction() as c:
+            for account, slot, data in saves:
+                size += self._write(c, account, slot, data, new)
+        self._item_ids.update(new)
+        return size
+
+    def _write(self, c: sqlite3.Connection, account: str, slot: int, data: dict, new: Dict[tuple, int]) -> int:
+        pl = normalize_doc(data['player'])
+        ids = self._resolve(c, pl['items'], new)
+        eq = pl.get('equipment') or {}
+        weapon, armor = (None if eq.get(s) is None else ids[eq[s]] for s in ('weapon', 'armor'))
+        extra = {k: v for k, v in pl.items() if k not in PLAYER_COLUMNS and k not in ('items', 'inventory', 'equipment')}
+        row = (account, slot, data.get('schema', schema.CURRENT), data['timestamp'], data['timestamp'],
+               *(pl.get(k) for k in PLAYER_COLUMNS), weapon, armor, json.dumps(extra) if extra else None)
+        stacks = [(account, slot, ids[tid], qty, pos) for pos, (tid, qty) in enumerate(pl['inventory'])]
+        c.execute('INSERT OR REPLACE INTO saves VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)', row)
+        c.execute('DELETE FROM inventory WHERE account=? AND slot=?', (account, slot))
+        c.executemany('INSERT INTO inventory VALUES (?, ?, ?, ?, ?)', stacks)
+        return _row_bytes(row) + sum(map(_row_bytes, stacks))
+
+    def append(self, slot: int, entry: dict) -> bool:
+        """Apply an incremental save entry (see journal.py); False if a full save is needed instead."""
+        account = self.account()
+        new: Dict[tuple, int] = {}
+        with self.transaction() as c:
+            row = c.execute('SELECT base FROM saves WHERE account=? AND slot=?', (account, slot)).fetchone()
+            if row is None or row[0] != entry['base']:
+                return False
+            sets = {k: v for k, v in entry.get('set', {}).items() if k in PLAYER_COLUMNS}
+            others = {k: v for k, v in entry.get('set', {}).items() if k not in PLAYER_COLUMNS}
+            if others:  # fields without a column of their own live in the extra JSON
+                extra = c.execute('SELECT extra FROM saves WHERE account=? AND slot=?', (account, slot)).fetchone()[0]
+                sets['extra'] = json.dumps({**(json.loads(extra) if extra else {}), **others})
+            for slot_name, d in entry.get('equip', {}).items():
+                if slot_name in ('weapon', 'armor'):
+                    sets[slot_name] = self._resolve(c, [d], new)[0] if d else None
+            sets['timestamp'] = entry['timestamp']
+            c.execute(f"UPDATE saves SET {', '.join(f'{k}=?' for k in sets)} WHERE account=? AND slot=?",
+                      (*sets.values(), account, slot))
+            for op, d, qty in entry.get('inv', ()):
+                item = self._resolve(c, [d], new)[0]
+                if op == '+':
+                    c.execute('INSERT INTO inventory VALUES (?, ?, ?, ?, '
+                              '(SELECT COALESCE(MAX(pos) + 1, 0) FROM inventory WHERE account=? AND slot=?)) '
+                              'ON CONFLICT (account, slot, item) DO UPDATE SET qty = qty + excluded.qty',
+                              (account, slot, item, qty, account, slot))
+                else:
+                    c.execute('UPDATE inventory SET qty = qty - ? WHERE account=? AND slot=? AND item=?',
+                              (qty, account, slot, item))
+                    c.execute('DELETE FROM inventory WHERE account=? AND slot=? AND item=? AND qty <= 0',
+                              (account, slot, item))
+        self._item_ids.update(new)
+        return True
+
+    def load(self, slot: int) -> Optional[dict]:
+        """The save document for a slot (in the Player.to_dict() layout), or None."""
+        account = self.account()
+        with self.connection() as c:
+            row = c.execute(f"SELECT schema, base, {', '.join(PLAYER_COLUMNS)}, weapon, armor, extra "
+                            'FROM saves WHERE account=? AND slot=?', (account, slot)).fetchone()
+            if row is None:
+                return None
+            inv = c.execute('SELECT i.id, i.name, i.type, i.power, i.value, v.qty FROM inventory v '
+                            'JOIN items i ON i.id = v.item WHERE v.account=? AND v.slot=? ORDER BY v.pos',
+                            (account, slot)).fetchall()
+            eq_ids = [i for i in row[-3:-1] if i is not None]
+            eq_items = c.execute(f"SELECT id, name, type, power, value FROM items WHERE id IN "
+                                 f"({', '.join('?' * len(eq_ids))})", eq_ids).fetchall() if eq_ids else []
+        table, index = [], {}
+
+        def ref(rec):
+            i = index.get(rec[0])
+            if i is None:
+                i = index[rec[0]] = len(table)
+                table.append({'name': rec[1], 'type': rec[2], 'power': rec[3], 'value': rec[4]})
+            return i
+
+        stacks = [[ref(rec), rec[5]] for rec in inv]
+        by_id = {rec[0]: rec for rec in eq_items}
+        pl = dict(zip(PLAYER_COLUMNS, row[2:2 + len(PLAYER_COLUMNS)]))
+        pl = {k: v for k, v in pl.items() if v is not None}
+        if row[-1]:
+            pl.update(json.loads(row[-1]))
+        pl['items'] = table
+        pl['inventory'] = stacks
+        weapon, armor = row[-3], row[-2]
+        pl['equipment'] = {'weapon': None if weapon is None else ref(by_id[weapon]),
+                           'armor': None if armor is None else ref(by_id[armor])}
+        return {'schema': row[0], 'player': pl, 'timestamp': row[1]}
+
+    def entries(self, slots: Iterable[int]) -> Dict[int, dict]:
+        """Listing metadata for the non-empty slots among ``slots``."""
+        slots = list(slots)
+        if not slots:
+            return {}
+        with self.connection() as c:
+            rows = c.execute('SELECT slot, name, pclass, level, location, timestamp FROM saves '
+                             'WHERE account=? AND slot BETWEEN ? AND ?',
+                             (self.account(), min(slots), max(slots))).fetchall()
+        wanted = set(slots)
+        return {r[0]: {'format': 'sqlite', 'name': r[1], 'pclass': r[2], 'level': r[3], 'location': r[4],
+                       'timestamp': r[5]} for r in rows if r[0] in wanted}
+
+    # -------------------------
+    # Importing file saves
+    # -------------------------
+
+    def import_files(self, root: str, batch: int = 500, out=sys.stdout) -> Tuple[int, int]:
+        """Copy every file save under ``root`` (journals applied) into the database; (imported, skipped)."""
+        done = skipped = 0
+        pending: List[Tuple[str, int, dict]] = []
+        for path in iter_saves(root):
+            account, slot = owner_of(root, path)
+            try:
+                data = read_save(path)
+                errors = schema.validate(data)
+            except Exception as exc:
+                errors = [f'{type(exc).__name__}: {exc}']
+            if errors:
+                print(f'skipped {path}: {errors[0]}', file=out)
+                skipped += 1
+                continue
+            pending.append((account, slot, data))
+            if len(pending) >= batch:
+                self.save_many(pending)
+                done += len(pending)
+                pending = []
+        if pending:
+            self.save_many(pending)
+            done += len(pending)
+        return done, skipped
+
+
+def cli(argv=None):
+    ap = argparse.ArgumentParser(description='PyRealm SQLite save store')
+    sub = ap.add_subparsers(dest='cmd', required=True)
+    imp = sub.add_parser('import', help='copy file saves (and account directories) into the database')
+    imp.add_argument('root', nargs='?', default='game_saves')
+    imp.add_argument('--db', help='database path (default: <root>/saves.db)')
+    imp.add_argument('--batch', type=int, default=500, help='saves per transaction')
+    ls = sub.add_parser('list', help="show an account's slots")
+    ls.add_argument('--db', default=os.path.join('game_saves', 'saves.db'))
+    ls.add_argument('--account', default='')
+    args = ap.parse_args(argv)
+    if args.cmd == 'import':
+        store = SQLiteStore(args.db or os.path.join(args.root, 'saves.db'))
+        done, skipped = store.import_files(args.root, args.batch)
+        print(f'imported {done} saves into {store.path}, skipped {skipped}')
+    else:
+        store = SQLiteStore(args.db, account=lambda: args.account)
+        with store.connection() as c:
+            slots = [r[0] for r in c.execute('SELECT slot FROM saves WHERE account=? ORDER BY slot', (args.account,))]
+        for slot, meta in sorted(store.entries(slots).items()):
+            print(f"{slot}: {meta['name']} the {meta['pclass']}, level {meta['level']}, "
+                  f"{meta['location']} ({meta['timestamp']})")
+    store.close()
+
+
+if __name__ == '__main__':
+    cli()
@@ -0,0 +1,46 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import main  # noqa: E402
+from gameio import use_io  # noqa: E402
+
+
+class ScriptedIO:
+    """Answers prompts from a list of lines and keeps everything written."""
+
+    def __init__(self, lines=()):
+        self.lines = list(lines)
+        self.out = []
+
+    def write(self, text: str):
+        self.out.append(text)
+
+    def read(self, prompt: str) -> str:
+        self.out.append(prompt)
+        return self.lines.pop(0)
+
+    @property
+    def text(self) -> str:
+        return ''.join(self.out)
+
+
+@pytest.fixture
+def data_dir(tmp_path, monkeypatch):
+    """A fresh DATA_DIR with the file backend; the stores and market are per directory."""
+    monkeypatch.setattr(main, 'DATA_DIR', str(tmp_path))
+    monkeypatch.setattr(main, 'SAVE_BACKEND', 'files')
+    monkeypatch.setattr(main, 'SAVE_FORMAT', 'json')
+    yield tmp_path
+    main.AUTOSAVER.flush()  # nothing may land in the directory after it is gone
+
+
+@pytest.fixture
+def io():
+    """Console I/O replaced by a ScriptedIO; set ``io.lines`` for the prompts."""
+    sio = ScriptedIO()
+    with use_io(sio):
+        yield sio
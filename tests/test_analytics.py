@@ -0,0 +1,14 @@
+import main
+from main import Item, Player
+
+
+def test_the_autosave_slot_stays_off_the_boards(data_dir, io):
+    p = Player('Ann', 'Rogue')
+    p.gold = 5_000
+    main.save_to_slot(p, main.AUTOSAVE_SLOT)
+    p.add_item(Item('Herb', 'material', value=3), 2)
+    io.lines = ['sell Herb 2 10', 'exit']
+    main.market_menu(p, main.Shop({}))  # market orders save to slot 0 as well
+    assert main.stats().top('gold') == []
+    main.save_to_slot(p, 1)
+    assert [key for key, _ in main.stats().top('gold')] == [('', 1)]
@@ -0,0 +1,12 @@
+import os
+
+import bench
+import main
+
+
+def test_a_run_leaves_the_working_directory_alone(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(main, '_content', None)  # loading the packs writes their cache
+    assert bench.cli(['--sizes', '10', '--repeat', '1', '-k', '[10]', '--out', 'out.json',
+                      '--baseline', 'base.json']) == 0
+    assert sorted(os.listdir(tmp_path)) == ['out.json']
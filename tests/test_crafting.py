@@ -0,0 +1,16 @@
+import main
+from main import Item, Player
+
+ORE = Item('Iron Ore', 'material', value=5)
+WOOD = Item('Wood', 'material', value=2)
+
+
+def test_intermediates_crafted_on_the_way_count_for_quests(data_dir, io):
+    p = Player('Ann', 'Warrior')
+    p.add_item(ORE, 4)
+    p.add_item(WOOD)
+    main.quest_log(p).accept('ingots')
+    assert main.craft_item(p, 'Iron Sword')
+    assert p.inventory.count('Iron Sword') == 1 and p.inventory.count('Iron Ingot') == 0
+    assert 'Quest complete: Forge 2 Iron Ingots! +25 gold' in io.text
+    assert p.gold == 100 + 25
@@ -0,0 +1,28 @@
+import sys
+import threading
+
+from main import ItemRegistry
+
+
+def test_concurrent_interns_share_one_template():
+    reg = ItemRegistry()
+    keys = [(f'Gem {i}', 'material', 0, i) for i in range(2000)]
+    start = threading.Barrier(8)
+    got = []
+
+    def intern_all():
+        start.wait()
+        got.append([reg.intern(*k) for k in keys])
+    threads = [threading.Thread(target=intern_all) for _ in range(8)]
+    interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)  # switch threads as often as possible
+    try:
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+    finally:
+        sys.setswitchinterval(interval)
+    assert len(reg) == len(keys)
+    assert all(a is b for ts in got for a, b in zip(ts, got[0]))
+    assert all(reg.get(t.id) is t for t in got[0])
@@ -0,0 +1,111 @@
+import json
+
+import journal
+import main
+from main import Item, Player
+
+HERB = Item('Herb', 'material', value=3)
+SWORD = Item('Iron Sword', 'weapon', 6, 50)
+
+
+def saved_player(slot: int = 1) -> Player:
+    p = Player('Ann', 'Warrior')
+    p.add_item(HERB, 3)
+    main.save_to_slot(p, slot)
+    return p
+
+
+def test_incremental_saves_replay_to_the_same_player(data_dir, io):
+    p = saved_player()
+    p.gold += 40
+    p.add_item(SWORD)
+    p.add_item(HERB, 2)
+    main.save_incremental(p, 1)
+    p.equipment.equip(SWORD)
+    p.discard_item(HERB, 4)
+    p.location = 'Cave'
+    main.save_incremental(p, 1)
+    assert len(list(journal.entries(main.journal_path(1)))) == 2
+    q = main.load_from_slot(1)
+    assert q.to_dict() == p.to_dict()
+
+
+def test_nothing_changed_writes_nothing(data_dir, io):
+    p = saved_player()
+    main.save_incremental(p, 1)
+    assert 'Nothing changed' in io.text
+    assert list(journal.entries(main.journal_path(1))) == []
+
+
+def test_a_full_save_drops_the_journal(data_dir, io):
+    p = saved_player()
+    p.gold = 1
+    main.save_incremental(p, 1)
+    main.save_to_slot(p, 1)
+    assert list(journal.entries(main.journal_path(1))) == []
+    assert main.load_from_slot(1).gold == 1
+
+
+def test_stale_entries_are_skipped():
+    item = HERB.to_dict()
+    data = {'timestamp': 'b', 'player': {'name': 'Ann', 'gold': 5, 'items': [item], 'inventory': [[0, 2]],
+                                         'equipment': {'weapon': None, 'armor': None}}}
+    entries = [{'base': 'a', 'set': {'gold': 999}},
+               {'base': 'b', 'set': {'gold': 7}, 'inv': [['+', item, 3], ['+', SWORD.to_dict(), 1]]},
+               {'base': 'b', 'equip': {'weapon': SWORD.to_dict()}, 'inv': [['-', item, 5]]}]
+    applied = 0
+    inv = journal._DocInventory(data['player'])
+    for e in entries:
+        if e['base'] == data['timestamp']:
+            journal.apply(data['player'], e, inv)
+            applied += 1
+    assert applied == 2
+    pl = data['player']
+    assert pl['gold'] == 7
+    assert pl['inventory'] == [[1, 1]] and pl['items'][1] == SWORD.to_dict()
+    assert pl['equipment']['weapon'] == 1
+
+
+def test_replay_stops_at_a_torn_line(tmp_path):
+    path = str(tmp_path / 'slot.journal')
+    journal.append(path, {'base': 't', 'set': {'gold': 1}})
+    journal.append(path, {'base': 't', 'set': {'gold': 2}})
+    with open(path, 'a') as f:
+        f.write(json.dumps({'base': 't', 'set': {'gold': 3}})[:-4])
+    data = {'timestamp': 't', 'player': {'name': 'Ann', 'inventory': [], 'equipment': {}}}
+    assert journal.replay(data, path) == 2
+    assert data['player']['gold'] == 2
+
+
+def test_an_append_after_a_torn_tail_starts_a_new_line(tmp_path):
+    path = str(tmp_path / 'slot.journal')
+    journal.append(path, {'base': 't', 'set': {'gold': 1}})
+    with open(path, 'a') as f:
+        f.write('{"base":"t","set":{"gold":')
+    size = journal.append(path, {'base': 't', 'set': {'gold': 3}})
+    journal.append(path, {'base': 't', 'set': {'location': 'Cave'}})
+    with open(path, 'rb') as f:
+        raw = f.read()
+    assert raw.count(b'\n') == 3 and size < len(raw)
+    assert [e['set'] for e in journal.entries(path)] == [{'gold': 1}, {'gold': 3}, {'location': 'Cave'}]
+
+
+def test_saves_after_a_crash_mid_append_are_kept(data_dir, io):
+    p = saved_player()
+    p.gold = 10
+    main.save_incremental(p, 1)
+    with open(main.journal_path(1), 'a') as f:
+        f.write('{"base":"x","set":{"go')  # the process died here
+    p.gold = 20
+    p.add_item(SWORD)
+    main.save_incremental(p, 1)
+    q = main.load_from_slot(1)
+    assert q.gold == 20 and q.inventory.count('Iron Sword') == 1
+
+
+def test_an_entry_glued_onto_a_torn_line_is_recovered(tmp_path):
+    path = str(tmp_path / 'slot.journal')
+    with open(path, 'w') as f:
+        f.write('{"base":"t","set":{"gold":1}}\n{"base":"t","se{"base":"t","set":{"gold":2}}\nnot json\n'
+                '{"base":"t","set":{"gold":3}}\n')
+    assert [e['set']['gold'] for e in journal.entries(path)] == [1, 2, 3]
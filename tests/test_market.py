@@ -0,0 +1,242 @@
+import random
+
+import pytest
+
+import main
+from main import Item, Player
+from market import Market, MarketError
+
+HERB = Item('Herb', 'material', value=3)
+ORE = Item('Iron Ore', 'material', value=5)
+
+
+class Clock:
+    def __init__(self):
+        self.t = 0.0
+
+    def __call__(self):
+        self.t += 1
+        return self.t
+
+
+@pytest.fixture
+def m():
+    return Market(clock=Clock())
+
+
+def test_sell_escrows_the_items(m):
+    order, trades = m.sell('ann', 'Herb', 10, [[HERB, 3]])
+    assert trades == [] and order.open and order.qty == 3
+    assert m.quote('Herb')['ask'] == 10
+    assert m.collect('ann') == (0, [])
+
+
+def test_buy_fills_at_the_resting_price_and_refunds_the_difference(m):
+    m.sell('ann', 'Herb', 10, [[HERB, 3]])
+    order, trades = m.buy('bob', 'Herb', 12, 2)
+    assert not order.open
+    assert [(t.price, t.qty, t.buyer, t.seller) for t in trades] == [(10, 2, 'bob', 'ann')]
+    gold, lots = m.collect('bob')
+    assert gold == 2 * (12 - 10)
+    assert [(it.name, n) for it, n in lots] == [('Herb', 2)]
+    assert m.collect('ann') == (20, [])
+    assert [o.qty for o in m.orders('ann')] == [1]
+
+
+def test_orders_match_best_price_then_age(m):
+    m.sell('old', 'Herb', 10, [[HERB, 1]])
+    m.sell('cheap', 'Herb', 9, [[HERB, 1]])
+    m.sell('new', 'Herb', 10, [[HERB, 1]])
+    _, trades = m.buy('bob', 'Herb', 10, 3)
+    assert [t.seller for t in trades] == ['cheap', 'old', 'new']
+    assert [t.price for t in trades] == [9, 10, 10]
+
+
+def test_a_partial_fill_rests_the_rest(m):
+    m.buy('bob', 'Herb', 8, 5)
+    order, trades = m.sell('ann', 'Herb', 7, [[HERB, 2], [Item('Herb', 'material', value=4), 6]])
+    assert sum(t.qty for t in trades) == 5 and trades[0].price == 8
+    assert order.open and order.qty == 3
+    assert m.quote('Herb') == {'item': 'Herb', 'bid': None, 'ask': 7, 'last': 8, 'volume': 5}
+    assert sum(n for _, n in m.collect('bob')[1]) == 5
+
+
+def test_books_are_per_item(m):
+    m.sell('ann', 'Herb', 5, [[HERB, 1]])
+    order, trades = m.buy('bob', 'Iron Ore', 50, 1)
+    assert trades == [] and order.open
+
+
+def test_cancel_returns_escrow_to_the_mailbox(m):
+    sell, _ = m.sell('ann', 'Herb', 10, [[HERB, 4]])
+    buy, _ = m.buy('ann', 'Iron Ore', 6, 3)
+    assert not m.cancel('bob', sell.id)
+    assert m.cancel('ann', sell.id) and m.cancel('ann', buy.id)
+    assert not m.cancel('ann', sell.id)
+    gold, lots = m.collect('ann')
+    assert gold == 18 and [(it.name, n) for it, n in lots] == [('Herb', 4)]
+    assert m.orders('ann') == []
+    assert m.quote('Herb')['ask'] is None
+
+
+def test_bad_orders_are_rejected(m):
+    with pytest.raises(MarketError):
+        m.sell('ann', 'Herb', 0, [[HERB, 1]])
+    with pytest.raises(MarketError):
+        m.buy('ann', 'Herb', 5, 0)
+
+
+def test_save_and_load_keep_orders_mail_and_history(m, tmp_path):
+    m.sell('ann', 'Herb', 10, [[HERB, 3]])
+    m.buy('bob', 'Herb', 10, 1)
+    m.buy('bob', 'Iron Ore', 4, 2)
+    path = str(tmp_path / 'market.json')
+    m.save(path)
+    assert not m.dirty
+    m2 = Market.load(path, Item.from_dict)
+    assert m2.to_dict() == m.to_dict()
+    _, trades = m2.sell('cy', 'Iron Ore', 4, [[ORE, 2]])
+    assert trades[0].buyer == 'bob'
+    order, _ = m2.buy('dee', 'Herb', 10, 1)
+    assert order.id > max(o['id'] for o in m.to_dict()['orders'])
+
+
+def test_load_without_a_file_is_empty(tmp_path):
+    assert Market.load(str(tmp_path / 'none.json'), Item.from_dict).to_dict()['orders'] == []
+
+
+def test_market_menu_saves_the_escrow_with_the_player(data_dir, io):
+    p = Player('Ann', 'Rogue')
+    p.add_item(HERB, 5)
+    io.lines = ['sell Herb 3 10', 'buy Iron Ore 2 4', 'exit']
+    main.market_menu(p, main.Shop({}))
+    saved = Market.load(main.market_path(), Item.from_dict)
+    assert [(o.side, o.qty) for o in saved.orders('Ann')] == [('sell', 3), ('buy', 2)]
+    assert saved.unsettled('Ann', p.market_seq) == []  # the save has every change
+    # the player was written in the same step: the goods and gold are gone from the save too
+    main.AUTOSAVER.flush()
+    q = main.load_from_slot(main.AUTOSAVE_SLOT)
+    assert q.inventory.count('Herb') == 2
+    assert q.gold == 100 - 8
+
+
+def test_collect_pays_out_fills_and_saves(data_dir, io):
+    p = Player('Ann', 'Rogue')
+    main.market().buy('Bob', 'Herb', 7, 2)
+    p.add_item(HERB, 2)
+    io.lines = ['sell Herb 2 5', 'exit']
+    main.market_menu(p, main.Shop({}))
+    assert p.inventory.count('Herb') == 0
+    io.lines = ['exit']
+    main.market_menu(p, main.Shop({}))
+    assert p.gold == 100 + 14
+    assert main.load_from_slot(main.AUTOSAVE_SLOT).gold == 114
+    assert main.market().collect('Ann') == (0, [])
+
+
+def test_an_autosave_between_orders_does_not_duplicate_escrow(data_dir, io):
+    p = Player('Ann', 'Rogue')
+    p.add_item(HERB, 10)
+    io.lines = ['sell Herb 2 10', 'exit']
+    main.market_menu(p, main.Shop({}))
+    main.autosave(p)  # the background writer rewrites slot 0 with a new base
+    main.AUTOSAVER.flush()
+    io.lines = ['sell Herb 3 10', 'exit']
+    main.market_menu(p, main.Shop({}))
+    main.AUTOSAVER.flush()
+    assert main.load_from_slot(main.AUTOSAVE_SLOT).inventory.count('Herb') == 5
+
+
+def random_trading(m, n=300, seed=0):
+    rng = random.Random(seed)
+    owners = ['ann', 'bob', 'cy']
+    for _ in range(n):
+        owner, item = rng.choice(owners), rng.choice(['Herb', 'Iron Ore'])
+        r = rng.random()
+        if r < 0.4:
+            m.sell(owner, item, rng.randint(5, 15), [[HERB if item == 'Herb' else ORE, rng.randint(1, 4)]])
+        elif r < 0.8:
+            m.buy(owner, item, rng.randint(5, 15), rng.randint(1, 4))
+        elif r < 0.9:
+            mine = m.orders(owner)
+            if mine:
+                m.cancel(owner, rng.choice(mine).id)
+        else:
+            m.collect(owner)
+            if rng.random() < 0.5:
+                m.settle(owner, m.seq)
+
+
+def test_the_order_log_replays_to_the_same_market(tmp_path):
+    path = str(tmp_path / 'market.json')
+    m = Market.load(path, Item.from_dict)
+    random_trading(m)
+    m.sync()
+    assert not (tmp_path / 'market.json').exists()
+    m2 = Market.load(path, Item.from_dict)
+    assert m2.to_dict() == m.to_dict()
+    assert m2.sell('dee', 'Herb', 99, [[HERB, 1]])[0].id == m.sell('dee', 'Herb', 99, [[HERB, 1]])[0].id
+
+
+def test_a_big_log_is_folded_into_a_snapshot(tmp_path):
+    path = str(tmp_path / 'market.json')
+    m = Market.load(path, Item.from_dict)
+    m.compact_bytes = 4096
+    for i in range(200):
+        random_trading(m, 5, seed=i)
+        m.sync()
+    assert (tmp_path / 'market.json').exists()
+    assert (tmp_path / 'market.log').stat().st_size <= 4096 + 1024
+    assert Market.load(path, Item.from_dict).to_dict() == m.to_dict()
+    m.save()
+    assert (tmp_path / 'market.log').stat().st_size == 0
+    assert Market.load(path, Item.from_dict).to_dict() == m.to_dict()
+
+
+def test_a_torn_log_record_is_dropped(tmp_path):
+    path = str(tmp_path / 'market.json')
+    m = Market.load(path, Item.from_dict)
+    m.sell('ann', 'Herb', 10, [[HERB, 3]])
+    m.sync()
+    with open(tmp_path / 'market.log', 'ab') as f:
+        f.write(b'{"op":"buy","id":2,"own')
+    m2 = Market.load(path, Item.from_dict)
+    assert [o.qty for o in m2.orders('ann')] == [3]
+    m2.buy('bob', 'Herb', 10, 1)
+    m2.sync()
+    assert [o.qty for o in Market.load(path, Item.from_dict).orders('ann')] == [2]
+
+
+class Crash(Exception):
+    pass
+
+
+def crash(*args, **kwargs):
+    raise Crash()
+
+
+def test_a_change_the_save_missed_is_applied_on_load(data_dir, io, monkeypatch):
+    p = Player('Ann', 'Rogue')
+    p.add_item(HERB, 10)
+    main.save_to_slot(p, 1)
+    io.lines = ['sell Herb 2 10', 'exit']
+    main.market_menu(p, main.Shop({}))
+    # the game stops after the market is written but before the player is
+    save_incremental = main.save_incremental
+    monkeypatch.setattr(main, 'save_incremental', crash)
+    for order in ('sell Herb 3 10', 'buy Iron Ore 1 7'):
+        io.lines = [order, 'exit']
+        with pytest.raises(Crash):
+            main.market_menu(p, main.Shop({}))
+    monkeypatch.setattr(main, 'save_incremental', save_incremental)
+    main._markets.clear()  # a restart
+    q = main.load_from_slot(1)
+    assert q.inventory.count('Herb') == 5 and q.gold == 100 - 7
+    main.save_game(q, 1)
+    r = main.load_from_slot(1)  # nothing is applied twice
+    assert r.inventory.count('Herb') == 5 and r.gold == 100 - 7
+    assert r.market_seq == main.market().seq
+    q.add_item(HERB)
+    io.lines = ['sell Herb 1 10', 'exit']
+    main.market_menu(q, main.Shop({}))
+    assert main.market().unsettled('Ann') == []
@@ -0,0 +1,27 @@
+import main
+import metrics
+
+
+def test_the_console_can_use_the_metrics_menu(data_dir, io):
+    io.lines = ['on', 'exit']
+    try:
+        main.metrics_menu()
+        assert metrics.enabled
+    finally:
+        metrics.enable(False)
+
+
+def test_server_accounts_need_to_be_admins(data_dir, io, monkeypatch):
+    token = main.ACCOUNT.set('mallory')
+    try:
+        io.lines = ['on', 'reset', 'exit']
+        main.metrics_menu()
+        assert not metrics.enabled and io.text == 'Invalid\n'
+        main.in_game_menu(main.Player('Ann', 'Rogue'), main.Shop({}))
+        assert 'Metrics' not in io.text
+        monkeypatch.setattr(main, 'ADMIN_ACCOUNTS', {'mallory'})
+        io.lines = ['exit']
+        main.metrics_menu()
+        assert 'Commands:' in io.text
+    finally:
+        main.ACCOUNT.reset(token)
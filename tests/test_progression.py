@@ -0,0 +1,71 @@
+import random
+
+import pytest
+
+import main
+from main import Player
+from progression import ExpCurve, StatCurve
+
+
+def old_level_up(level: int, exp: int, base: int = 50, step: int = 20):
+    """The one-level-at-a-time loop Player.gain_exp used before ExpCurve."""
+    while exp >= base + (level - 1) * step:
+        exp -= base + (level - 1) * step
+        level += 1
+    return level, exp
+
+
+@pytest.mark.parametrize('table_size', [10_000, 8])
+def test_advance_matches_the_old_loop(table_size):
+    curve = ExpCurve(50, 20, table_size=table_size)
+    rng = random.Random(1)
+    cases = [(1, 0), (1, 49), (1, 50), (1, 120), (3, 89), (3, 90)]
+    cases += [(rng.randint(1, 40), rng.randint(0, 20_000)) for _ in range(500)]
+    for level, exp in cases:
+        assert curve.advance(level, exp) == old_level_up(level, exp), (level, exp)
+
+
+def test_closed_form_past_the_table_matches_the_table():
+    small, big = ExpCurve(table_size=4), ExpCurve()
+    for total in list(range(0, 5_000, 7)) + [10**6, 10**7 + 3]:
+        assert small.level_at(total) == big.level_at(total)
+
+
+@pytest.mark.parametrize('base, step', [(50, 0), (1, 1), (7, 3)])
+def test_other_curves_match_the_old_loop(base, step):
+    curve = ExpCurve(base, step, table_size=16)
+    for level in (1, 2, 9):
+        for exp in range(0, 600, 11):
+            assert curve.advance(level, exp) == old_level_up(level, exp, base, step)
+
+
+def test_total_and_needed_agree():
+    curve = ExpCurve()
+    for level in range(1, 50):
+        assert curve.total(level + 1) - curve.total(level) == curve.needed(level)
+
+
+def test_a_curve_needs_a_positive_cost():
+    with pytest.raises(ValueError):
+        ExpCurve(base=0)
+
+
+def test_gain_exp_applies_a_huge_grant_in_one_message(data_dir, io):
+    p = Player('Ann', 'Mage')
+    p.health = 1
+    p.gain_exp(10**7)
+    assert (p.level, p.exp) == old_level_up(1, 10**7)
+    assert p.health == p.max_health()
+    assert io.text == f'*** Ann gained {p.level - 1} levels! Now level {p.level} ***\n'
+
+
+def test_gain_exp_below_the_next_level(data_dir, io):
+    p = Player('Ann', 'Mage')
+    p.gain_exp(main.EXP_CURVE.needed(1) - 1)
+    assert p.level == 1 and io.text == ''
+
+
+def test_stat_curve_grows_linearly():
+    c = StatCurve({'hp': 100, 'atk': 5}, {'hp': 10})
+    assert c.at(1) == {'hp': 100, 'atk': 5}
+    assert c.at(4) == {'hp': 130, 'atk': 5}
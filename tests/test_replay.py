@@ -0,0 +1,34 @@
+import pytest
+
+import main
+from main import Item, Player
+from replay import Replayer, UsedSharedState
+from session import Session, read_log, use_session
+
+
+def record(tmp_path, io, lines, seed=5):
+    """Play ``lines`` from the in-game menu in a recorded session; returns the log."""
+    p = Player('Ann', 'Rogue')
+    p.add_item(Item('Herb', 'material', value=3), 4)
+    path = str(tmp_path / 'session.plog')
+    io.lines = list(lines) + ['9', 'y']
+    with use_session(Session(seed, path)):
+        main.play_game(p)
+    return read_log(path), p
+
+
+def test_a_session_without_shared_state_replays(data_dir, io):
+    log, p = record(data_dir, io, ['2', 'a', 'a', 'a', 'a', 'a', 'a', 'a', 'a', 'a', 'a', '8'])
+    assert log.shared == []
+    q = Replayer(log, scratch_dir=str(data_dir / 'scratch')).run()
+    assert q.to_dict() == p.to_dict()
+
+
+def test_a_market_read_is_logged_and_refused(data_dir, io):
+    log, p = record(data_dir, io, ['8', 'p', 'sell Herb 2 10', 'exit', '8'])
+    assert log.shared == [(2, 'market'), (3, 'market')]  # opening the market, then the order
+    rep = Replayer(log, scratch_dir=str(data_dir / 'scratch'))
+    assert rep.seek(1).inventory.count('Herb') == 4
+    with pytest.raises(UsedSharedState):
+        rep.seek(3)
+    assert Replayer(log, scratch_dir=str(data_dir / 'scratch'), allow_shared=True).seek(3) is not None
@@ -0,0 +1,84 @@
+import json
+
+import pytest
+
+import main
+import schema
+from schema import SchemaError
+
+SWORD = {'name': 'Iron Sword', 'type': 'weapon', 'power': 6, 'value': 50}
+HERB = {'name': 'Herb', 'type': 'material', 'power': 0, 'value': 3}
+
+
+def v2_save(**player) -> dict:
+    """A save as written before the schema field: item table, stacks, equipment by id."""
+    pl = {'name': 'Old', 'pclass': 'Mage', 'level': 3, 'exp': 12, 'health': 40, 'gold': 55,
+          'items': [HERB, SWORD], 'inventory': [[0, 4], [1, 1]], 'equipment': {'weapon': 1, 'armor': None},
+          'location': 'Forest', 'story_progress': 1, 'save_ts': '2024-01-01 10:00:00'}
+    pl.update(player)
+    return {'player': pl, 'timestamp': '2024-01-01 10:00:00'}
+
+
+def test_version_is_told_apart_by_layout():
+    assert schema.version_of(v2_save()) == 2
+    assert schema.version_of({'player': {'name': 'x', 'inventory': [HERB]}}) == 1
+    assert schema.version_of({'schema': 3, 'player': {}}) == 3
+
+
+def test_v2_migrates_to_current():
+    old = v2_save()
+    new = schema.migrate(old)
+    assert new['schema'] == schema.CURRENT == 4
+    assert schema.validate(new) == []
+    assert new['player']['quests'] == {'active': {}, 'completed': {}}
+    assert new['player']['items'] == [HERB, SWORD] and new['player']['inventory'] == [[0, 4], [1, 1]]
+    assert old == v2_save()  # the input is left alone
+
+
+def test_v2_defaults_become_explicit():
+    d = v2_save()
+    for k in ('pclass', 'level', 'exp', 'health', 'gold', 'location', 'story_progress'):
+        del d['player'][k]
+    pl = schema.migrate(d)['player']
+    assert {k: pl[k] for k in schema.PLAYER_DEFAULTS} == schema.PLAYER_DEFAULTS
+    assert 'health' not in pl  # full health, which depends on the class
+
+
+def test_v1_goes_through_every_step():
+    d = {'player': {'name': 'Older', 'inventory': [HERB, HERB, SWORD], 'equipment': {'weapon': SWORD}},
+         'timestamp': '2023-05-05 05:05:05'}
+    new = schema.migrate(d)
+    assert schema.validate(new) == []
+    pl = new['player']
+    assert sorted(n for _, n in pl['inventory']) == [1, 2]
+    assert pl['items'][pl['equipment']['weapon']] == SWORD
+
+
+def test_current_saves_are_returned_as_they_are():
+    d = schema.migrate(v2_save())
+    assert schema.migrate(d) is d
+
+
+@pytest.mark.parametrize('doc', [{'schema': 0, 'player': {}}, {'schema': schema.CURRENT + 1, 'player': {}},
+                                 {'schema': 3}])
+def test_unusable_saves_are_refused(doc):
+    with pytest.raises(SchemaError):
+        schema.migrate(doc)
+
+
+def test_validate_reports_bad_fields():
+    d = schema.migrate(v2_save(level=0, inventory=[[9, 1]]))
+    errors = schema.validate(d)
+    assert any('player.level' in e for e in errors)
+    assert any('player.inventory[0]' in e for e in errors)
+
+
+def test_a_v2_slot_loads_as_the_same_player(data_dir, io):
+    with open(main.save_path(1), 'w') as f:
+        json.dump(v2_save(), f)
+    p = main.load_from_slot(1)
+    assert (p.name, p.pclass, p.level, p.exp, p.health, p.gold) == ('Old', 'Mage', 3, 12, 40, 55)
+    assert p.inventory.count('Herb') == 4 and p.inventory.count('Iron Sword') == 1
+    assert p.equipment.weapon.name == 'Iron Sword'
+    assert p.location == 'Forest' and p.story_progress == 1
+    assert p.to_dict()['quests'] == {'active': {}, 'completed': {}}
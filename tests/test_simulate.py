@@ -0,0 +1,76 @@
+import copy
+import random
+
+import pytest
+
+np = pytest.importorskip('numpy')
+
+import main  # noqa: E402
+import simulate  # noqa: E402
+from gameio import use_io  # noqa: E402
+from main import Item  # noqa: E402
+from session import use_rng  # noqa: E402
+
+pytestmark = pytest.mark.usefixtures('data_dir')  # content() caches the packs under DATA_DIR
+
+POTION = Item('Potion', 'consumable', 20, 10)
+
+
+def warrior(level: int, potions: int = 0):
+    p = simulate.build_player('Warrior', level)
+    for _ in range(potions):
+        p.add_item(POTION)
+    return p
+
+
+class BossIO:
+    """Answers every boss_battle prompt with ``action`` (and 'Potion' for the item) and counts turns."""
+
+    def __init__(self, action: str):
+        self.action = action
+        self.turns = 0
+        self.out = []
+
+    def write(self, text: str):
+        self.out.append(text)
+
+    def read(self, prompt: str) -> str:
+        if prompt.startswith('Attack'):
+            self.turns += 1
+            return self.action
+        return 'Potion'
+
+
+def real_boss_fights(action: str, level: int, potions: int, n: int):
+    wins = turns = 0
+    for k in range(n):
+        io = BossIO(action)
+        with use_io(io), use_rng(random.Random(k)):
+            main.boss_battle(warrior(level, potions), copy.deepcopy(main.content().boss))
+        wins += 'Boss defeated!\n' in ''.join(io.out)
+        turns += io.turns
+    return wins / n, turns / n
+
+
+def test_a_seed_gives_the_same_fights():
+    enemy = main.content().boss
+    a = simulate.simulate(warrior(8, 2), enemy, simulate.heal_below(0.3), n=2000, seed=7)
+    b = simulate.simulate(warrior(8, 2), enemy, simulate.heal_below(0.3), n=2000, seed=7)
+    c = simulate.simulate(warrior(8, 2), enemy, simulate.heal_below(0.3), n=2000, seed=8)
+    for field in ('outcome', 'turns', 'hp_remaining'):
+        assert np.array_equal(getattr(a, field), getattr(b, field))
+    assert not np.array_equal(a.turns, c.turns)
+
+
+@pytest.mark.parametrize('action, level, potions', [('a', 10, 0), ('a', 6, 0), ('u', 10, 0), ('u', 10, 3)])
+def test_boss_fights_match_boss_battle(action, level, potions):
+    real_wins, real_turns = real_boss_fights(action, level, potions, 300)
+    sim = simulate.simulate(warrior(level, potions), main.content().boss, action, n=20_000, seed=1)
+    assert abs(sim.win_rate - real_wins) < 0.06
+    assert abs(float(sim.turns.mean()) - real_turns) < 0.1 * real_turns
+
+
+def test_use_without_a_potion_wastes_the_boss_turn():
+    # boss_battle lets the boss hit back even when the item is missing; nothing hurts the boss
+    sim = simulate.simulate(warrior(10), main.content().boss, 'u', n=1000, seed=3)
+    assert sim.rate(simulate.LOSS) == 1.0
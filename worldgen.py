@@ -0,0 +1,199 @@
+"""Seeded, lazily generated world regions beyond the hand-made map.
+
+The procedural world is a grid of regions. Each one is rebuilt from
+``(seed, x, y)`` whenever it is needed, so only what players changed (visited
+locations, enemies defeated) ever has to be stored. Regions are generated the
+first time travel or an encounter touches one of their locations. At most
+``max_regions`` stay loaded; the least recently used is evicted, its edges
+leave the world graph and any modified state is written to ``state_dir``.
+
+Location names end in their region's coordinates, e.g. ``"Misty Hollow [2,-1]"``,
+so the owning region can be found without an index. Every region's first
+location is its gateway, linked to the gateways of the four neighbouring
+regions; region (0, 0) is also linked to the hand-made map.
+"""
+import json
+import os
+import random
+import re
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Tuple, Union
+
+from worldgraph import WorldGraph
+
+BIOMES = {
+    'Marsh': {'adjectives': ['Misty', 'Sunken', 'Rotting', 'Still'], 'places': ['Hollow', 'Fen', 'Mire', 'Pool'],
+              'enemies': [('Bog Lurker', 45, 9, 'Scale', 8), ('Marsh Hag', 55, 11, 'Herb', 3)]},
+    'Highlands': {'adjectives': ['Windswept', 'Granite', 'High', 'Broken'], 'places': ['Ridge', 'Pass', 'Crag', 'Tor'],
+                  'enemies': [('Harpy', 40, 12, 'Leather', 6), ('Hill Troll', 90, 13, 'Bone', 2)]},
+    'Woods': {'adjectives': ['Dark', 'Whispering', 'Old', 'Tangled'], 'places': ['Grove', 'Thicket', 'Glade', 'Copse'],
+              'enemies': [('Dire Wolf', 50, 10, 'Leather', 6), ('Goblin Scout', 40, 8, 'Wood', 2)]},
+    'Barrens': {'adjectives': ['Ashen', 'Scorched', 'Bleak', 'Dry'], 'places': ['Flats', 'Wastes', 'Dunes', 'Scar'],
+                'enemies': [('Dust Wraith', 60, 14, 'Bone', 2), ('Sand Crawler', 70, 11, 'Iron Ore', 5)]},
+}
+BIOME_NAMES = sorted(BIOMES)
+
+_COORDS = re.compile(r' \[(-?\d+),(-?\d+)\]$')
+NEIGHBOURS = ((1, 0), (-1, 0), (0, 1), (0, -1))
+
+Coords = Tuple[int, int]
+
+
+def region_of(location: str) -> Optional[Coords]:
+    m = _COORDS.search(location)
+    return (int(m.group(1)), int(m.group(2))) if m else None
+
+
+def _rng(seed, x: int, y: int) -> random.Random:
+    # string seeds are hashed with SHA-512, so this is stable across runs and processes
+    return random.Random(f'{seed}:{x}:{y}')
+
+
+def _header(rng: random.Random, x: int, y: int) -> Tuple[str, str]:
+    biome = rng.choice(BIOME_NAMES)
+    b = BIOMES[biome]
+    return biome, f'{rng.choice(b["adjectives"])} {biome} [{x},{y}]'
+
+
+def gateway_name(seed, x: int, y: int) -> str:
+    return _header(_rng(seed, x, y), x, y)[1]
+
+
+class Region:
+    def __init__(self, seed, x: int, y: int):
+        rng = _rng(seed, x, y)
+        self.coords = (x, y)
+        self.biome, gateway = _header(rng, x, y)
+        b = BIOMES[self.biome]
+        self.locations: List[str] = [gateway]
+        for adj in rng.sample(b['adjectives'], rng.randint(2, 3)):
+            self.locations.append(f'{adj} {rng.choice(b["places"])} [{x},{y}]')
+        # a chain through the region plus one shortcut, all two-way
+        self.edges: List[Tuple[str, str]] = []
+        for a, c in zip(self.locations, self.locations[1:]):
+            self.edges += [(a, c), (c, a)]
+        if len(self.locations) > 2:
+            a, c = rng.sample(self.locations, 2)
+            self.edges += [(a, c), (c, a)]
+        for dx, dy in NEIGHBOURS:
+            self.edges.append((gateway, gateway_name(seed, x + dx, y + dy)))
+        # danger grows with distance from the hand-made map
+        self.danger = abs(x) + abs(y)
+        self.enemies: Dict[str, tuple] = {loc: rng.choice(b['enemies']) for loc in self.locations}
+        # player-modified state; the only part that is ever persisted
+        self.state = {'visited': [], 'kills': {}}
+        self.dirty = False
+
+    @property
+    def gateway(self) -> str:
+        return self.locations[0]
+
+    def enemy_spec(self, location: str) -> dict:
+        name, health, power, loot, value = self.enemies[location]
+        scale = 1 + 0.15 * self.danger
+        return {'name': name, 'health': int(health * scale), 'power': int(power * scale),
+                'loot': (loot, value), 'exp': int(health * scale) // 3, 'gold': int(value * scale) + self.danger}
+
+
+class ProceduralWorld:
+    def __init__(self, graph: WorldGraph, seed: Union[int, str] = 0, attach_to: Optional[str] = None,
+                 max_regions: int = 64, state_dir: Union[str, Callable[[], str], None] = None):
+        self.graph = graph
+        self.seed = seed
+        self.max_regions = max_regions
+        self._state_dir = state_dir
+        self._regions: 'OrderedDict[Coords, Region]' = OrderedDict()
+        self._lock = graph.lock  # the graph's own lock: region loads/evictions and routes never interleave
+        if attach_to is not None:
+            origin = gateway_name(seed, 0, 0)
+            graph.add_edge(attach_to, origin)
+            self._attach = (origin, attach_to)
+        else:
+            self._attach = None
+
+    def owns(self, location: str) -> bool:
+        return region_of(location) is not None
+
+    def __len__(self):
+        return len(self._regions)
+
+    def state_dir(self) -> Optional[str]:
+        d = self._state_dir
+        return d() if callable(d) else d
+
+    def _state_path(self, coords: Coords) -> Optional[str]:
+        d = self.state_dir()
+        return os.path.join(d, f'region_{coords[0]}_{coords[1]}.json') if d else None
+
+    def touch(self, location: str) -> Optional[Region]:
+        """Make sure the region owning ``location`` is loaded; returns it (None for hand-made places)."""
+        coords = region_of(location)
+        if coords is None:
+            return None
+        with self._lock:
+            region = self._regions.get(coords)
+            if region is not None:
+                self._regions.move_to_end(coords)
+            else:
+                region = self._load(coords)
+            if location in region.enemies and location not in region.state['visited']:
+                region.state['visited'].append(location)
+                region.dirty = True
+            return region
+
+    def _load(self, coords: Coords) -> Region:
+        region = Region(self.seed, *coords)
+        p = self._state_path(coords)
+        if p and os.path.exists(p):
+            with open(p, 'r') as f:
+                region.state = json.load(f)
+        for a, b in region.edges:
+            self.graph.add_edge(a, b)
+        if self._attach and coords == (0, 0):
+            self.graph.add_edge(self._attach[0], self._attach[1])
+        self._regions[coords] = region
+        while len(self._regions) > self.max_regions:
+            self._evict(next(iter(self._regions)))
+        return region
+
+    def _evict(self, coords: Coords):
+        region = self._regions.pop(coords)
+        self._save(region)
+        touched = set()
+        for a, b in region.edges:
+            self.graph.remove_edge(a, b)
+            touched.update((a, b))
+        if self._attach and coords == (0, 0):
+            self.graph.remove_edge(self._attach[0], self._attach[1])
+        for loc in touched:
+            self.graph.prune(loc)
+
+    def _save(self, region: Region):
+        p = self._state_path(region.coords)
+        if not region.dirty or not p:
+            return
+        os.makedirs(os.path.dirname(p), exist_ok=True)
+        tmp = p + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(region.state, f)
+        os.replace(tmp, p)
+        region.dirty = False
+
+    def record_kill(self, location: str):
+        region = self.touch(location)
+        if region is not None:
+            kills = region.state['kills']
+            kills[location] = kills.get(location, 0) + 1
+            region.dirty = True
+
+    def enemy_spec(self, location: str) -> Optional[dict]:
+        region = self.touch(location)
+        if region is None or location not in region.enemies:
+            return None
+        return region.enemy_spec(location)
+
+    def flush(self):
+        """Write the state of every loaded region that changed."""
+        with self._lock:
+            for region in self._regions.values():
+                self._save(region)
@@ -0,0 +1,165 @@
+"""World graph with cached shortest routes for travel and fast travel.
+
+Routes are answered from shortest-path trees that are computed once per
+starting location (Dijkstra) and kept in an LRU cache, so a route query only
+walks parent links. Adding an edge updates every cached tree in place by
+relaxing outward from the new edge; removing an edge drops just the trees
+whose routes used it.
+
+Every public method holds ``lock`` (re-entrant). Code that changes the graph
+from several threads, like worldgen.ProceduralWorld, takes the same lock, so
+a route never sees an edit halfway through.
+"""
+import heapq
+import json
+import threading
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+
+Adjacency = Dict[str, Union[List[str], Dict[str, float]]]
+
+
+class _Tree:
+    __slots__ = ('dist', 'parent')
+
+    def __init__(self, dist: Dict[str, float], parent: Dict[str, Optional[str]]):
+        self.dist = dist
+        self.parent = parent
+
+
+class WorldGraph:
+    def __init__(self, adjacency: Optional[Adjacency] = None, cache_size: int = 256):
+        self._adj: Dict[str, Dict[str, float]] = {}
+        self._radj: Dict[str, Dict[str, None]] = {}  # reverse edges, for pruning
+        self._trees: 'OrderedDict[str, _Tree]' = OrderedDict()
+        self.cache_size = cache_size
+        self.lock = threading.RLock()
+        for src, dests in (adjacency or {}).items():
+            self.add_location(src)
+            costs = dests.items() if isinstance(dests, dict) else ((d, 1) for d in dests)
+            for dst, cost in costs:
+                self.add_edge(src, dst, cost)
+
+    @classmethod
+    def from_file(cls, path: str, **kw) -> 'WorldGraph':
+        """Load a JSON map: ``{"Town": ["Forest", ...]}`` or ``{"Town": {"Forest": 2, ...}}``."""
+        with open(path, 'r') as f:
+            return cls(json.load(f), **kw)
+
+    def __contains__(self, loc: str) -> bool:
+        return loc in self._adj
+
+    def __len__(self):
+        return len(self._adj)
+
+    def locations(self) -> Iterable[str]:
+        with self.lock:
+            return list(self._adj)
+
+    def neighbors(self, loc: str) -> List[str]:
+        with self.lock:
+            return list(self._adj.get(loc, ()))
+
+    def add_location(self, loc: str):
+        with self.lock:
+            if loc not in self._adj:
+                self._adj[loc] = {}
+                self._radj[loc] = {}
+
+    def prune(self, loc: str) -> bool:
+        """Forget ``loc`` if nothing leads to or from it any more."""
+        with self.lock:
+            return self._prune(loc)
+
+    def _prune(self, loc: str) -> bool:
+        if loc in self._adj and not self._adj[loc] and not self._radj[loc]:
+            del self._adj[loc]
+            del self._radj[loc]
+            for tree in self._trees.values():
+                # only the origin itself can still mention an isolated location
+                tree.dist.pop(loc, None)
+                tree.parent.pop(loc, None)
+            self._trees.pop(loc, None)
+            return True
+        return False
+
+    def add_edge(self, src: str, dst: str, cost: float = 1, both: bool = False):
+        with self.lock:
+            self._add_edge(src, dst, cost)
+            if both:
+                self._add_edge(dst, src, cost)
+
+    def _add_edge(self, src: str, dst: str, cost: float):
+        self.add_location(src)
+        self.add_location(dst)
+        old = self._adj[src].get(dst)
+        if old is not None and cost > old:
+            # a more expensive edge can lengthen routes; treat it as remove + add
+            self._remove_edge(src, dst)
+        self._adj[src][dst] = cost
+        self._radj[dst][src] = None
+        for tree in self._trees.values():
+            self._relax_from_edge(tree, src, dst, cost)
+
+    def remove_edge(self, src: str, dst: str):
+        with self.lock:
+            self._remove_edge(src, dst)
+
+    def _remove_edge(self, src: str, dst: str):
+        if self._adj.get(src, {}).pop(dst, None) is None:
+            return
+        del self._radj[dst][src]
+        stale = [s for s, t in self._trees.items() if t.parent.get(dst) == src]
+        for s in stale:
+            del self._trees[s]
+
+    def _relax_from_edge(self, tree: _Tree, src: str, dst: str, cost: float):
+        du = tree.dist.get(src)
+        if du is None or du + cost >= tree.dist.get(dst, float('inf')):
+            return
+        tree.dist[dst] = du + cost
+        tree.parent[dst] = src
+        self._dijkstra(tree, [(du + cost, dst)])
+
+    def _dijkstra(self, tree: _Tree, heap: List[Tuple[float, str]]):
+        dist, parent, adj = tree.dist, tree.parent, self._adj
+        while heap:
+            d, x = heapq.heappop(heap)
+            if d > dist[x]:
+                continue
+            for y, c in adj[x].items():
+                nd = d + c
+                if nd < dist.get(y, float('inf')):
+                    dist[y] = nd
+                    parent[y] = x
+                    heapq.heappush(heap, (nd, y))
+
+    def _tree(self, src: str) -> _Tree:
+        tree = self._trees.get(src)
+        if tree is not None:
+            self._trees.move_to_end(src)
+            return tree
+        tree = _Tree({src: 0}, {src: None})
+        if src in self._adj:
+            self._dijkstra(tree, [(0, src)])
+        self._trees[src] = tree
+        if len(self._trees) > self.cache_size:
+            self._trees.popitem(last=False)
+        return tree
+
+    def reachable(self, src: str) -> Dict[str, float]:
+        """Travel cost from ``src`` to every location reachable from it."""
+        with self.lock:
+            return dict(self._tree(src).dist)
+
+    def route(self, src: str, dst: str) -> Optional[Tuple[List[str], float]]:
+        """Cheapest route as ``([src, ..., dst], cost)``, or None if unreachable."""
+        with self.lock:
+            tree = self._tree(src)
+            if dst not in tree.dist:
+                return None
+            path = [dst]
+            while path[-1] != src:
+                path.append(tree.parent[path[-1]])
+            path.reverse()
+            return path, tree.dist[dst]